@@ -0,0 +1,45 @@
+import os
+import tempfile
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from sciSOM.Plotting.SOM_plots import calculate_u_matrix, plot_mU_matrix
+from .common import synthetic_data, synthetic_weight_cube
+
+
+class UMatrix:
+    """
+    calculate_u_matrix for square maps of increasing size.
+    """
+    params = ([10, 50, 100, 300], ["rectangular", "hexagonal"])
+    param_names = ["map_size", "topology"]
+
+    def setup(self, map_size, topology):
+        self.weight_cube = synthetic_weight_cube(map_size, map_size, 10)
+
+    def time_calculate_u_matrix(self, map_size, topology):
+        calculate_u_matrix(self.weight_cube, topology)
+
+
+class MUMatrixPlot:
+    """
+    plot_mU_matrix, from the weight cube and data to the saved PNG.
+    """
+    params = [10, 50, 100]
+    param_names = ["map_size"]
+    timeout = 300
+
+    def setup(self, map_size):
+        self.weight_cube = synthetic_weight_cube(map_size, map_size, 10)
+        self.data = synthetic_data(10**5, 10)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def teardown(self, map_size):
+        plt.close("all")
+        for name in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, name))
+        os.rmdir(self.tmp_dir)
+
+    def time_plot_mU_matrix(self, map_size):
+        plot_mU_matrix(self.weight_cube, self.data, save_fig=True,
+                       output_img_name=os.path.join(self.tmp_dir, "mU_matrix.png"))
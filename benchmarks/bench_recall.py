@@ -0,0 +1,57 @@
+import numpy as np
+from sciSOM.SOM_recall.recall import SOM_cls_recall, generate_color_ref_map
+from sciSOM.SOM_recall.strax_functions import compute_wf_attributes
+from .common import synthetic_data, synthetic_weight_cube, synthetic_waveforms
+
+
+class ClassRecall:
+    """
+    SOM_cls_recall of increasingly large datasets on a 30x30 map.
+    """
+    params = [10**4, 10**5, 10**6]
+    param_names = ["n_samples"]
+
+    def setup(self, n_samples):
+        self.data = synthetic_data(n_samples, 10)
+        self.weight_cube = synthetic_weight_cube(30, 30, 10)
+        self.reference_map = np.arange(30 * 30).reshape(30, 30) % 7
+        self.array_to_fill = np.zeros(n_samples, dtype=[('SOM_type', 'i8')])
+
+    def time_SOM_cls_recall(self, n_samples):
+        SOM_cls_recall(self.array_to_fill, self.data, self.weight_cube, self.reference_map)
+
+    def peakmem_SOM_cls_recall(self, n_samples):
+        SOM_cls_recall(self.array_to_fill, self.data, self.weight_cube, self.reference_map)
+
+
+class WaveformAttributes:
+    """
+    compute_wf_attributes (deciles) of 200 sample waveforms.
+    """
+    params = [10**3, 10**4, 10**5]
+    param_names = ["n_waveforms"]
+
+    def setup(self, n_waveforms):
+        self.data, self.sample_length = synthetic_waveforms(n_waveforms)
+        # Compile outside of the timed region
+        compute_wf_attributes(self.data[:1], self.sample_length[:1], 10)
+
+    def time_compute_wf_attributes(self, n_waveforms):
+        compute_wf_attributes(self.data, self.sample_length, 10)
+
+
+class ColorRefMap:
+    """
+    generate_color_ref_map of a cluster image compressed to the map size.
+    """
+    params = [10, 50, 100]
+    param_names = ["map_size"]
+
+    def setup(self, map_size):
+        rng = np.random.default_rng(0)
+        self.unique_colors = rng.integers(0, 256, (12, 3), dtype=np.uint8)
+        labels = rng.integers(0, len(self.unique_colors), (map_size, map_size))
+        self.color_image = self.unique_colors[labels]
+
+    def time_generate_color_ref_map(self, map_size):
+        generate_color_ref_map(self.color_image, self.unique_colors)
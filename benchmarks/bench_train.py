@@ -0,0 +1,27 @@
+import random
+import numpy as np
+from sciSOM.SOM_learn.train import SOM
+from .common import SEED, kohonen_parameters, csom_parameters, synthetic_data
+
+
+class TrainSOM:
+    """
+    SOM.train for both algorithms, both ordering modes and several map sizes.
+    """
+    params = (["Kohonen", "cSOM"], ["batch", "online"], [10, 30, 60])
+    param_names = ["som_type", "mode", "map_size"]
+    timeout = 300
+
+    n_iter = 5000
+
+    def setup(self, som_type, mode, map_size):
+        self.data = synthetic_data(10000, 10)
+        self.learning_parameters = kohonen_parameters if som_type == "Kohonen" else csom_parameters
+
+    def time_train(self, som_type, mode, map_size):
+        random.seed(SEED)
+        np.random.seed(SEED)
+        som = SOM(map_size, map_size, self.data.shape[1], self.n_iter,
+                  learning_parameters=self.learning_parameters,
+                  som_type=som_type, mode=mode)
+        som.train(self.data)
@@ -0,0 +1,40 @@
+import numpy as np
+
+# Fixed seed so every run benchmarks the same synthetic data
+SEED = 1234
+
+kohonen_parameters = np.array([(1, 0.5, 0.5, 3)],
+                              dtype=[('time', 'i8'), ('alpha', 'f8'),
+                                     ('sigma', 'f8'), ('max_radius', 'i8')])
+
+csom_parameters = np.array([(0.1, 0.01, 1.0)],
+                           dtype=[('alpha', 'f8'), ('beta', 'f8'), ('gamma', 'f8')])
+
+
+def synthetic_data(n_samples: int, input_dim: int) -> np.ndarray:
+    """
+    Clustered data in [0, 1], a few gaussian blobs so the maps have structure.
+    """
+    rng = np.random.default_rng(SEED)
+    centers = rng.random((8, input_dim))
+    labels = rng.integers(0, len(centers), n_samples)
+    data = centers[labels] + 0.05 * rng.standard_normal((n_samples, input_dim))
+    return np.clip(data, 0, 1)
+
+
+def synthetic_weight_cube(x_dim: int, y_dim: int, input_dim: int) -> np.ndarray:
+    rng = np.random.default_rng(SEED)
+    return rng.random((x_dim, y_dim, input_dim))
+
+
+def synthetic_waveforms(n_waveforms: int, n_samples: int = 200):
+    """
+    Gaussian pulses with random position and width, plus the sample length.
+    """
+    rng = np.random.default_rng(SEED)
+    t = np.arange(n_samples)
+    mean = rng.uniform(20, n_samples - 20, (n_waveforms, 1))
+    width = rng.uniform(2, 20, (n_waveforms, 1))
+    data = np.exp(-0.5 * ((t - mean) / width)**2).astype(np.float32)
+    sample_length = rng.integers(1, 10, n_waveforms).astype(np.int16)
+    return data, sample_length
@@ -31,4 +31,16 @@ def docs(session: nox.session) -> None:
     if serve:
         session.run("sphinx-autobuild", "--open-browser", *shared_args)
     else:
-        session.run("sphinx-build", "--keep-going", *shared_args)
\ No newline at end of file
+        session.run("sphinx-build", "--keep-going", *shared_args)
+
+
+@nox.session(reuse_venv=True)
+def benchmarks(session: nox.session) -> None:
+    """
+    Run the asv benchmarks and compare them against a base commit.
+    First position argument is the base commit, defualt: master.
+    """
+    base = session.posargs[0] if session.posargs else "master"
+    session.install("asv", "virtualenv")
+    session.run("asv", "machine", "--yes")
+    session.run("asv", "continuous", "--factor", "1.2", "--show-stderr", base, "HEAD")
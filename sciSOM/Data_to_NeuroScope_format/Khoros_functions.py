@@ -1,26 +1,102 @@
-import viff
+import sys
 import numpy as np
 
-def save_khoros_raw(file_name: str, data: np.ndarray):
+# VIFF files have a 1024 byte header followed by the raw data
+VIFF_HEADER_SIZE = 1024
+
+# DataStorageType codes used by the viff reader
+VIFF_STORAGE_TYPES = {1: np.uint8, 2: np.uint16, 4: np.uint32, 5: np.float32,
+                      6: np.complex64, 9: np.float64, 10: np.complex128}
+
+
+def save_khoros_raw(file_name: str, data: np.ndarray, block_size: int = 64):
     """
-    Saves a given data into the desired raw data file so I can use 
+    Saves a given data into the desired raw data file so I can use
     it to train an SOM in NeuroScope.
 
+    The data is written in blocks of the last axis, so at most block_size
+    planes are copied at a time.
+
     Parameters
     ----------
-    
+
     file_name : str
         Path to where you want to save the file + file name
     data : np.ndarray
         Data for the weightcube to use in neuroscope
+    block_size : int
+        Number of planes of the last axis written at a time
     """
-    import viff
-    
     [Length, Width, Height] = np.shape(data)
-    save_khoros_raw = np.reshape(data.transpose(2,1,0), [1, Height, Length, Width])
-    save_khoros_raw_c = np.ascontiguousarray(save_khoros_raw)
     assert '.raw' in file_name, "The output file must be a raw file!"
-    viff.write(file_name, save_khoros_raw_c)
+
+    # Same layout as viff.write(np.reshape(data.transpose(2,1,0), [1, Height, Length, Width]))
+    with open(file_name, 'wb') as f:
+        f.write(_viff_header((1, Height, Length, Width), data.dtype.newbyteorder("=")))
+        for start in range(0, Height, block_size):
+            block = data[:, :, start:start + block_size].transpose(2, 1, 0)
+            np.ascontiguousarray(block, dtype=data.dtype.newbyteorder("=")).tofile(f)
+
+
+def read_viff_header(file_name: str) -> dict:
+    """
+    Reads the header of a VIFF file.
+
+    Parameters
+    ----------
+    file_name : str
+        path to the VIFF file
+
+    Returns
+    -------
+    header : dict
+        'shape' of the payload as (NumberOfImages, NumberOfBands,
+        NumberOfColumns, NumberOfRows), its 'dtype' and the 'offset' in bytes
+        where the payload starts
+    """
+    with open(file_name, 'rb') as f:
+        header = f.read(VIFF_HEADER_SIZE)
+
+    assert header[:3] == b'\xab\x01\x01', f'viff: {file_name} is not a viff or xv file format'
+    byte_order = '>' if header[4:5] == b'\x02' else '<'
+    fields = np.frombuffer(header, dtype=f'{byte_order}u4', count=12, offset=520)
+    rows, columns = int(fields[0]), int(fields[1])
+    images, bands, storage_type = int(fields[9]), int(fields[10]), int(fields[11])
+
+    if storage_type not in VIFF_STORAGE_TYPES:
+        raise ValueError(f'viff: {file_name} has an unsupported data storage type {storage_type}')
+    dtype = np.dtype(VIFF_STORAGE_TYPES[storage_type]).newbyteorder(byte_order)
+
+    return {'shape': (images, bands, columns, rows),
+            'dtype': dtype,
+            'offset': VIFF_HEADER_SIZE}
+
+
+def open_khoros_weightcube(path_to_weights: str, mode: str = 'r') -> np.ndarray:
+    """
+    Memory maps a weightcube generated with the khoros system.
+
+    Nothing is read or copied, the result is a view of the file in the
+    (x, y, dim) layout used by the rest of the package.
+
+    Parameters
+    ----------
+    path_to_weights : str
+        path to where the som weight is located
+    mode : str
+        np.memmap mode, 'r' for read only or 'r+' to modify the file in place
+
+    Returns
+    -------
+    weight_cube : np.ndarray
+        View of the raw weights in the file, shape (x_dim, y_dim, input_dim)
+    """
+    header = read_viff_header(path_to_weights)
+    [_, zdim, xdim, ydim] = header['shape']
+    wgtcub = np.memmap(path_to_weights, dtype=header['dtype'], mode=mode,
+                       offset=header['offset'], shape=(zdim, xdim, ydim))
+    return wgtcub.transpose(1, 2, 0)
+
 
 def import_khoros_weightcube(path_to_weights: str):
     """
@@ -28,6 +104,9 @@ def import_khoros_weightcube(path_to_weights: str):
     reshapes it into the appropriate format and applies an
     affine transform for recalls.
 
+    The weights are memory mapped and rescaled from [-1, 1] to [0, 1] in a
+    single pass, so only the output array is allocated.
+
     Parameters
     ----------
 
@@ -39,27 +118,82 @@ def import_khoros_weightcube(path_to_weights: str):
     weight_cube : np.ndarray
         The weight cube for the SOM, reshaped to be handled in python
     """
-    import viff
-    
-    wgtcub = viff.read(path_to_weights)
-    [_, zdim, xdim, ydim] = wgtcub.shape
-    wgtcub_re = np.reshape(wgtcub, [zdim, xdim, ydim])
-    wgtcub_tr = np.transpose(wgtcub_re, [1,2,0])
-    weight_cube = affine_transform(wgtcub_tr, -1,1,0,1)
+    wgtcub_tr = open_khoros_weightcube(path_to_weights)
+    weight_cube = np.empty(wgtcub_tr.shape, dtype=np.float64)
+    np.add(wgtcub_tr, 1, out=weight_cube)
+    weight_cube /= 2
     return weight_cube
 
-def data_to_raw_file_4_khoros(data: np.ndarray, file: str):
+def data_to_raw_file_4_khoros(data: np.ndarray, file: str, block_size: int = 1):
     """
     Make data file into an appropriate raw file for khoros format
-    
+
+    The file holds data.transpose(2,0,1) in C order (band sequential), it is
+    written one block of the last axis at a time so only block_size bands
+    are copied at once.
+
     Parameters
     ----------
-    
+
     data : np.ndarray
         3D data cube
     file : str
         path location + filename of desired output file
+    block_size : int
+        Number of bands (entries of the last axis) written at a time
     """
-    data_t = np.transpose(data, [2,0,1])
-    np.asfortranarray(data_t.astype('float64')).tofile(file)
-    print('Data has been saved')
\ No newline at end of file
+    with open(file, 'wb') as f:
+        for start in range(0, data.shape[2], block_size):
+            block = data[:, :, start:start + block_size].transpose(2, 0, 1)
+            np.ascontiguousarray(block, dtype=np.float64).tofile(f)
+    print('Data has been saved')
+
+def open_raw_file_4_khoros(file: str, shape: tuple, mode: str = 'r') -> np.ndarray:
+    """
+    Memory maps a raw file written by data_to_raw_file_4_khoros.
+
+    Parameters
+    ----------
+    file : str
+        path location + filename of the raw file
+    shape : tuple
+        shape of the original 3D data cube
+    mode : str
+        np.memmap mode, 'r' for read only or 'r+' to modify the file in place
+
+    Returns
+    -------
+    data : np.ndarray
+        View of the file with the given shape, no data is copied
+    """
+    x_dim, y_dim, z_dim = shape
+    data = np.memmap(file, dtype=np.float64, mode=mode, shape=(z_dim, x_dim, y_dim))
+    return data.transpose(1, 2, 0)
+
+
+def _viff_header(shape: tuple, dtype: np.dtype) -> bytes:
+    """
+    Builds the 1024 byte VIFF header written by viff.write for a payload of
+    shape (NumberOfImages, NumberOfBands, NumberOfColumns, NumberOfRows).
+    """
+    storage_types = {np.dtype(value).str[1:]: key for key, value in VIFF_STORAGE_TYPES.items()}
+    storage_types.update({'i1': 1, 'i2': 2, 'i4': 4})
+    dtype = np.dtype(dtype)
+    if dtype.str[1:] not in storage_types:
+        raise ValueError(f'viff: unsupported data type {dtype}')
+
+    header = bytearray(VIFF_HEADER_SIZE)
+    header[0:4] = b'\xab\x01\x01\x00'
+    header[4:5] = b'\x08' if sys.byteorder == 'little' else b'\x02'
+    fields = np.zeros(25, dtype=np.uint32)
+    fields[0] = shape[3]                    # NumberOfRows
+    fields[1] = shape[2]                    # NumberOfColumns
+    fields[3:5] = 0xffffffff                # StartX, StartY
+    fields[5:7] = np.float32(1).view(np.uint32)  # XPixelSize, YPixelSize
+    fields[7] = 1                           # LocationType
+    fields[9] = shape[0]                    # NumberOfImages
+    fields[10] = shape[1]                   # NumberOfBands
+    fields[11] = storage_types[dtype.str[1:]]  # DataStorageType
+    fields[14] = 1                          # MapStorageType
+    header[520:620] = fields.tobytes()
+    return bytes(header)
@@ -1,17 +1,19 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.spatial.distance import cdist
 from typing import Union
 from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.collections import LineCollection
 from matplotlib import colors
-from ..SOM_recall.recall import SOM_location_recall
+from ..SOM_recall.recall import SOM_bmu_recall
+from ..SOM_recall.map_statistics import (density_matrix, SOM_density_recall,
+                                         SOM_neuron_aggregates, group_by_label)
+from .u_matrix import compute_fences
 
 
 def plot_SOM_gird_neurons(weight_cube: np.ndarray) -> None:
     """
-    This function take in a nunr file from NeuroScope and converts it into a useful format to us
-    Then it uses the data in the nunr file to identify which data samples belong to each PE
-    Finally it takes this data and plots it such that we can overlay any data we want.
+    Plots the prototype (weight vector) of every neuron in its place on the
+    SOM grid.
     
     Parameters:
     -------------------
@@ -23,23 +25,93 @@ def plot_SOM_gird_neurons(weight_cube: np.ndarray) -> None:
     None
         
     """
-    
-    xgrid, ygrid, data_dim = np.shape(weight_cube)
-    
-    # Plotting section
-    fig, ax = plt.subplots(nrows=ygrid, ncols=xgrid, figsize=(5, 5))
-
-    a = 1
-    for i in np.arange(ygrid):
-        for j in np.arange(xgrid):
-            ax[j,i].plot(weight_cube[j,i,:])
-            ax[i,j].axis('off')
-            ax[i,j].set_xlim(0, data_dim)
-            ax[i,j].set_ylim(0, 1)
+    plot_neuron_traces(weight_cube, figsize=(5, 5))
 
     #plt.show()
 
 
+def plot_neuron_traces(traces: np.ndarray,
+                       empty_cells: np.ndarray = None,
+                       ylim: tuple = (0, 1),
+                       cell_margin: float = 0.05,
+                       color: str = 'black',
+                       empty_color: str = 'red',
+                       linewidth: float = 0.5,
+                       ax: plt.Axes = None,
+                       figsize: tuple = (5, 5)) -> plt.Axes:
+    """
+    Draws one trace per neuron (prototypes, mean waveforms...) on the SOM grid
+    as a single LineCollection on one Axes.
+
+    Trace (i, j) is drawn in row i (from the top) and column j of the grid.
+    Each trace is scaled so ylim spans the height of its cell, values outside
+    of ylim are clipped to the cell.
+
+    Parameters
+    ----------
+    traces : np.ndarray
+        Traces to draw, shape (x_dim, y_dim, trace_length)
+    empty_cells : np.ndarray
+        Optional boolean mask of shape (x_dim, y_dim), these cells are drawn as
+        a flat line in empty_color
+    ylim : tuple
+        Range of the trace values that fills the height of a cell, if None
+        every trace is scaled to its own min and max
+    cell_margin : float
+        Fraction of each cell left blank on every side
+    color : str
+        Color of the traces
+    empty_color : str
+        Color of the traces in empty cells
+    linewidth : float
+        Width of the lines
+    ax : plt.Axes
+        Axes to draw on, by defualt a new figure is made
+    figsize : tuple
+        Size of the new figure
+
+    Returns
+    -------
+    ax : plt.Axes
+        The Axes the grid was drawn on
+    """
+    n_rows, n_cols, trace_length = np.shape(traces)
+    traces = np.asarray(traces, dtype=np.float64)
+    if ylim is None:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            low = np.min(traces, axis=-1, keepdims=True)
+            span = np.max(traces, axis=-1, keepdims=True) - low
+            scaled = np.where(span > 0, (traces - low) / span, 0.5)
+    else:
+        scaled = np.clip((traces - ylim[0]) / (ylim[1] - ylim[0]), 0, 1)
+    if empty_cells is not None:
+        scaled = np.where(empty_cells[..., np.newaxis], 0, scaled)
+
+    # Position of every sample inside a cell, then offset each cell
+    cell_size = 1 - 2 * cell_margin
+    x_in_cell = cell_margin + cell_size * np.linspace(0, 1, trace_length)
+    segments = np.empty((n_rows, n_cols, trace_length, 2))
+    segments[..., 0] = np.arange(n_cols)[np.newaxis, :, np.newaxis] + x_in_cell
+    segments[..., 1] = ((n_rows - 1 - np.arange(n_rows))[:, np.newaxis, np.newaxis]
+                        + cell_margin + cell_size * scaled)
+
+    line_colors = np.full(n_rows * n_cols, color, dtype=object)
+    if empty_cells is not None:
+        line_colors[np.ravel(empty_cells)] = empty_color
+
+    if ax is None:
+        _, ax = plt.subplots(figsize=figsize)
+    ax.add_collection(LineCollection(segments.reshape(-1, trace_length, 2),
+                                     colors=list(line_colors),
+                                     linewidths=linewidth))
+    ax.set_xlim(0, n_cols)
+    ax.set_ylim(0, n_rows)
+    ax.set_aspect('equal')
+    ax.axis('off')
+
+    return ax
+
+
 def plot_mU_matrix(weight_cube: np.ndarray, 
                    data: np.ndarray,
                    set_costum_min_max: bool = False,
@@ -48,12 +120,20 @@ def plot_mU_matrix(weight_cube: np.ndarray,
                    density_vmin: float = None,
                    density_vmax: float = None,
                   log_density: bool = False,
-                  fence_on: bool = True):
+                  fence_on: bool = True,
+                  pxl_per_cell: int = 12,
+                  fence_width: int = 2,
+                  output_img_name: str = 'mU_matrix.png',
+                  save_fig: bool = False,
+                  weights: np.ndarray = None):
 
     """
     Plots the mU-matrix; defined here as the data density per cell
     and the lines between cells representing the distance between
     adjacent cells.
+
+    The image is composited with mU_matrix_image and drawn with a single
+    imshow, so the cost does not grow with the number of matplotlib artists.
     
     Parameters:
     -------------------
@@ -75,143 +155,200 @@ def plot_mU_matrix(weight_cube: np.ndarray,
         If True applies a log to the density matrix calculation
     fence_on : bool
         If False removes fences from mU matrix image
+    pxl_per_cell : int
+        Width in pixels of each cell in the image
+    fence_width : int
+        Width in pixels of the fences between cells
+    output_img_name : str
+        name of file to save the image to + path
+    save_fig : bool
+        If True the image is written directly to output_img_name as a PNG
+        instead of being shown
+    weights : np.ndarray
+        Optional weight of each data point for the density (e.g. its area)
 
     Returns:
     ----------------
     None
     
+    """
+    mU_image = mU_matrix_image(weight_cube, data,
+                               set_costum_min_max=set_costum_min_max,
+                               fence_vmin=fence_vmin,
+                               fence_vmax=fence_vmax,
+                               density_vmax=density_vmax,
+                               log_density=log_density,
+                               fence_on=fence_on,
+                               pxl_per_cell=pxl_per_cell,
+                               fence_width=fence_width,
+                               weights=weights)
+
+    if save_fig == True:
+        plt.imsave(output_img_name, mU_image)
+        return
+
+    fig, ax = plt.subplots()
+    ax.imshow(mU_image, interpolation='nearest')
+    ax.set_aspect('equal')
+    ax.axis('off')  # Turn off the axis
+    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
+    plt.show()    
+
+
+def mU_matrix_image(weight_cube: np.ndarray, 
+                    data: np.ndarray,
+                    set_costum_min_max: bool = False,
+                    fence_vmin: float = None,
+                    fence_vmax: float = None,
+                    density_vmax: float = None,
+                    log_density: bool = False,
+                    fence_on: bool = True,
+                    pxl_per_cell: int = 12,
+                    fence_width: int = 2,
+                    weights: np.ndarray = None) -> np.ndarray:
+    """
+    Composites the density and fence layers of the mU-matrix into one RGB image.
+
+    Neuron (i, j) is drawn as a pxl_per_cell wide square in block row i and
+    block column j, colored by its data density. The fence_width pixels
+    between two cells are colored in gray scale by the distance between the
+    neurons, where fences meet the brightest adjacent fence is used.
+
+    Parameters
+    ----------
+    weight_cube : np.ndarray
+        Weight cube after an SOM has been trained
+    data : np.ndarray
+        Data used to train the SOM or data to be mapped to the SOM
+    set_costum_min_max : bool
+        If True, the user can set the vmin and vmax for fences and the vmax
+        for density
+    fence_vmin : float
+        Minimum value for the fences, by defualt 0
+    fence_vmax : float
+        Maximum value for the fences, by defualt the largest fence
+    density_vmax : float
+        Maximum value for the density matrix
+    log_density : bool
+        If True applies a log to the density matrix calculation
+    fence_on : bool
+        If False the fences are drawn in black
+    pxl_per_cell : int
+        Width in pixels of each cell in the image
+    fence_width : int
+        Width in pixels of the fences between cells
+    weights : np.ndarray
+        Optional weight of each data point for the density (e.g. its area)
+
+    Returns
+    -------
+    mU_image : np.ndarray
+        RGB image as uint8, shape (height * (pxl_per_cell + fence_width) -
+        fence_width, width * (pxl_per_cell + fence_width) - fence_width, 3)
     """
     height, width, som_dim = np.shape(weight_cube)
-    w_cube = weight_cube
     data_points, data_dim = np.shape(data)
     assert som_dim == data_dim
     
     cmap = LinearSegmentedColormap.from_list('black_to_red', ['black', 'red'])
-    
-    som_shape = (height, width)
 
-    # Initialize grid to store counts of data points mapped to each node
-    count_grid = np.zeros(som_shape)
-
-    # Calculate the BMU (Best Matching Unit) for each data point
-    for point in data:
-        # Compute distances to each neuron
-        distances = np.linalg.norm(weight_cube - point, axis=-1)
-        # Find index of the neuron with the smallest distance
-        bmu_index = np.unravel_index(np.argmin(distances), som_shape)
-        count_grid[bmu_index] += 1
+    # Count the data points mapped to each node from one chunked recall
+    count_grid = SOM_density_recall(data, weight_cube, weights, log_density)
 
     # Normalize count_grid for color mapping
-    if log_density == True:
-        count_grid = np.log10(count_grid + 1)
-        
-    if set_costum_min_max is False:
-        norm_counts = count_grid / np.max(count_grid)
+    if set_costum_min_max == False or density_vmax == None:
+        density_max = np.max(count_grid)
     else:
-        if density_vmax == None:
-            norm_counts = count_grid / np.max(count_grid)
-        else:
-            norm_counts = count_grid / np.max(density_vmax)
-    
-    # In progress
-    if fence_on:
-        down_shifted_weight_cube = np.vstack((w_cube[-1:, :, :], 
-                                               w_cube[:-1, :, :]))
-
-        right_shifted_weight_cube = np.hstack((w_cube[:, -1:, :], 
-                                             w_cube[:, :-1, :], ))
-
-        vertical_lines = np.sqrt(np.sum((w_cube - down_shifted_weight_cube) ** 2, 
-                                        axis=-1))
-        horizontal_lines = np.sqrt(np.sum((w_cube - right_shifted_weight_cube) ** 2, 
-                                        axis=-1))
-
-        # Need to drop first row/column since its comparing opposite edges
-        if set_costum_min_max == False:
-            vmin = min(np.min(vertical_lines[1:,:]), np.min(horizontal_lines[:,1:]))
-            vmax = max(np.max(vertical_lines[1:,:]), np.min(horizontal_lines[:,1:]))
-        elif set_costum_min_max == True:
-            if ((fence_vmin or fence_vmax) == None):
-                vmin = min(np.min(vertical_lines[1:,:]), np.min(horizontal_lines[:,1:]))
-                vmax = max(np.max(vertical_lines[1:,:]), np.min(horizontal_lines[:,1:]))
-            else:
-                vmin = fence_vmin
-                vmax = fence_vmax
-    
-    fig, ax = plt.subplots()
-    
-    for i in range(height):
-        for j in range(width):
-            ax.add_patch(plt.Rectangle((j, height - i - 1), 1, 1,
-                                       color=cmap(norm_counts[i, j]),
-                                       ec='black'))
-    
-    if fence_on:
-        for i in range(height):
-            for j in range(width):
-                if i < height - 1:  # Vertical line (between current and below)
-                    #u_diff = np.linalg.norm(weightcube[i, j] - weightcube[i + 1, j])
-                    color = plt.cm.gray(vertical_lines[i+1,j] / vmax)
-                    ax.plot([j, j + 1], [height - i - 1, height - i - 1], color=color)
-
-                if j < width - 1:
-                    color = plt.cm.gray(horizontal_lines[i,j+1] / vmax)
-                    ax.plot([j + 1, j + 1], [height - i - 1, height - i], color=color)
-            
-    
-    ax.set_xlim(0, width)
-    ax.set_ylim(0, height)
-    ax.set_aspect('equal')
-    ax.axis('off')  # Turn off the axis
-    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
-    plt.show()    
+        density_max = np.max(density_vmax)
+    # No data on the map (or a vmax of 0) is drawn as an empty map
+    norm_counts = count_grid / density_max if density_max > 0 else np.zeros_like(count_grid)
+    cell_rgb = cmap(np.clip(norm_counts, 0, 1), bytes=True)[..., :3]
+
+    step = pxl_per_cell + fence_width
+    row_cell, row_offset = np.divmod(np.arange(height * step - fence_width), step)
+    col_cell, col_offset = np.divmod(np.arange(width * step - fence_width), step)
+    mU_image = cell_rgb[row_cell[:, np.newaxis], col_cell[np.newaxis, :]]
+
+    if fence_width == 0:
+        return mU_image
+
+    cell_rows = np.flatnonzero(row_offset < pxl_per_cell)
+    cell_cols = np.flatnonzero(col_offset < pxl_per_cell)
+    fence_rows = np.flatnonzero(row_offset >= pxl_per_cell)
+    fence_cols = np.flatnonzero(col_offset >= pxl_per_cell)
+
+    if not fence_on:
+        mU_image[fence_rows, :] = 0
+        mU_image[:, fence_cols] = 0
+        return mU_image
+
+    horizontal_lines, vertical_lines, _ = compute_fences(weight_cube)
+
+    vmin = 0
+    vmax = max(np.max(vertical_lines, initial=0), np.max(horizontal_lines, initial=0))
+    if set_costum_min_max == True:
+        if fence_vmin != None:
+            vmin = fence_vmin
+        if fence_vmax != None:
+            vmax = fence_vmax
+
+    # Where four cells meet use the brightest of the fences touching the corner
+    corners = np.maximum(np.maximum(vertical_lines[:, :-1], vertical_lines[:, 1:]),
+                         np.maximum(horizontal_lines[:-1, :], horizontal_lines[1:, :]))
+
+    def gray(fences):
+        if vmax <= vmin:
+            # All the fences are equal (e.g. a constant weight cube)
+            return plt.cm.gray(np.zeros_like(fences), bytes=True)[..., :3]
+        return plt.cm.gray(np.clip((fences - vmin) / (vmax - vmin), 0, 1), bytes=True)[..., :3]
+
+    mU_image[np.ix_(fence_rows, cell_cols)] = gray(vertical_lines)[
+        np.ix_(row_cell[fence_rows], col_cell[cell_cols])]
+    mU_image[np.ix_(cell_rows, fence_cols)] = gray(horizontal_lines)[
+        np.ix_(row_cell[cell_rows], col_cell[fence_cols])]
+    mU_image[np.ix_(fence_rows, fence_cols)] = gray(corners)[
+        np.ix_(row_cell[fence_rows], col_cell[fence_cols])]
+
+    return mU_image
 
     
-def calculate_u_matrix(weight_cube: np.ndarray):
+def calculate_u_matrix(weight_cube: np.ndarray,
+                       topology: str = "rectangular",
+                       toroidal: bool = False) -> np.ndarray:
     """
-    Calculate the distance (fences) for each adjacent neuron in an SOM.
+    Calculate the mean distance (fences) from each neuron to its adjacent
+    neurons in an SOM.
 
-    (Need to review this function, dont fully remember what is going on in the
-    implementation)
+    See compute_fences for the fences themselves.
 
     Parameters
     ----------
     weight_cube : np.ndarray
         The weight cube for the SOM
+    topology : str
+        Lattice of the SOM, either "rectangular" or "hexagonal"
+    toroidal : bool
+        If True the edges of the map wrap around
 
     Returns
     -------
     u_matrix : np.ndarray
         The distance matrix for neurons in the SOM
     """
-    x, y, _ = weight_cube.shape
-    u_matrix = np.zeros((x, y))
-
-    for i in range(x):
-        for j in range(y):
-            neighbors = []
-            if i > 0:
-                neighbors.append(weight_cube[i-1, j])
-            if i < x-1:
-                neighbors.append(weight_cube[i+1, j])
-            if j > 0:
-                neighbors.append(weight_cube[i, j-1])
-            if j < y-1:
-                neighbors.append(weight_cube[i, j+1])
-
-            distances = [np.linalg.norm(weight_cube[i, j] - neighbor) for neighbor in neighbors]
-            u_matrix[i, j] = np.mean(distances)
+    _, _, u_matrix = compute_fences(weight_cube, topology, toroidal)
 
     return u_matrix
 
 def calculate_density_matrix(weight_cube: np.ndarray, 
                              u_matrix: np.ndarray, 
-                             dataset: np.ndarray) -> np.ndarray:
+                             dataset: np.ndarray,
+                             weights: np.ndarray = None,
+                             log_density: bool = False) -> np.ndarray:
     """
     Calculate density matrix for a given som weight cube and dataset.
 
-    **This function is not working as intended, need to review it**
-    It is not acutally using the information of the u_matrix
+    The u_matrix is only used for the shape of the map, see
+    SOM_density_recall to compute the density from the weight cube alone.
 
     Parameters
     ----------
@@ -222,24 +359,18 @@ def calculate_density_matrix(weight_cube: np.ndarray,
         output from calculate_u_matrix
     dataset:    
         Data in the same form given to the SOM as input for training
+    weights : np.ndarray
+        Optional weight of each data point (e.g. its area)
+    log_density : bool
+        If True returns log10(density + 1)
 
     Returns
     -------
     density_matrix : np.ndarray
         The density matrix for the given dataset
     """
-    x, y = u_matrix.shape
-    density_matrix = np.zeros((x, y))
-
-    for data_point in dataset:
-        distances = cdist(weight_cube.reshape(-1, weight_cube.shape[-1]), [data_point], metric='euclidean')
-        #print(np.shape(weight_cube.reshape(-1, weight_cube.shape[-1])))
-        #print(np.shape(data_point))
-        bmus = np.argmin(distances)
-        x_idx, y_idx = np.unravel_index(bmus, (x, y))
-        density_matrix[x_idx, y_idx] += 1
-
-    return density_matrix
+    bmu_indices = SOM_bmu_recall(dataset, weight_cube)
+    return density_matrix(bmu_indices, u_matrix.shape, weights, log_density)
 
 def display_density_matrix(density_matrix: np.ndarray):
     """
@@ -257,12 +388,15 @@ def display_density_matrix(density_matrix: np.ndarray):
     plt.show()
     
 def rise_time_vs_area_SOM_clusters(data: np.ndarray, colors: Union[list, np.ndarray], 
-                                   n_rows: int, n_cols: int):
+                                   n_rows: int, n_cols: int,
+                                   max_points_per_cluster: int = None,
+                                   seed: int = None):
     """
     Plots the rise time vs area for each cluster in the SOM.
 
     Takes in the data from peaklet level data using the SOM classification
-    and outputs a grid of plots showing each cluster.
+    and outputs a grid of plots showing each cluster. The data is grouped by
+    cluster once with group_by_label, so each plot gets a contiguous slice.
 
     Parameters
     ----------
@@ -275,17 +409,30 @@ def rise_time_vs_area_SOM_clusters(data: np.ndarray, colors: Union[list, np.ndar
         number of coulmns in grid with the plots 
     n_cols:   
         number of rows in grid with the plots 
+    max_points_per_cluster : int
+        If given, clusters with more peaks are randomly downsampled to this
+        many points before plotting
+    seed : int
+        Seed for the random downsampling
     """
-    fig, ax = plt.subplots(nrows=n_rows, ncols=n_cols, figsize=(24, 18))
+    fig, ax = plt.subplots(nrows=n_rows, ncols=n_cols, figsize=(24, 18), squeeze=False)
 
     # Generalize this later
     colors = np.vstack((colors, np.array([0,0,0]).reshape((1, 3))))
+
+    unique_labels, order, offsets = group_by_label(data['type'], max_points_per_cluster, seed)
+    # Only gather the two fields we plot, in cluster order
+    area = data['area'][order]
+    rise_time = -data['area_decile_from_midpoint'][order, 1]
+
     num = 0
     for i in np.arange(n_rows):
         for j in np.arange(n_cols):
-            ax[i,j].scatter(data['area'][data['type'] == num],
-                            -data['area_decile_from_midpoint'][data['type'] == num][:,1], 
-                            s=0.5, color = colors[num]/255, alpha = 1)
+            group = np.searchsorted(unique_labels, num)
+            if group < len(unique_labels) and unique_labels[group] == num:
+                group_slice = slice(offsets[group], offsets[group + 1])
+                ax[i,j].scatter(area[group_slice], rise_time[group_slice],
+                                s=0.5, color = colors[num]/255, alpha = 1)
             ax[i,j].set_xscale('log')
             ax[i,j].set_yscale('log')
             ax[i,j].set_xlim(1,10000000)
@@ -297,70 +444,58 @@ def SOM_gird_avg_wavefrom_per_cell(input_data: np.ndarray,
                                    weight_cube: np.ndarray, 
                                    output_img_name: str = 'avg_waveform.png', 
                                    save_fig: bool = False,
-                                   is_struct_array: bool = True):
+                                   is_struct_array: bool = True,
+                                   data_in_SOM_fmt: np.ndarray = None,
+                                   aggregates: dict = None):
     """
     Generates image of the average waveform for each cell in the SOM grid.
 
-    This function take in a nunr file from NeuroScope and converts it into a useful format to us
-    Then it uses the data in the nunr file to identify which data samples belong to each PE
-    Finally it takes this data and plots it such that we can overlay any data we want.
+    The data is recalled once and the mean waveform of every neuron is
+    computed with neuron_aggregates, the plot is then drawn from those
+    arrays with plot_neuron_traces. Neurons without any data are drawn as a
+    flat red line.
 
     Parameters
     ----------
-    input_data : int
+    input_data : np.ndarray
         waveforms (peaks, peaklets)
-    nunr_file_input : str 
-        text file output from neuroscope
-    grid_x_dim : int   
-        SOM x-dimension
-    grid_y_dim: int  
-        SOM y-dimension
-    x_dim_data_cube : int 
-        x-dimension of the input data cube for the SOM
+    weight_cube : np.ndarray
+        Weight cube after an SOM has been trained
     output_img_name : str      
         name of file to save the image to + path
+    save_fig : bool
+        If True saves the image to output_img_name
     is_struct_array : bool 
         does the data need to be accessed as peaks['data']?
+    data_in_SOM_fmt : np.ndarray
+        input vectors of the data used for the recall, by defualt input_data
+        is used
+    aggregates : dict
+        output of neuron_aggregates for the waveforms, if given the recall
+        is skipped
     """
-    
-    # Plotting section
     xgrid, ygrid, dim = np.shape(weight_cube)
-    datapoints, data_dim = np.shape(input_data)
-    assert dim == data_dim
-    
-    # Need to assign a location for each tuple
-    # Need to also take into account dead neurons
-    location_info = SOM_location_recall(weight_cube, input_data)
-
-    fig, ax = plt.subplots(nrows=ygrid, ncols=xgrid, figsize=(5, 5))
-
-    a = 1
-    # Modify this monstrosity to deal with the current data formate
-    # Remember dead neurons !!!
-    for i in range(ygrid):
-        for j in range(xgrid):
-            loc_data = input_data[np.all(location_info.T == [j,i], axis=1)]
-            if loc_data.size > 0:
-                if is_struct_array == True:
-                    ax[i,j].plot(np.mean(loc_data['data'], axis = 0), alpha = a, color = 'black')
-                elif is_struct_array == False:
-                    ax[i,j].plot(np.mean(loc_data, axis = 0), alpha = a, color = 'black')
-            else:
-                # Maybe replace this with red X's?
-                ax[i,j].plot(np.zeros(data_dim), alpha = a, color = 'red')
-
-            #kind = kind + 1
-            #ax[i,j].set_xlabel('Sample #')
-            if is_struct_array == True:
-                ax[i,j].set_xlim(0, data_dim)
-                ax[i,j].set_ylim(0, 1)
-            else:
-                ax[i,j].set_xlim(0, data_dim)
-                ax[i,j].set_ylim(0, 1)
-            ax[i,j].axis('off')
+
+    if aggregates is None:
+        if data_in_SOM_fmt is None:
+            data_in_SOM_fmt = input_data
+        datapoints, data_dim = np.shape(data_in_SOM_fmt)
+        assert dim == data_dim
+
+        if is_struct_array == True:
+            waveforms = input_data['data']
+        else:
+            waveforms = input_data
+        # Dead neurons end up with a count of 0
+        aggregates = SOM_neuron_aggregates(data_in_SOM_fmt, weight_cube, waveforms)
+
+    empty_cells = aggregates['count'] == 0
+
+    # Plotting section
+    ax = plot_neuron_traces(aggregates['mean'], empty_cells=empty_cells)
 
     if save_fig == True:
-        fig.savefig(output_img_name, bbox_inches='tight')
+        ax.figure.savefig(output_img_name, bbox_inches='tight')
 
 
 def SOM_location_recall(weight_cube: np.ndarray,
@@ -389,10 +524,7 @@ def SOM_location_recall(weight_cube: np.ndarray,
     # Want to make it so it works with different metrics in the future
     #array_to_fill = np.empty((len(normalized_data), 2))
     [SOM_xdim, SOM_ydim, _] = weight_cube.shape
-    distances = cdist(
-        weight_cube.reshape(-1, weight_cube.shape[-1]), normalized_data, metric="euclidean"
-    )
-    w_neuron = np.argmin(distances, axis=0)
+    w_neuron = SOM_bmu_recall(normalized_data, weight_cube)
     x_idx, y_idx = np.unravel_index(w_neuron, (SOM_xdim, SOM_ydim))
     array_to_fill = np.vstack((y_idx, x_idx))
-    return array_to_fill
\ No newline at end of file
+    return array_to_fill
@@ -1 +1,4 @@
-from .SOM_plots import *
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__ = attach(__name__, ["SOM_plots", "u_matrix", "nueroscope_plots"],
+                              search=["SOM_plots", "u_matrix"])
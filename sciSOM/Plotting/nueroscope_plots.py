@@ -1,9 +1,12 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from typing import Iterable, Tuple
+from ..SOM_recall.map_statistics import neuron_aggregates
+from .SOM_plots import plot_neuron_traces
 
 
 def SOM_gird_avg_wavefrom_per_cell_ns(input_data: np.ndarray, 
-                                   weight_cube: np.ndarray, 
+                                   nunr_file_input: str,
                                    grid_x_dim: int, 
                                    grid_y_dim: int, 
                                    x_dim_data_cube: int, 
@@ -35,47 +38,109 @@ def SOM_gird_avg_wavefrom_per_cell_ns(input_data: np.ndarray,
     """
     
     # Import nunr file and convert it into a useful format
-    import io
-    nunr_file = []
-    with io.open(nunr_file_input, mode="r", encoding="utf-8") as f:
-        next(f)
-        #next(f)
-        for line in f:
-            nunr_file.append(line.split())
-    
-    PE_data = nunr_to_obj(nunr_file, x_dim_data_cube)
-    
-    # Plotting section
+    indptr, sample_indices = read_nunr(nunr_file_input, x_dim_data_cube)
+
+    # NeuroScope numbers the PEs from 1 row by row starting at the bottom of
+    # the map, we draw the top row first
     xgrid = grid_x_dim
     ygrid = grid_y_dim
-    fig, ax = plt.subplots(nrows=ygrid, ncols=xgrid, figsize=(20, 20))
-
-    a = 1
-    for i in np.arange(ygrid):
-        for j in np.arange(xgrid):
-            if PE_data[(i+1) + (j)*xgrid] != []:
-                [_, data_dim] = np.shape(input_data)
-                data = input_data[np.array(PE_data[(i+1) + (j)*xgrid])-1]
-                if is_struct_array == True:
-                    ax[39-j,i].plot(np.mean(data['data'], axis = 0), alpha = a, color = 'black')
-                elif is_struct_array == False:
-                    ax[39-j,i].plot(np.mean(data, axis = 0), alpha = a, color = 'black')
-            if PE_data[(i+1) + (j)*xgrid] == []:
-                if is_struct_array == True:
-                    ax[39-j,i].plot(np.zeros(200), alpha = a, color = 'black')
-                else:
-                    ax[39-j,i].plot(np.zeros(data_dim), alpha = a, color = 'black')
-            #kind = kind + 1
-            #ax[i,j].set_xlabel('Sample #')
-            if is_struct_array == True:
-                ax[i,j].set_xlim(0, 200)
-            else:
-                ax[i,j].set_xlim(0, data_dim)
-            ax[i,j].axis('off')
+    n_neurons = min(len(indptr) - 1, xgrid * ygrid)
+    neuron = np.arange(n_neurons)
+    grid_position = (ygrid - 1 - neuron // xgrid) * xgrid + neuron % xgrid
+    counts = np.diff(indptr[:n_neurons + 1])
+    bmu_indices = np.repeat(grid_position, counts)
+
+    if is_struct_array == True:
+        waveforms = input_data['data']
+    else:
+        waveforms = input_data
+    aggregates = neuron_aggregates(bmu_indices, 
+                                   waveforms[sample_indices[:indptr[n_neurons]] - 1],
+                                   (ygrid, xgrid))
+
+    # Plotting section
+    fig, ax = plt.subplots(figsize=(20, 20))
+    plot_neuron_traces(aggregates['mean'], empty_cells=aggregates['count'] == 0,
+                       ylim=None, empty_color='black', ax=ax)
 
     fig.savefig(output_img_name, bbox_inches='tight')
 
 
+def read_nunr(nunr_file_input: str, x_data_img: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reads a nunr file from NeuroScope in one pass into flat arrays.
+
+    The samples of PE k (counting from 1 as NeuroScope does) are
+    sample_indices[indptr[k-1]:indptr[k]], each a 1 based index into the
+    data (x + (y - 1) * x_data_img for data pixel (x, y)).
+
+    Parameters
+    ----------
+    nunr_file_input : str
+        text file output from neuroscope
+    x_data_img : int
+        x-dimension of the input data cube for the SOM
+
+    Returns
+    -------
+    indptr : np.ndarray
+        Start of the samples of every PE, with the total appended
+    sample_indices : np.ndarray
+        1 based data index of every sample, grouped by PE
+    """
+    import io
+    with io.open(nunr_file_input, mode="r", encoding="utf-8") as f:
+        next(f)
+        return _parse_nunr_lines((line.split() for line in f), x_data_img)
+
+
+def _parse_nunr_lines(nunr_lines: Iterable[list], x_data_img: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parses the split lines of a nunr file (without the header) into CSR
+    style arrays, see read_nunr.
+
+    From the 4th entry of each line every 3 entries hold the x and y of a
+    sample followed by a char we dont care about. The pair ('152', '991')
+    marks the end of the samples of a PE.
+    """
+    x_tokens = []
+    y_tokens = []
+    counts = []
+    for tokens in nunr_lines:
+        n_pairs = int(len(tokens[2:]) / 3)
+        x_line = tokens[3:3 + 3 * n_pairs:3]
+        y_line = tokens[4:4 + 3 * n_pairs:3]
+        n_pairs = len(y_line)
+
+        # Find the end marker, '152' rarely shows up so this is cheap
+        start = 0
+        while '152' in x_line[start:n_pairs]:
+            end_marker = x_line.index('152', start, n_pairs)
+            if y_line[end_marker] == '991':
+                n_pairs = end_marker
+                break
+            start = end_marker + 1
+
+        x_tokens.extend(x_line[:n_pairs])
+        y_tokens.extend(y_line[:n_pairs])
+        counts.append(n_pairs)
+
+    x = _tokens_to_int(x_tokens)
+    y = _tokens_to_int(y_tokens)
+    sample_indices = x + (y - 1) * x_data_img
+    indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    return indptr, sample_indices
+
+
+def _tokens_to_int(tokens: list) -> np.ndarray:
+    # Parsing all the numbers at once is much faster than one at a time
+    if len(tokens) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.fromstring(' '.join(tokens), dtype=np.int64, sep=' ')
+
+
 def nunr_file_to_list(nunr_file: list):
     """
     Extracts the PE data from a nunr file and converts it into a list.
@@ -112,4 +177,6 @@ def tuple_list_to_list(tuple_list: tuple, x_data_img: int):
     return obj
 
 def nunr_to_obj(nunr_file: np.ndarray, x_data_img: int):
-    return tuple_list_to_list(nunr_file_to_list(nunr_file), x_data_img)
\ No newline at end of file
+    indptr, sample_indices = _parse_nunr_lines(nunr_file, x_data_img)
+    return {i + 1: sample_indices[indptr[i]:indptr[i + 1]].tolist()
+            for i in range(len(indptr) - 1)}
\ No newline at end of file
@@ -0,0 +1,136 @@
+import numpy as np
+from typing import Tuple
+
+
+def compute_fences(weight_cube: np.ndarray,
+                   topology: str = "rectangular",
+                   toroidal: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the fences (distances between adjacent neurons) and the U-matrix
+    of an SOM in a single vectorized pass.
+
+    Neuron (i, j) is the entry weight_cube[i, j]. Horizontal fences separate
+    neurons along the second axis, vertical fences separate neurons along the
+    first axis. The U-matrix is the mean distance from every neuron to all of
+    its neighbors.
+
+    For a hexagonal lattice odd rows (first axis) are shifted half a cell
+    towards larger j, so every neuron has two neighbors in the row bellow.
+    The vertical fences then have an extra leading axis of size 2: index 0 is
+    the distance to (i+1, j) and index 1 the distance to (i+1, j-1) for even
+    rows or (i+1, j+1) for odd rows. Fences to neurons outside of the map are
+    set to nan.
+
+    Parameters
+    ----------
+    weight_cube : np.ndarray
+        The weight cube for the SOM, shape (x_dim, y_dim, input_dim)
+    topology : str
+        Lattice of the SOM, either "rectangular" or "hexagonal"
+    toroidal : bool
+        If True the edges of the map wrap around, otherwise neurons at the
+        edges only have the neighbors that are inside the map
+
+    Returns
+    -------
+    horizontal_fences : np.ndarray
+        Distance between (i, j) and (i, j+1), shape (x_dim, y_dim - 1) or
+        (x_dim, y_dim) if toroidal
+    vertical_fences : np.ndarray
+        Distance between (i, j) and (i+1, j), shape (x_dim - 1, y_dim) or
+        (x_dim, y_dim) if toroidal, with the extra leading axis for hexagonal
+        lattices
+    u_matrix : np.ndarray
+        Mean distance of each neuron to its neighbors, shape (x_dim, y_dim)
+    """
+    if topology not in ("rectangular", "hexagonal"):
+        raise ValueError(f"Topology {topology} is not supported. Choose from rectangular or hexagonal")
+
+    x, y, _ = weight_cube.shape
+    if topology == "hexagonal" and toroidal and x % 2 != 0:
+        raise ValueError("A toroidal hexagonal map needs an even number of rows")
+
+    u_sum = np.zeros((x, y))
+    u_count = np.zeros((x, y))
+
+    if toroidal:
+        horizontal_fences = _distance(weight_cube, np.roll(weight_cube, -1, axis=1))
+        _accumulate_toroidal(u_sum, u_count, horizontal_fences, (0, 1))
+
+        vertical_fences = _distance(weight_cube, np.roll(weight_cube, -1, axis=0))
+        _accumulate_toroidal(u_sum, u_count, vertical_fences, (1, 0))
+
+        if topology == "hexagonal":
+            # Even rows connect to j-1, odd rows to j+1 in the next row
+            diagonal_fences = np.empty((x, y))
+            below = np.roll(weight_cube, -1, axis=0)
+            diagonal_fences[0::2] = _distance(weight_cube[0::2],
+                                              np.roll(below[0::2], 1, axis=1))
+            diagonal_fences[1::2] = _distance(weight_cube[1::2],
+                                              np.roll(below[1::2], -1, axis=1))
+            u_sum += diagonal_fences
+            u_sum[1::2] += np.roll(diagonal_fences[0::2], -1, axis=1)
+            u_sum[0::2] += np.roll(np.roll(diagonal_fences[1::2], 1, axis=0), 1, axis=1)
+            u_count += 2
+            vertical_fences = np.stack((vertical_fences, diagonal_fences))
+    else:
+        horizontal_fences = _distance(weight_cube[:, :-1], weight_cube[:, 1:])
+        u_sum[:, :-1] += horizontal_fences
+        u_sum[:, 1:] += horizontal_fences
+        u_count[:, :-1] += 1
+        u_count[:, 1:] += 1
+
+        vertical_fences = _distance(weight_cube[:-1], weight_cube[1:])
+        u_sum[:-1] += vertical_fences
+        u_sum[1:] += vertical_fences
+        u_count[:-1] += 1
+        u_count[1:] += 1
+
+        if topology == "hexagonal":
+            diagonal_fences = np.full((max(x - 1, 0), y), np.nan)
+            even = diagonal_fences[0::2]
+            odd = diagonal_fences[1::2]
+            n_even, n_odd = len(even), len(odd)
+
+            # Even row i connects (i, j) with (i+1, j-1)
+            even[:, 1:] = _distance(weight_cube[0:2 * n_even:2, 1:],
+                                    weight_cube[1:2 * n_even + 1:2, :-1])
+            u_sum[0:2 * n_even:2, 1:] += even[:, 1:]
+            u_sum[1:2 * n_even + 1:2, :-1] += even[:, 1:]
+            u_count[0:2 * n_even:2, 1:] += 1
+            u_count[1:2 * n_even + 1:2, :-1] += 1
+
+            # Odd row i connects (i, j) with (i+1, j+1)
+            odd[:, :-1] = _distance(weight_cube[1:2 * n_odd + 1:2, :-1],
+                                    weight_cube[2:2 * n_odd + 2:2, 1:])
+            u_sum[1:2 * n_odd + 1:2, :-1] += odd[:, :-1]
+            u_sum[2:2 * n_odd + 2:2, 1:] += odd[:, :-1]
+            u_count[1:2 * n_odd + 1:2, :-1] += 1
+            u_count[2:2 * n_odd + 2:2, 1:] += 1
+
+            vertical_fences = np.stack((vertical_fences, diagonal_fences))
+
+    # A 1x1 map has no neighbors, avoid dividing by zero
+    u_matrix = np.divide(u_sum, u_count, out=np.zeros((x, y)), where=u_count > 0)
+
+    return horizontal_fences, vertical_fences, u_matrix
+
+
+def _distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Euclidean distance along the last axis between two blocks of neurons.
+    """
+    diff = a - b
+    return np.sqrt(np.einsum('...k,...k->...', diff, diff))
+
+
+def _accumulate_toroidal(u_sum: np.ndarray,
+                         u_count: np.ndarray,
+                         fences: np.ndarray,
+                         shift: Tuple[int, int]):
+    """
+    Adds the fences of a wrapped map to both neurons they separate.
+    """
+    u_sum += fences
+    u_sum += np.roll(fences, shift, axis=(0, 1))
+    u_count += 2
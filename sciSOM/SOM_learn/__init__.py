@@ -1 +1,4 @@
-from .train import *
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__ = attach(__name__, ["train", "sweep", "early_stopping", "profiling", "callbacks", "batch", "hogwild", "multiresolution",
+                                         "initialization"])
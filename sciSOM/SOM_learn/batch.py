@@ -0,0 +1,444 @@
+import numpy as np
+import multiprocessing
+import traceback
+from abc import ABC, abstractmethod
+from multiprocessing import shared_memory
+from typing import Tuple
+from ..SOM_recall.recall import SOM_bmu_recall
+from .profiling import NULL_PROFILER
+
+
+def batch_accumulate(data_in_SOM_fmt: np.ndarray,
+                     weight_cube: np.ndarray,
+                     chunk_size: int = None,
+                     method: str = "numba",
+                     sample_weight: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the BMU of every data point and sums the data points mapped to
+    each neuron, the part of a batch SOM epoch that runs on the data. The
+    sums of several shards can simply be added together.
+
+    With method "numba" the compiled kernel accumulate_bmu_sums runs on all
+    the numba threads with one accumulator per thread. With "numpy" each
+    chunk is recalled with SOM_bmu_recall, sorted by BMU and summed with
+    np.add.reduceat.
+
+    Parameters
+    ----------
+    data_in_SOM_fmt : np.ndarray
+        data in the SOM format, shape (n_samples, input_dim)
+    weight_cube : np.ndarray
+        Current SOM weight cube
+    chunk_size : int
+        Number of data points processed at a time, by defualt 2**20 for
+        numba and 2**16 for numpy
+    method : str
+        numba or numpy
+    sample_weight : np.ndarray
+        Optional weight of every data point (e.g. the counts of binned or
+        deduplicated data), the sums and counts are weighted
+
+    Returns
+    -------
+    sums : np.ndarray
+        Sum of the data points mapped to each neuron, shape like weight_cube
+    counts : np.ndarray
+        Number of data points mapped to each neuron (sum of their weights),
+        shape (x_dim, y_dim)
+    """
+    x_dim, y_dim, input_dim = weight_cube.shape
+    n_neurons = x_dim * y_dim
+    if data_in_SOM_fmt.shape[1] != input_dim:
+        raise ValueError(f"Data has {data_in_SOM_fmt.shape[1]} features, the weight cube {input_dim}")
+
+    if method == "numba":
+        from .batch_kernels import accumulate_bmu_sums
+        import numba
+
+        chunk_size = chunk_size or 2**20
+        weights = np.ascontiguousarray(weight_cube.reshape(n_neurons, input_dim), dtype=np.float64)
+        thread_sums = np.zeros((numba.get_num_threads(), n_neurons, input_dim))
+        thread_counts = np.zeros((numba.get_num_threads(), n_neurons))
+        for start in range(0, len(data_in_SOM_fmt), chunk_size):
+            chunk = data_in_SOM_fmt[start:start + chunk_size]
+            if chunk.dtype != np.float32:
+                chunk = np.ascontiguousarray(chunk, dtype=np.float64)
+            if sample_weight is None:
+                chunk_weight = np.ones(len(chunk))
+            else:
+                chunk_weight = np.ascontiguousarray(sample_weight[start:start + chunk_size], dtype=np.float64)
+            accumulate_bmu_sums(np.ascontiguousarray(chunk), chunk_weight, weights, thread_sums, thread_counts)
+        return (thread_sums.sum(axis=0).reshape(weight_cube.shape),
+                thread_counts.sum(axis=0).reshape(x_dim, y_dim))
+
+    elif method != "numpy":
+        raise ValueError(f"Method {method} is not supported. Choose from numba or numpy")
+
+    chunk_size = chunk_size or 2**16
+    sums = np.zeros((n_neurons, input_dim))
+    counts = np.zeros(n_neurons)
+
+    for start in range(0, len(data_in_SOM_fmt), chunk_size):
+        chunk = data_in_SOM_fmt[start:start + chunk_size]
+        bmu_indices = SOM_bmu_recall(chunk, weight_cube)
+        order = np.argsort(bmu_indices, kind='stable')
+        neurons, starts, chunk_counts = np.unique(bmu_indices[order], return_index=True,
+                                                  return_counts=True)
+        chunk = np.asarray(chunk, dtype=np.float64)[order]
+        if sample_weight is None:
+            sums[neurons] += np.add.reduceat(chunk, starts, axis=0)
+            counts[neurons] += chunk_counts
+        else:
+            chunk_weight = np.asarray(sample_weight[start:start + chunk_size], dtype=np.float64)[order]
+            sums[neurons] += np.add.reduceat(chunk * chunk_weight[:, np.newaxis], starts, axis=0)
+            counts[neurons] += np.add.reduceat(chunk_weight, starts)
+
+    return sums.reshape(weight_cube.shape), counts.reshape(x_dim, y_dim)
+
+
+def neighborhood_kernel(radius: int, neighborhood_decay: str = "geometric_series") -> np.ndarray:
+    """
+    Weight of a neuron at offset (dx, dy) from the BMU, the same values as
+    SOM.neighborhood_function but centered on the BMU instead of placed on
+    the map.
+
+    Parameters
+    ----------
+    radius : int
+        Neighborhood radius, the kernel covers offsets -radius to radius
+    neighborhood_decay : str
+        geometric_series, exponential or none
+
+    Returns
+    -------
+    kernel : np.ndarray
+        Shape (2 * radius + 1, 2 * radius + 1), kernel[radius, radius] is
+        the BMU
+    """
+    radius = int(radius)
+    offsets = np.arange(-radius, radius + 1)
+    dx, dy = np.meshgrid(offsets, offsets, indexing='ij')
+
+    if neighborhood_decay == "geometric_series":
+        return 1 / 2.0 ** np.maximum(np.abs(dx), np.abs(dy))
+    elif neighborhood_decay == "exponential":
+        if radius == 0:
+            return np.ones((1, 1))
+        return np.exp(-(dx**2 + dy**2) / (2 * radius**2))
+    elif neighborhood_decay == "none":
+        return np.ones(dx.shape)
+    raise ValueError(f"Neighborhood decay {neighborhood_decay} is not supported. Choose from geometric_series, exponential or none")
+
+
+def batch_update(sums: np.ndarray,
+                 counts: np.ndarray,
+                 kernel: np.ndarray,
+                 weight_cube: np.ndarray) -> np.ndarray:
+    """
+    Batch SOM update, every neuron becomes the neighborhood weighted mean of
+    the data mapped around it:
+
+        w_k = sum_j h(k, j) S_j / sum_j h(k, j) N_j
+
+    The kernel is applied with one shifted slice of the map per offset, the
+    neighborhood is cut at the edges of the map like in the online SOM.
+    Neurons with no data in their neighborhood keep their weights.
+
+    Parameters
+    ----------
+    sums : np.ndarray
+        Sum of the data mapped to each neuron, see batch_accumulate
+    counts : np.ndarray
+        Number of data points mapped to each neuron
+    kernel : np.ndarray
+        Neighborhood kernel, see neighborhood_kernel
+    weight_cube : np.ndarray
+        Current SOM weight cube
+
+    Returns
+    -------
+    weight_cube : np.ndarray
+        Updated weight cube
+    """
+    x_dim, y_dim = counts.shape
+    radius = kernel.shape[0] // 2
+    numerator = np.zeros(sums.shape)
+    denominator = np.zeros(counts.shape)
+
+    # Offsets beyond the map size never overlap it
+    for dx in range(-min(radius, x_dim - 1), min(radius, x_dim - 1) + 1):
+        target_x = slice(max(0, -dx), min(x_dim, x_dim - dx))
+        source_x = slice(max(0, dx), min(x_dim, x_dim + dx))
+        for dy in range(-min(radius, y_dim - 1), min(radius, y_dim - 1) + 1):
+            h = kernel[dx + radius, dy + radius]
+            if h == 0:
+                continue
+            target_y = slice(max(0, -dy), min(y_dim, y_dim - dy))
+            source_y = slice(max(0, dy), min(y_dim, y_dim + dy))
+            numerator[target_x, target_y] += h * sums[source_x, source_y]
+            denominator[target_x, target_y] += h * counts[source_x, source_y]
+
+    has_data = denominator > 0
+    updated = np.array(weight_cube, dtype=np.float64)
+    updated[has_data] = numerator[has_data] / denominator[has_data, np.newaxis]
+    return updated
+
+
+class Transport(ABC):
+    """
+    Moves the weight cube to the workers holding the data shards and brings
+    back the reduced sums.
+
+    A transport implements start (distribute the data and its optional
+    sample weights), accumulate (one epoch: broadcast the cube, run
+    batch_accumulate on every shard and add the results) and close.
+    InProcessTransport and ProcessTransport work on a single machine, a
+    transport that spans nodes (MPI, dask...) only has to implement the
+    same three methods.
+    """
+
+    @abstractmethod
+    def start(self, data: np.ndarray, sample_weight: np.ndarray = None):
+        """
+        Distributes the data and its optional sample weights to the workers.
+        """
+
+    @abstractmethod
+    def accumulate(self, weight_cube: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Runs one epoch on every shard and returns the summed sums and
+        counts, see batch_accumulate.
+        """
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class InProcessTransport(Transport):
+    """
+    Runs every shard in the calling process, the default of a batch SOM.
+    With the numba method it still uses all the cores of the node.
+    """
+
+    def __init__(self, chunk_size: int = None, method: str = "numba"):
+        self.chunk_size = chunk_size
+        self.method = method
+
+    def start(self, data: np.ndarray, sample_weight: np.ndarray = None):
+        self.data = data
+        self.sample_weight = sample_weight
+
+    def accumulate(self, weight_cube: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return batch_accumulate(self.data, weight_cube, self.chunk_size, self.method,
+                                self.sample_weight)
+
+    def close(self):
+        self.data = None
+        self.sample_weight = None
+
+
+class ProcessTransport(Transport):
+    """
+    One worker process per shard on the local machine.
+
+    The data is copied once into shared memory and every worker maps its
+    own shard. Each epoch only the weight cube is sent to the workers and
+    the per neuron sums and counts are sent back.
+    """
+
+    def __init__(self, n_workers: int = None, chunk_size: int = None, method: str = "numba"):
+        """
+        Parameters
+        ----------
+        n_workers : int
+            Number of worker processes (shards), by defualt one per core
+        chunk_size : int
+            Number of data points processed at a time by each worker
+        method : str
+            numba or numpy, see batch_accumulate. The numba threads are
+            split between the workers so the cores are not oversubscribed
+        """
+        self.n_workers = n_workers or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self.method = method
+        self._workers = []
+        self._connections = []
+        self._shm = None
+
+    def start(self, data: np.ndarray, sample_weight: np.ndarray = None):
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        # The sample weights are stored right after the data
+        weight_bytes = 0 if sample_weight is None else len(data) * 8
+        self._shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes + weight_bytes, 1))
+        np.ndarray(data.shape, dtype=data.dtype, buffer=self._shm.buf)[:] = data
+        if sample_weight is not None:
+            np.ndarray(len(data), dtype=np.float64, buffer=self._shm.buf, offset=data.nbytes)[:] = sample_weight
+
+        bounds = np.linspace(0, len(data), min(self.n_workers, max(len(data), 1)) + 1).astype(int)
+        n_threads = max(1, multiprocessing.cpu_count() // (len(bounds) - 1))
+        # A forked child inherits the state of a numba thread pool that is
+        # already running but not its threads, and hangs on its first kernel
+        context = multiprocessing.get_context("spawn")
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            parent_conn, child_conn = context.Pipe()
+            worker = context.Process(target=_worker_loop,
+                                     args=(child_conn, self._shm.name, data.shape,
+                                           start, stop, self.chunk_size, self.method,
+                                           n_threads, sample_weight is not None),
+                                     daemon=True)
+            worker.start()
+            child_conn.close()
+            self._workers.append(worker)
+            self._connections.append(parent_conn)
+
+    def accumulate(self, weight_cube: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        sums = np.zeros(weight_cube.shape)
+        counts = np.zeros(weight_cube.shape[:2])
+        errors = []
+        try:
+            for conn in self._connections:
+                conn.send(weight_cube)
+            for conn in self._connections:
+                status, result = conn.recv()
+                if status == 'ok':
+                    sums += result[0]
+                    counts += result[1]
+                else:
+                    errors.append(result)
+        except (EOFError, ConnectionError) as error:
+            # A worker died, its shard is lost, stop the others too
+            exit_codes = [worker.exitcode for worker in self._workers]
+            self.close()
+            raise RuntimeError(f"Batch SOM worker process died (exit codes {exit_codes})") from error
+        if errors:
+            raise RuntimeError(f"Batch SOM worker failed:\n{errors[0]}")
+        return sums, counts
+
+    def close(self):
+        for conn in self._connections:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            conn.close()
+        for worker in self._workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers, self._connections = [], []
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+def _worker_loop(conn, shm_name: str, shape: tuple, start: int, stop: int,
+                 chunk_size: int, method: str, n_threads: int, weighted: bool):
+    """
+    Worker of ProcessTransport, answers every weight cube with the sums and
+    counts of its shard until it receives None.
+    """
+    if method == "numba":
+        import numba
+        numba.set_num_threads(min(n_threads, numba.config.NUMBA_NUM_THREADS))
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        shard = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)[start:stop]
+        shard_weight = None
+        if weighted:
+            shard_weight = np.ndarray(shape[0], dtype=np.float64, buffer=shm.buf,
+                                      offset=shape[0] * shape[1] * 8)[start:stop]
+        while True:
+            try:
+                weight_cube = conn.recv()
+            except EOFError:
+                # The parent process is gone
+                break
+            if weight_cube is None:
+                break
+            try:
+                conn.send(('ok', batch_accumulate(shard, weight_cube, chunk_size, method,
+                                                  shard_weight)))
+            except Exception:
+                conn.send(('failed', traceback.format_exc()))
+        del shard, shard_weight
+    finally:
+        shm.close()
+        conn.close()
+
+
+def train_batch(som, data: np.ndarray, transport: Transport = None,
+                early_stopping=None, progress=None, sample_weight: np.ndarray = None):
+    """
+    Batch SOM training loop, runs som.n_iter epochs. Every epoch the
+    transport reduces the sums of all the shards against the current weight
+    cube, then the neighborhood radius of the som's decay schedule is
+    applied with batch_update. The learning rate is not used.
+
+    Called by SOM.train for som_type "batch_map".
+
+    Parameters
+    ----------
+    som : SOM
+        SOM to train, its weight cube is updated in place
+    data : np.ndarray
+        Training data, shape (n_samples, input_dim)
+    transport : Transport
+        How the data is distributed, by defualt everything runs in this
+        process (InProcessTransport)
+    early_stopping : EarlyStopping
+        Optional, checked after every epoch
+    progress : ProgressReporter
+        Optional, reported after every epoch that is due
+    sample_weight : np.ndarray
+        Optional weight of every data point, see batch_accumulate
+    """
+    if transport is None:
+        transport = InProcessTransport()
+
+    profiler = som.profiler or NULL_PROFILER
+    profiler.reset()
+    counter = 0
+
+    transport.start(data, sample_weight)
+    try:
+        for i in range(som.n_iter):
+            profiler.start(i)
+
+            _, sigma, radius = som.decay_kohonen(i)
+            kernel = neighborhood_kernel(max(int(np.squeeze(radius)), 0), som.neighborhood_decay)
+            profiler.lap("decay")
+
+            sums, counts = transport.accumulate(som.weight_cube)
+            profiler.lap("accumulate")
+
+            som.weight_cube[...] = batch_update(sums, counts, kernel, som.weight_cube)
+            profiler.lap("update")
+
+            if som.save_weight_cube_history:
+                som.weight_cube_history += counts
+            som.learning_radius_history[i] = np.squeeze(radius)
+            profiler.lap("histories")
+
+            if som.weight_cube_save_states is not None:
+                if counter < len(som.weight_cube_save_states) and i == som.weight_cube_save_states[counter]:
+                    som.som_save_state[counter] = som.weight_cube.copy()
+                    counter += 1
+            profiler.lap("snapshots")
+
+            if progress is not None and progress.due(i):
+                progress.report(i, som.weight_cube, sigma=sigma, radius=radius)
+                profiler.lap("callback")
+
+            if early_stopping is not None and early_stopping.step(i, som.weight_cube):
+                som.stopped_at = early_stopping.stopped_at
+                break
+            profiler.lap("early_stopping")
+    finally:
+        transport.close()
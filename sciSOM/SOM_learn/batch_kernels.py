@@ -0,0 +1,53 @@
+import numba
+import numpy as np
+from .._jit import warm_signatures
+
+
+# No nnan/ninf fast math flags: a nan or inf data point must go to neuron 0
+# like in the numpy path, the comparisons with the inf sentinel rely on it
+@warm_signatures("(float64[:, ::1], float64[::1], float64[:, ::1], float64[:, :, ::1], float64[:, ::1])",
+                 "(float32[:, ::1], float64[::1], float64[:, ::1], float64[:, :, ::1], float64[:, ::1])")
+@numba.njit(parallel=True, cache=True, fastmath={"reassoc", "contract", "arcp"})
+def accumulate_bmu_sums(data, sample_weight, weights, thread_sums, thread_counts):
+    """
+    Multi-threaded BMU search and per neuron sums of a batch SOM epoch.
+
+    The data is split in one contiguous block per entry of the first axis
+    of the accumulators. Every block finds the BMU of its data points and
+    adds them to its own accumulators, so no two threads write to the same
+    memory. Sum the accumulators over the first axis to merge them.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        C contiguous data, shape (n_samples, input_dim)
+    sample_weight : np.ndarray
+        Weight of every data point, it is added sample_weight times
+    weights : np.ndarray
+        Flat weight cube, shape (n_neurons, input_dim)
+    thread_sums : np.ndarray
+        Accumulators of the sums, shape (n_blocks, n_neurons, input_dim),
+        the results are added to them
+    thread_counts : np.ndarray
+        Accumulators of the counts, shape (n_blocks, n_neurons)
+    """
+    n_samples, input_dim = data.shape
+    n_neurons = weights.shape[0]
+    n_blocks = thread_sums.shape[0]
+    block_size = (n_samples + n_blocks - 1) // n_blocks
+
+    for block in numba.prange(n_blocks):
+        for sample in range(block * block_size, min(n_samples, (block + 1) * block_size)):
+            best_distance = np.inf
+            bmu = 0
+            for neuron in range(n_neurons):
+                distance = 0.0
+                for k in range(input_dim):
+                    diff = data[sample, k] - weights[neuron, k]
+                    distance += diff * diff
+                if distance < best_distance:
+                    best_distance = distance
+                    bmu = neuron
+            thread_counts[block, bmu] += sample_weight[sample]
+            for k in range(input_dim):
+                thread_sums[block, bmu, k] += sample_weight[sample] * data[sample, k]
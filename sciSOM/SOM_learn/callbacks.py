@@ -0,0 +1,94 @@
+import time
+import numpy as np
+from ..SOM_recall.metrics import quantization_error, draw_subsample
+
+
+class ProgressReporter:
+    """
+    Calls a user function every few iterations of the training with the
+    progress of the training.
+
+    The function receives a dict with:
+    'iteration' (number of iterations done), 'n_iter', 'elapsed' (s since
+    the start), 'its_per_sec' (since the previous call), the current
+    learning parameters ('alpha', 'sigma', 'radius' for a Kohonen SOM or
+    'alpha', 'beta', 'gamma', 'radius' for a cSOM) and, if qe_sample_size
+    is set, 'quantization_error' estimated on a fixed random subsample of
+    the training data.
+    """
+
+    def __init__(self,
+                 callback,
+                 every: int = 1000,
+                 qe_sample_size: int = None,
+                 seed: int = None):
+        """
+        Parameters
+        ----------
+        callback : callable
+            Function called with the info dict
+        every : int
+            Number of iterations between two calls, the last iteration is
+            always reported
+        qe_sample_size : int
+            Number of data points used to estimate the quantization error,
+            by defualt it is not computed
+        seed : int
+            Seed used to draw the subsample
+        """
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        self.callback = callback
+        self.every = every
+        self.qe_sample_size = qe_sample_size
+        self.seed = seed
+
+    def start(self, data: np.ndarray, n_iter: int, sample_weight: np.ndarray = None):
+        """
+        Called at the start of the training. With sample_weight the
+        subsample is drawn proportionally to the weights.
+        """
+        self.n_iter = n_iter
+        self._sample = None
+        if self.qe_sample_size is not None:
+            self._sample = draw_subsample(data, self.qe_sample_size, self.seed, sample_weight)
+        self._start_time = self._last_time = time.perf_counter()
+        self._last_iteration = 0
+
+    def due(self, iteration: int) -> bool:
+        """
+        True if the callback should be called after this iteration.
+        """
+        return (iteration + 1) % self.every == 0 or iteration + 1 == self.n_iter
+
+    def report(self, iteration: int, weight_cube: np.ndarray, **learning_parameters):
+        """
+        Builds the info dict and calls the callback.
+        """
+        now = time.perf_counter()
+        n_done = iteration + 1
+        info = {'iteration': n_done,
+                'n_iter': self.n_iter,
+                'elapsed': now - self._start_time,
+                'its_per_sec': (n_done - self._last_iteration) / max(now - self._last_time, 1e-12)}
+        info.update({key: float(np.squeeze(value)) for key, value in learning_parameters.items()})
+        if self._sample is not None:
+            info['quantization_error'] = quantization_error(self._sample, weight_cube)
+
+        self.callback(info)
+        # Do not count the time spent in the callback as training time
+        self._last_time = time.perf_counter()
+        self._last_iteration = n_done
+
+
+def print_progress(info: dict):
+    """
+    Callback that prints one line per call, e.g. to follow a training in
+    the log of a batch job.
+    """
+    line = (f"[{info['iteration']}/{info['n_iter']}] "
+            f"{info['its_per_sec']:.0f} it/s, {info['elapsed']:.1f} s")
+    for key in ('alpha', 'sigma', 'beta', 'gamma', 'radius', 'quantization_error'):
+        if key in info:
+            line += f", {key}={info[key]:.4g}"
+    print(line, flush=True)
@@ -0,0 +1,119 @@
+import numpy as np
+from ..SOM_recall.metrics import quantization_error, draw_subsample
+
+
+class EarlyStopping:
+    """
+    Stops the training once the quantization error stops improving.
+
+    Every check_every iterations the quantization error is measured on a
+    fixed validation set. A check improves on the best error so far if it
+    lowers it by more than tol (relative). After patience checks in a row
+    without improvement the training stops and the iteration is recorded
+    in stopped_at.
+
+    Notes
+    -----
+    The decay of the learning parameters still follows n_iter, stopping
+    early skips the end of the schedule.
+    """
+
+    def __init__(self,
+                 check_every: int = 1000,
+                 tol: float = 1e-3,
+                 patience: int = 3,
+                 validation_size: int = 10000,
+                 validation_data: np.ndarray = None,
+                 min_iter: int = 0,
+                 seed: int = None):
+        """
+        Parameters
+        ----------
+        check_every : int
+            Number of iterations between two checks
+        tol : float
+            Minimum relative decrease of the quantization error that counts
+            as an improvement
+        patience : int
+            Number of checks in a row without improvement before stopping
+        validation_size : int
+            Number of training data points drawn as validation set if no
+            validation_data is given
+        validation_data : np.ndarray
+            Optional validation set in the SOM format
+        min_iter : int
+            The training never stops before this iteration
+        seed : int
+            Seed used to draw the validation set
+        """
+        if check_every < 1:
+            raise ValueError("check_every must be at least 1")
+        if patience < 1:
+            raise ValueError("patience must be at least 1")
+
+        self.check_every = check_every
+        self.tol = tol
+        self.patience = patience
+        self.validation_size = validation_size
+        self.validation_data = validation_data
+        self.min_iter = min_iter
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the state of a previous training.
+        """
+        self.best_error = np.inf
+        self.wait = 0
+        self.stopped_at = None
+        self.checked_iterations = []
+        self.quantization_errors = []
+
+    def start(self, data: np.ndarray, sample_weight: np.ndarray = None):
+        """
+        Resets the controller and draws the validation set from the training
+        data, called at the start of the training. With sample_weight the
+        points are drawn (with replacement) proportionally to their weight,
+        so the quantization error is the one of the weighted data.
+        """
+        self.reset()
+        if self.validation_data is not None:
+            self._validation = self.validation_data
+        else:
+            self._validation = draw_subsample(data, self.validation_size, self.seed, sample_weight)
+
+    def step(self, iteration: int, weight_cube: np.ndarray) -> bool:
+        """
+        Called after every training iteration.
+
+        Parameters
+        ----------
+        iteration : int
+            Index of the iteration that just finished
+        weight_cube : np.ndarray
+            Current SOM weight cube
+
+        Returns
+        -------
+        stop : bool
+            True if the training should stop
+        """
+        n_done = iteration + 1
+        if n_done % self.check_every != 0:
+            return False
+
+        error = quantization_error(self._validation, weight_cube)
+        self.checked_iterations.append(n_done)
+        self.quantization_errors.append(error)
+
+        if error < self.best_error * (1 - self.tol):
+            self.best_error = error
+            self.wait = 0
+        else:
+            self.wait += 1
+
+        if self.wait >= self.patience and n_done >= self.min_iter:
+            self.stopped_at = n_done
+            return True
+        return False
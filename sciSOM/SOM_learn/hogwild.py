@@ -0,0 +1,160 @@
+import numpy as np
+from typing import Tuple
+from .profiling import NULL_PROFILER
+
+
+def decay_schedule(som, start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Learning rate and neighborhood radius of the iterations start to stop,
+    the values of SOM.decay_kohonen computed for all the iterations at once.
+
+    Parameters
+    ----------
+    som : SOM
+        SOM whose decay_type and learning_parameters are used
+    start : int
+        First iteration
+    stop : int
+        Iteration after the last one
+
+    Returns
+    -------
+    alphas : np.ndarray
+        Learning rate of every iteration
+    radii : np.ndarray
+        Neighborhood radius of every iteration (int64)
+    """
+    i = np.arange(start, stop)
+    parameters = som.learning_parameters
+
+    if som.decay_type == "exponential":
+        tao = som.n_iter / np.squeeze(parameters["max_radius"])
+        alphas = np.squeeze(parameters["alpha"]) * np.exp(-i / tao)
+        radii = np.ceil(np.squeeze(parameters["max_radius"]) * np.exp(-i / tao))
+
+    elif som.decay_type == "linear":
+        alphas = np.squeeze(parameters["alpha"]) - np.squeeze(parameters["alpha"]) / som.n_iter * i
+        radii = np.ceil(np.squeeze(parameters["max_radius"]) - np.squeeze(parameters["max_radius"]) / som.n_iter * i)
+
+    elif som.decay_type == "schedule":
+        # Same as np.sum(time <= i) for every i, the times are sorted
+        current_schedule = np.searchsorted(parameters["time"], i, side='right')
+        alphas = parameters["alpha"][current_schedule]
+        radii = parameters["max_radius"][current_schedule]
+
+    else:
+        raise ValueError(f"Decay type {som.decay_type} is not supported. Choose from exponential, linear or schedule")
+
+    return (np.ascontiguousarray(alphas, dtype=np.float64),
+            np.ascontiguousarray(np.maximum(radii, 0), dtype=np.int64))
+
+
+def train_hogwild(som, data: np.ndarray, indecies: np.ndarray,
+                  early_stopping=None, progress=None,
+                  n_threads: int = None, round_size: int = 10000):
+    """
+    Experimental multi-threaded online Kohonen training, several numba
+    threads train on different data points at the same time and write to
+    the weight cube without locks (Hogwild).
+
+    The iterations run in rounds of at most round_size in the compiled
+    kernel hogwild_updates. Rounds end on the iterations where the serial
+    loop would take a snapshot, call the progress callback or check early
+    stopping, so those happen on the same iterations as in Kohonen_SOM.
+    With one thread the updates are the ones of Kohonen_SOM up to rounding
+    (the kernel uses fast math reassociation), except at radius 0 where the exponential
+    neighborhood is 1 on the BMU instead of nan. The per iteration
+    histories (histories=True) are not recorded.
+
+    Called by SOM.train for som_type "hogwild".
+
+    Parameters
+    ----------
+    som : SOM
+        SOM to train, its weight cube is updated in place
+    data : np.ndarray
+        Training data, shape (n_samples, input_dim)
+    indecies : np.ndarray
+        Index of the data point of every iteration, see SOM._train_batch
+    early_stopping : EarlyStopping
+        Optional
+    progress : ProgressReporter
+        Optional
+    n_threads : int
+        Number of threads, by defualt numba.get_num_threads()
+    round_size : int
+        Maximum number of iterations run by the kernel at a time
+    """
+    import numba
+    from .hogwild_kernels import hogwild_updates, NEIGHBORHOOD_CODES
+
+    if som.histories:
+        raise ValueError("The hogwild SOM does not record the per iteration histories, use histories=False")
+    if som.neighborhood_decay not in NEIGHBORHOOD_CODES:
+        raise ValueError(f"Neighborhood decay {som.neighborhood_decay} is not supported. Choose from {list(NEIGHBORHOOD_CODES)}")
+    neighborhood = NEIGHBORHOOD_CODES[som.neighborhood_decay]
+
+    n_threads = n_threads or numba.get_num_threads()
+    if data.dtype != np.float32:
+        data = np.ascontiguousarray(data, dtype=np.float64)
+    data = np.ascontiguousarray(data)
+    indecies = np.asarray(indecies, dtype=np.int64)
+    # The kernel updates the weight cube in place
+    som.weight_cube = np.ascontiguousarray(som.weight_cube, dtype=np.float64)
+    bmu_counts = np.zeros((n_threads, som.x_dim, som.y_dim))
+
+    profiler = som.profiler or NULL_PROFILER
+    profiler.reset()
+    counter = 0
+
+    start = 0
+    round_index = 0
+    while start < som.n_iter:
+        profiler.start(round_index)
+        round_index += 1
+
+        # End the round on the next iteration the serial loop does something on
+        stop = min(som.n_iter, start + round_size)
+        if progress is not None:
+            stop = min(stop, (start // progress.every + 1) * progress.every)
+        if early_stopping is not None:
+            stop = min(stop, (start // early_stopping.check_every + 1) * early_stopping.check_every)
+        if som.weight_cube_save_states is not None:
+            # States already behind (unsorted or repeated) can not be taken
+            # anymore, skip them instead of shrinking every round to one iteration
+            while counter < len(som.weight_cube_save_states) and som.weight_cube_save_states[counter] < start:
+                counter += 1
+            if counter < len(som.weight_cube_save_states):
+                stop = min(stop, int(som.weight_cube_save_states[counter]) + 1)
+        i = stop - 1
+
+        alphas, radii = decay_schedule(som, start, stop)
+        profiler.lap("decay")
+
+        hogwild_updates(data, np.ascontiguousarray(indecies[start:stop]), alphas, radii,
+                        som.weight_cube, bmu_counts, neighborhood)
+        profiler.lap("hogwild")
+
+        som.learning_rate_history[start:stop] = alphas
+        som.learning_radius_history[start:stop] = radii
+        profiler.lap("histories")
+
+        if som.weight_cube_save_states is not None:
+            # Repeated states all get the snapshot
+            while counter < len(som.weight_cube_save_states) and i == som.weight_cube_save_states[counter]:
+                som.som_save_state[counter] = som.weight_cube.copy()
+                counter += 1
+        profiler.lap("snapshots")
+
+        if progress is not None and progress.due(i):
+            progress.report(i, som.weight_cube, alpha=alphas[-1], radius=radii[-1])
+            profiler.lap("callback")
+
+        start = stop
+        if early_stopping is not None and early_stopping.step(i, som.weight_cube):
+            som.stopped_at = early_stopping.stopped_at
+            break
+        profiler.lap("early_stopping")
+
+    if som.save_weight_cube_history:
+        som.weight_cube_history += bmu_counts.sum(axis=0)
@@ -0,0 +1,77 @@
+import numba
+import numpy as np
+from .._jit import warm_signatures
+
+# Codes of the neighborhood decays understood by hogwild_updates
+NEIGHBORHOOD_CODES = {"geometric_series": 0, "exponential": 1, "none": 2}
+
+
+# No nnan/ninf fast math flags: the comparisons with the inf sentinel of the
+# BMU search must send a nan or inf data point to neuron 0 like Kohonen_SOM
+@warm_signatures("(float64[:, ::1], int64[::1], float64[::1], int64[::1], float64[:, :, ::1], float64[:, :, ::1], int64)",
+                 "(float32[:, ::1], int64[::1], float64[::1], int64[::1], float64[:, :, ::1], float64[:, :, ::1], int64)")
+@numba.njit(parallel=True, cache=True, fastmath={"reassoc", "contract", "arcp"})
+def hogwild_updates(data, indices, alphas, radii, weight_cube, bmu_counts, neighborhood):
+    """
+    Online Kohonen updates run by several threads at once without locks.
+
+    Iteration j of the round trains on data[indices[j]] with learning rate
+    alphas[j] and radius radii[j]. Thread b runs the iterations b,
+    b + n_blocks, b + 2 n_blocks... so all the threads move through the
+    decay schedule together. Every thread reads and writes weight_cube
+    directly, an update only touches the (2r + 1)^2 window around its BMU
+    so two threads rarely write to the same neurons, and when they do one
+    of the updates is partly lost (Hogwild).
+
+    Parameters
+    ----------
+    data : np.ndarray
+        C contiguous data, shape (n_samples, input_dim)
+    indices : np.ndarray
+        Index of the data point of every iteration of the round
+    alphas : np.ndarray
+        Learning rate of every iteration
+    radii : np.ndarray
+        Neighborhood radius of every iteration
+    weight_cube : np.ndarray
+        C contiguous weight cube, updated in place
+    bmu_counts : np.ndarray
+        Number of times each neuron was the BMU, shape
+        (n_blocks, x_dim, y_dim), one slice per thread
+    neighborhood : int
+        Neighborhood decay, see NEIGHBORHOOD_CODES
+    """
+    x_dim, y_dim, input_dim = weight_cube.shape
+    n_blocks = bmu_counts.shape[0]
+
+    for block in numba.prange(n_blocks):
+        for j in range(block, len(indices), n_blocks):
+            sample = indices[j]
+
+            best_distance = np.inf
+            x_bmu = 0
+            y_bmu = 0
+            for x in range(x_dim):
+                for y in range(y_dim):
+                    distance = 0.0
+                    for k in range(input_dim):
+                        diff = data[sample, k] - weight_cube[x, y, k]
+                        distance += diff * diff
+                    if distance < best_distance:
+                        best_distance = distance
+                        x_bmu = x
+                        y_bmu = y
+            bmu_counts[block, x_bmu, y_bmu] += 1
+
+            radius = radii[j]
+            alpha = alphas[j]
+            for x in range(max(0, x_bmu - radius), min(x_dim, x_bmu + radius + 1)):
+                for y in range(max(0, y_bmu - radius), min(y_dim, y_bmu + radius + 1)):
+                    if neighborhood == 0:
+                        h = 1 / 2.0 ** max(abs(x - x_bmu), abs(y - y_bmu))
+                    elif neighborhood == 1 and radius > 0:
+                        h = np.exp(-((x - x_bmu) ** 2 + (y - y_bmu) ** 2) / (2 * radius ** 2))
+                    else:
+                        h = 1.0
+                    for k in range(input_dim):
+                        weight_cube[x, y, k] += alpha * h * (data[sample, k] - weight_cube[x, y, k])
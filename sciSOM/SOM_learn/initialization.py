@@ -0,0 +1,165 @@
+import numpy as np
+from typing import Tuple
+
+
+def principal_components(data: np.ndarray,
+                         n_components: int = 2,
+                         chunk_size: int = 2**16,
+                         sample_weight: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Principal components of the data from its covariance matrix, which is
+    accumulated chunk by chunk so the data can be larger than memory (e.g.
+    a np.memmap). Only input_dim x input_dim matrices are kept in memory.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Data, shape (n_samples, input_dim)
+    n_components : int
+        Number of components returned
+    chunk_size : int
+        Number of data points read at a time
+    sample_weight : np.ndarray
+        Optional weight of every data point, the mean and covariance are
+        then the ones of the data with every point repeated weight times
+
+    Returns
+    -------
+    mean : np.ndarray
+        Mean of the data, shape (input_dim,)
+    components : np.ndarray
+        Unit principal directions by decreasing variance, shape
+        (n_components, input_dim). The sign is fixed so the largest entry of
+        each direction is positive
+    variances : np.ndarray
+        Variance of the data along each component
+    """
+    n_samples, input_dim = data.shape
+    if sample_weight is None:
+        sample_weight = np.ones(n_samples)
+    total_weight = np.sum(sample_weight)
+    if total_weight < 2:
+        raise ValueError("At least 2 data points are needed to compute principal components")
+
+    # Two passes, centering before the products avoids the cancellation of
+    # E[x x] - E[x] E[x] when the data is far from the origin
+    mean = np.zeros(input_dim)
+    for start in range(0, n_samples, chunk_size):
+        chunk = np.asarray(data[start:start + chunk_size], dtype=np.float64)
+        mean += sample_weight[start:start + chunk_size] @ chunk
+    mean /= total_weight
+
+    covariance = np.zeros((input_dim, input_dim))
+    for start in range(0, n_samples, chunk_size):
+        chunk = np.asarray(data[start:start + chunk_size], dtype=np.float64) - mean
+        covariance += (chunk * sample_weight[start:start + chunk_size, np.newaxis]).T @ chunk
+    covariance /= total_weight - 1
+
+    variances, vectors = np.linalg.eigh(covariance)
+    order = np.argsort(variances)[::-1][:n_components]
+    components = vectors[:, order].T
+    signs = np.sign(components[np.arange(len(components)), np.argmax(np.abs(components), axis=1)])
+    return mean, components * signs[:, np.newaxis], np.maximum(variances[order], 0)
+
+
+def pca_weight_cube(data: np.ndarray, x_dim: int, y_dim: int, chunk_size: int = 2**16,
+                    sample_weight: np.ndarray = None) -> np.ndarray:
+    """
+    Linear initialization, the neurons are spread evenly on the plane of the
+    two first principal components of the data, from -1 to +1 standard
+    deviation around the mean. The first component runs along the longest
+    side of the map.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Training data, shape (n_samples, input_dim)
+    x_dim : int
+        x dimension of the map
+    y_dim : int
+        y dimension of the map
+    chunk_size : int
+        Number of data points read at a time, see principal_components
+    sample_weight : np.ndarray
+        Optional weight of every data point, see principal_components
+
+    Returns
+    -------
+    weight_cube : np.ndarray
+        Shape (x_dim, y_dim, input_dim)
+    """
+    mean, components, variances = principal_components(data, 2, chunk_size, sample_weight)
+    # Data with a single feature only has one component
+    axes = [components[k] * np.sqrt(variances[k]) if k < len(components) else np.zeros(len(mean))
+            for k in range(2)]
+    if y_dim > x_dim:
+        axes = axes[::-1]
+
+    x = np.linspace(-1, 1, x_dim) if x_dim > 1 else np.zeros(1)
+    y = np.linspace(-1, 1, y_dim) if y_dim > 1 else np.zeros(1)
+    return (mean
+            + x[:, np.newaxis, np.newaxis] * axes[0]
+            + y[np.newaxis, :, np.newaxis] * axes[1])
+
+
+def sample_weight_cube(data: np.ndarray, x_dim: int, y_dim: int,
+                       sample_weight: np.ndarray = None) -> np.ndarray:
+    """
+    Initialization with randomly drawn data points, so every neuron starts
+    inside the data.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Training data, shape (n_samples, input_dim)
+    x_dim : int
+        x dimension of the map
+    y_dim : int
+        y dimension of the map
+    sample_weight : np.ndarray
+        Optional weight of every data point, the points are then drawn
+        (with replacement) proportionally to their weight, points with a
+        weight of 0 are never drawn
+
+    Returns
+    -------
+    weight_cube : np.ndarray
+        Shape (x_dim, y_dim, input_dim)
+    """
+    n_neurons = x_dim * y_dim
+    if sample_weight is None:
+        rows = np.sort(np.random.choice(len(data), n_neurons, replace=len(data) < n_neurons))
+    else:
+        rows = np.sort(np.random.choice(len(data), n_neurons, p=sample_weight / np.sum(sample_weight)))
+    weights = np.asarray(data[rows], dtype=np.float64)
+    return weights[np.random.permutation(n_neurons)].reshape(x_dim, y_dim, -1)
+
+
+def initial_weight_cube(data: np.ndarray, x_dim: int, y_dim: int, init: str,
+                        sample_weight: np.ndarray = None) -> np.ndarray:
+    """
+    Initial weight cube of an SOM built from the training data.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Training data, shape (n_samples, input_dim)
+    x_dim : int
+        x dimension of the map
+    y_dim : int
+        y dimension of the map
+    init : str
+        pca (see pca_weight_cube) or sample (see sample_weight_cube)
+    sample_weight : np.ndarray
+        Optional weight of every data point
+
+    Returns
+    -------
+    weight_cube : np.ndarray
+        Shape (x_dim, y_dim, input_dim)
+    """
+    if init == "pca":
+        return pca_weight_cube(data, x_dim, y_dim, sample_weight=sample_weight)
+    elif init == "sample":
+        return sample_weight_cube(data, x_dim, y_dim, sample_weight)
+    raise ValueError(f"Init {init} is not supported. Choose from pca or sample")
@@ -0,0 +1,138 @@
+import math
+import numpy as np
+from typing import Tuple
+from .train import SOM
+
+
+def upsample_weight_cube(weight_cube: np.ndarray, x_dim: int, y_dim: int) -> np.ndarray:
+    """
+    Bilinear interpolation of a weight cube to a larger (or smaller) map.
+
+    The corner neurons keep their weights and the other neurons are spread
+    evenly between them, so an ordered map stays ordered.
+
+    Parameters
+    ----------
+    weight_cube : np.ndarray
+        Weight cube, shape (x, y, input_dim)
+    x_dim : int
+        x dimension of the new map
+    y_dim : int
+        y dimension of the new map
+
+    Returns
+    -------
+    weight_cube : np.ndarray
+        Shape (x_dim, y_dim, input_dim)
+    """
+    coarse_x, coarse_y, _ = weight_cube.shape
+    weight_cube = np.asarray(weight_cube, dtype=np.float64)
+
+    def coordinates(n_coarse, n_fine):
+        # Position of every new neuron on the old map and its two neighbors
+        position = np.linspace(0, n_coarse - 1, n_fine)
+        low = np.minimum(np.floor(position).astype(int), max(n_coarse - 2, 0))
+        high = np.minimum(low + 1, n_coarse - 1)
+        return low, high, position - low
+
+    x_low, x_high, x_frac = coordinates(coarse_x, x_dim)
+    y_low, y_high, y_frac = coordinates(coarse_y, y_dim)
+    x_frac = x_frac[:, np.newaxis, np.newaxis]
+    y_frac = y_frac[np.newaxis, :, np.newaxis]
+
+    # Interpolate along y on the two rows around every new neuron, then along x
+    low_rows = weight_cube[x_low][:, y_low] * (1 - y_frac) + weight_cube[x_low][:, y_high] * y_frac
+    high_rows = weight_cube[x_high][:, y_low] * (1 - y_frac) + weight_cube[x_high][:, y_high] * y_frac
+    return low_rows * (1 - x_frac) + high_rows * x_frac
+
+
+def fine_tuning_parameters(learning_parameters: np.ndarray, max_radius: int) -> np.ndarray:
+    """
+    Learning parameters of the fine tuning stage: the same parameters with
+    the radius capped at max_radius, the map is already ordered and only
+    needs local adjustments.
+
+    Parameters
+    ----------
+    learning_parameters : np.ndarray
+        Learning parameters of the coarse map
+    max_radius : int
+        Largest radius of the fine tuning
+
+    Returns
+    -------
+    learning_parameters : np.ndarray
+        Copy with max_radius capped, parameters without a max_radius field
+        (cSOM) are returned unchanged
+    """
+    learning_parameters = learning_parameters.copy()
+    if learning_parameters.dtype.names is not None and "max_radius" in learning_parameters.dtype.names:
+        learning_parameters["max_radius"] = np.minimum(learning_parameters["max_radius"], max_radius)
+    return learning_parameters
+
+
+def train_coarse_to_fine(data: np.ndarray,
+                         x_dim: int,
+                         y_dim: int,
+                         learning_parameters: np.ndarray,
+                         coarse_n_iter: int,
+                         fine_n_iter: int,
+                         coarse_shape: Tuple[int, int] = None,
+                         fine_learning_parameters: np.ndarray = None,
+                         **som_options) -> SOM:
+    """
+    Trains a large map in two stages. A small map is trained first, it
+    does the global ordering cheaply, its weight cube is then interpolated
+    to x_dim x y_dim with upsample_weight_cube and used as the starting
+    point of a short fine tuning with a small radius.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Training data, shape (n_samples, input_dim)
+    x_dim : int
+        x dimension of the final map
+    y_dim : int
+        y dimension of the final map
+    learning_parameters : np.ndarray
+        Learning parameters of the coarse map
+    coarse_n_iter : int
+        Number of iterations of the coarse map
+    fine_n_iter : int
+        Number of iterations of the fine tuning
+    coarse_shape : tuple
+        Shape of the coarse map, by defualt a quarter of the final map in
+        each dimension (at least 2)
+    fine_learning_parameters : np.ndarray
+        Learning parameters of the fine tuning, by defualt
+        learning_parameters with the radius capped at the upsampling factor,
+        see fine_tuning_parameters
+    **som_options
+        Other SOM arguments (decay_type, som_type, mode, scaler...) used for
+        both maps
+
+    Returns
+    -------
+    som : SOM
+        Trained x_dim x y_dim SOM
+    """
+    if coarse_shape is None:
+        coarse_shape = (max(2, math.ceil(x_dim / 4)), max(2, math.ceil(y_dim / 4)))
+    if coarse_shape[0] > x_dim or coarse_shape[1] > y_dim:
+        raise ValueError(f"The coarse map {coarse_shape} is larger than the final map {(x_dim, y_dim)}")
+
+    coarse = SOM(coarse_shape[0], coarse_shape[1], data.shape[1], coarse_n_iter,
+                 learning_parameters=learning_parameters, **som_options)
+    coarse.train(data)
+
+    if fine_learning_parameters is None:
+        # A coarse neuron is spread over about this many fine neurons
+        factor = max(x_dim / coarse_shape[0], y_dim / coarse_shape[1])
+        fine_learning_parameters = fine_tuning_parameters(learning_parameters, max(1, math.ceil(factor)))
+
+    som = SOM(x_dim, y_dim, data.shape[1], fine_n_iter,
+              learning_parameters=fine_learning_parameters,
+              weight_cube=upsample_weight_cube(coarse.weight_cube, x_dim, y_dim),
+              **som_options)
+    som.train(data)
+    return som
@@ -0,0 +1,121 @@
+import time
+import numpy as np
+
+
+class PhaseProfiler:
+    """
+    Accumulates the wall time and number of calls of each phase of the
+    training loop.
+
+    Only one iteration out of every sample_every is timed, on the others
+    lap returns right away. The per call means of the sampled iterations
+    are extrapolated to the whole training in the report.
+
+    Usage inside a loop::
+
+        profiler.start(i)
+        ...  # find the BMU
+        profiler.lap("bmu")
+        ...  # update the weights
+        profiler.lap("update")
+
+    Loops of an SOM without profiling use NULL_PROFILER instead, so they
+    do not need to check for it.
+    """
+
+    def __init__(self, sample_every: int = 100):
+        """
+        Parameters
+        ----------
+        sample_every : int
+            One iteration out of every sample_every is timed
+        """
+        if sample_every < 1:
+            raise ValueError("sample_every must be at least 1")
+        self.sample_every = sample_every
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the timings of a previous training.
+        """
+        self.total_time = {}
+        self.calls = {}
+        self.n_iterations = 0
+        self.n_sampled = 0
+        # Start of the current phase, None if the iteration is not sampled
+        self._t = None
+
+    def start(self, iteration: int):
+        """
+        Called at the start of every iteration, decides if it is timed.
+        """
+        self.n_iterations += 1
+        if iteration % self.sample_every != 0:
+            self._t = None
+            return
+        self.n_sampled += 1
+        self._t = time.perf_counter()
+
+    def lap(self, phase: str):
+        """
+        Adds the time since the end of the previous phase (or the start of
+        the iteration) to phase, if the iteration is timed.
+        """
+        if self._t is None:
+            return
+        now = time.perf_counter()
+        self.total_time[phase] = self.total_time.get(phase, 0.0) + now - self._t
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        self._t = now
+
+    def report(self, as_frame: bool = False):
+        """
+        Timings per phase in the order the phases were first seen.
+
+        Parameters
+        ----------
+        as_frame : bool
+            If True returns a pandas DataFrame indexed by phase
+
+        Returns
+        -------
+        report : dict or pandas.DataFrame
+            For every phase: 'calls' (sampled), 'total_time' (sampled, s),
+            'mean_time' (s per call), 'fraction' of the sampled time and
+            'estimated_time' (s) over all the iterations of the training
+        """
+        sampled_time = sum(self.total_time.values())
+        report = {}
+        for phase, total_time in self.total_time.items():
+            calls = self.calls[phase]
+            mean_time = total_time / calls
+            report[phase] = {'calls': calls,
+                             'total_time': total_time,
+                             'mean_time': mean_time,
+                             'fraction': total_time / sampled_time if sampled_time > 0 else np.nan,
+                             # Phases like snapshots do not run every iteration
+                             'estimated_time': total_time * self.n_iterations / max(self.n_sampled, 1)}
+        if as_frame:
+            import pandas as pd
+            return pd.DataFrame.from_dict(report, orient='index')
+        return report
+
+
+class NullProfiler:
+    """
+    Profiler that does nothing, used by the training loops when profiling
+    is off.
+    """
+
+    def reset(self):
+        pass
+
+    def start(self, iteration: int):
+        pass
+
+    def lap(self, phase: str):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
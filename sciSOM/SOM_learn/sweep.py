@@ -0,0 +1,173 @@
+import numpy as np
+import itertools
+import multiprocessing
+import os
+import random
+import time
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import List
+from .train import SOM
+
+# View of the training data in shared memory, set once per worker process
+_shared_data = None
+_shared_memory = None
+
+
+def parameter_grid(**options) -> List[dict]:
+    """
+    Builds every combination of the given SOM arguments.
+
+    Parameters
+    ----------
+    **options
+        SOM argument names mapped to the list of values to try, e.g.
+        x_dim=[10, 20], decay_type=["exponential", "linear"]
+
+    Returns
+    -------
+    configs : list
+        One dict of SOM arguments per combination
+    """
+    names = list(options)
+    return [dict(zip(names, values)) for values in itertools.product(*options.values())]
+
+
+def run_sweep(data: np.ndarray,
+              configs: List[dict],
+              seeds: List[int] = (0,),
+              n_workers: int = None,
+              max_retries: int = 1):
+    """
+    Trains one SOM per configuration and seed in parallel and collects the
+    results into one table.
+
+    The training data is copied once into shared memory and every worker
+    process reads it from there. Errors while training a configuration are
+    recorded in the table instead of stopping the sweep. Every worker process
+    trains one configuration at a time, if it dies only that configuration
+    is counted as a failed attempt and retried in a new process, the others
+    are not affected.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Training data, shape (n_samples, input_dim)
+    configs : list
+        dicts of SOM arguments (x_dim, y_dim, n_iter, learning_parameters,
+        ...), input_dim is taken from the data. See parameter_grid
+    seeds : list
+        Random seeds, every configuration is trained once per seed
+    n_workers : int
+        Number of worker processes, by defualt one per core
+    max_retries : int
+        Number of times a configuration is retried after its worker died
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        One row per configuration and seed with the SOM arguments, 'seed',
+        'status' ('ok' or 'failed'), 'error', 'train_time',
+        'quantization_error', 'topographic_error' and the final
+        'weight_cube'
+    """
+    import pandas as pd
+
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    tasks = [(config, seed) for config in configs for seed in seeds]
+    results = [None] * len(tasks)
+    attempts = np.zeros(len(tasks), dtype=int)
+
+    n_workers = n_workers or os.cpu_count()
+    shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+
+    def new_pool():
+        # Not forked, a forked child of a process running numba threads
+        # can hang at exit
+        return ProcessPoolExecutor(max_workers=1,
+                                   mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_attach_shared_data,
+                                   initargs=(shm.name, data.shape, data.dtype.str))
+
+    # One single process pool per worker, each runs one task at a time so a
+    # dead worker only breaks the future of the task it was running
+    idle = []
+    running = {}
+    try:
+        np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[:] = data
+        pending = deque(range(len(tasks)))
+        while pending or running:
+            while pending and len(running) < n_workers:
+                pool = idle.pop() if idle else new_pool()
+                task = pending.popleft()
+                running[pool.submit(_train_config, *tasks[task])] = (task, pool)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task, pool = running.pop(future)
+                try:
+                    results[task] = future.result()
+                    idle.append(pool)
+                except BrokenProcessPool as error:
+                    pool.shutdown()
+                    attempts[task] += 1
+                    if attempts[task] <= max_retries:
+                        pending.append(task)
+                    else:
+                        results[task] = _failed_result(f"Worker process died: {error}")
+    finally:
+        for pool in idle + [pool for _, pool in running.values()]:
+            pool.shutdown(cancel_futures=True)
+        shm.close()
+        shm.unlink()
+
+    rows = []
+    for (config, seed), result in zip(tasks, results):
+        rows.append({**config, 'seed': seed, **result})
+    return pd.DataFrame(rows)
+
+
+def _attach_shared_data(name: str, shape: tuple, dtype: str):
+    """
+    Worker initializer, maps the training data from shared memory.
+    """
+    global _shared_data, _shared_memory
+    _shared_memory = shared_memory.SharedMemory(name=name)
+    _shared_data = np.ndarray(shape, dtype=np.dtype(dtype), buffer=_shared_memory.buf)
+
+
+def _train_config(config: dict, seed: int) -> dict:
+    """
+    Trains a single SOM on the shared data, runs in a worker process.
+    """
+    try:
+        # The training uses both random number generators
+        random.seed(seed)
+        np.random.seed(seed)
+        start = time.perf_counter()
+        som = SOM(input_dim=_shared_data.shape[1], **config)
+        som.train(_shared_data)
+        train_time = time.perf_counter() - start
+
+        quality = som.quality(_shared_data)
+    except Exception:
+        return _failed_result(traceback.format_exc())
+
+    return {'status': 'ok',
+            'error': None,
+            'train_time': train_time,
+            'quantization_error': quality['quantization_error'],
+            'topographic_error': quality['topographic_error'],
+            'weight_cube': som.weight_cube}
+
+
+def _failed_result(error: str) -> dict:
+    return {'status': 'failed',
+            'error': error,
+            'train_time': np.nan,
+            'quantization_error': np.nan,
+            'topographic_error': np.nan,
+            'weight_cube': None}
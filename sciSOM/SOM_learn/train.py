@@ -1,7 +1,14 @@
 import numpy as np
-from scipy.spatial.distance import cdist
 import math
 import random # Might want to take a closer look at radom number generators in the futuer
+from ..SOM_recall.recall import AffineScaler
+from ..SOM_recall.metrics import som_quality
+from .early_stopping import EarlyStopping
+from .profiling import PhaseProfiler, NULL_PROFILER
+from .callbacks import ProgressReporter
+from .batch import Transport, train_batch
+from .hogwild import train_hogwild
+from .initialization import initial_weight_cube
 
 class SOM:
     """
@@ -29,7 +36,11 @@ class SOM:
                  weight_cube_save_states: np.ndarray = None,
                  custom_scale_sup_matrix: float = 0,
                  csom_learning_radius: int = 1,
-                 histories: bool = False):
+                 histories: bool = False,
+                 scaler: AffineScaler = None,
+                 profile: bool = False,
+                 profile_every: int = 100,
+                 init: str = "random"):
         """
         Initialize the SOM object.
 
@@ -56,11 +67,21 @@ class SOM:
         neighborhood_decay : (str)
             The type of decay the neighborhood function should follow.
             defualt is set to geometric_series. Could be exponential or none.
-        som_type (str): The type of SOM to use. Current options are Kohonen or cSOM, 
-                        this can be expanded.
+        som_type (str): The type of SOM to use. Current options are Kohonen, cSOM,
+                        batch_map or hogwild, this can be expanded. batch_map is
+                        the batch SOM algorithm (every epoch moves each neuron to
+                        the weighted mean of the data mapped around it), for it
+                        n_iter is the number of epochs (passes over the data).
+                        hogwild is an experimental multi-threaded Kohonen SOM,
+                        see train_hogwild.
         mode : (str) 
-            The mode of the SOM. 
+            The order the data points are presented in for the online
+            algorithms (Kohonen, cSOM, hogwild). batch draws every point
+            once per epoch in a random order (without replacement), online
+            draws points at random with replacement.
             default is set to batch. Could be online.
+            Not used by som_type batch_map, which uses all the data every
+            epoch, setting it to online there raises a ValueError.
         save_weight_cube_history : (bool)
             Saves the history of how often each neuron was the BMU.
             default is set to False.
@@ -69,6 +90,26 @@ class SOM:
             Effecively making it a Kohonen SOM with a constant neighborhood
             size of 1.
             default is set to False.
+        scaler : (AffineScaler)
+            Scaler fitted on the training data, it is saved with the model
+            so recalls can normalize new data the same way.
+            default is set to None.
+        profile : (bool)
+            Times each phase of the training loop (BMU search, decay,
+            neighborhood, weight update, histories, snapshots...),
+            see profile_report.
+            default is set to False.
+        profile_every : (int)
+            Only one iteration out of every profile_every is timed so the
+            profiler does not slow down the training.
+            default is set to 100.
+        init : (str)
+            How the weight cube is initialized when weight_cube is not
+            given. random draws uniform weights in [0, 1). pca spreads the
+            neurons on the plane of the two first principal components of
+            the data and sample uses randomly drawn data points, both are
+            computed from the data at the start of the first train call.
+            default is set to random.
         
         Returns
         -------
@@ -91,6 +132,15 @@ class SOM:
         self.csom_learning_radius = csom_learning_radius
         self.weight_cube_save_states = weight_cube_save_states
         self.custom_scale_sup_matrix = custom_scale_sup_matrix
+        self.scaler = scaler
+        self.stopped_at = None
+        self.profiler = PhaseProfiler(profile_every) if profile else None
+
+        if init not in ("random", "pca", "sample"):
+            raise ValueError(f"Init {init} is not supported. Choose from random, pca or sample")
+        self.init = init
+        # pca and sample need the data, they are deferred to train
+        self.init_pending = weight_cube is None and init != "random"
 
         if weight_cube is None:
             self.weight_cube = np.random.rand(x_dim, y_dim, input_dim)
@@ -104,11 +154,14 @@ class SOM:
         
         if mode not in self.mode_methods:
             raise ValueError(f"Mode {mode} is not supported. Choose from {list(self.mode_methods.keys())}")
+        if som_type == "batch_map" and mode != "batch":
+            raise ValueError("som_type batch_map uses all the data every epoch, mode does not apply to it")
         
         # Check if the learning parameters are correct
+        # The learning rate and radius are always recorded, they are cheap
+        self.learning_rate_history = np.zeros(n_iter)
+        self.learning_radius_history = np.zeros(n_iter)
         if histories == True:
-            self.learning_rate_history = np.zeros(n_iter)
-            self.learning_radius_history = np.zeros(n_iter)
             self.bais_matrix_history = np.zeros((x_dim, y_dim, n_iter))
             self.save_neighborhood_function = np.zeros((x_dim, y_dim, n_iter))
             self.track_mbu = np.zeros((2, n_iter))
@@ -127,36 +180,86 @@ class SOM:
             self.weight_cube_history = np.zeros((self.x_dim, self.y_dim))
 
 
-    def train(self, data):
+    def train(self, data, 
+              early_stopping: EarlyStopping = None,
+              callback = None,
+              callback_every: int = 1000,
+              callback_qe_size: int = None,
+              transport: Transport = None,
+              sample_weight: np.ndarray = None):
         """
         Train the SOM object.
 
         Parameters:
         data (np.array): The data to train the SOM on.
+        early_stopping (EarlyStopping): Optional controller that stops the
+            training once the quantization error plateaus. The number of
+            iterations run is then stored in stopped_at.
+        callback (callable): Optional function called every callback_every
+            iterations with a dict of the progress (iteration, its_per_sec,
+            learning parameters...), see ProgressReporter.
+            print_progress prints it as a line.
+        callback_every (int): Number of iterations between two callbacks.
+        callback_qe_size (int): If set the callback also gets the
+            quantization error estimated on this many data points.
+        transport (Transport): Only for som_type batch_map, how the data is
+            split between workers, e.g. ProcessTransport(n_workers=8). By
+            defualt the epochs run in this process.
+        sample_weight (np.array): Optional weight of every data point, e.g.
+            the counts of deduplicated or histogram binned data. Training on
+            weighted data is like training on every point repeated weight
+            times. In online mode the points are drawn with a probability
+            proportional to their weight. In batch mode the weights must be
+            integer counts, every epoch is a shuffle of the repeated points
+            (see _train_batch). som_type batch_map uses weighted sums.
         """
         # Check if the learning parameters are correct
         check_field_exists(self.learning_parameters, "alpha")
 
+        if sample_weight is not None:
+            sample_weight = check_sample_weight(sample_weight, len(data))
+
+        if self.init_pending:
+            self.weight_cube = initial_weight_cube(data, self.x_dim, self.y_dim, self.init, sample_weight)
+            self.init_pending = False
+
         # Decide the order of the input for traiing:
-        train_method = self.mode_methods.get(self.mode)
+        # The batch SOM uses all the data every epoch, it needs no order
+        if self.som_type != "batch_map":
+            train_method = self.mode_methods.get(self.mode)
        
-        # Maybe output an array with random indexes to train the SOM?
-        data_shuffled_index = train_method(data)
+            # Maybe output an array with random indexes to train the SOM?
+            data_shuffled_index = train_method(data, sample_weight)
+
+        self.stopped_at = None
+        if early_stopping is not None:
+            early_stopping.start(data, sample_weight)
+
+        progress = None
+        if callback is not None:
+            progress = ProgressReporter(callback, callback_every, callback_qe_size)
+            progress.start(data, self.n_iter, sample_weight)
 
         # Train the SOM
         if self.som_type == "Kohonen":
-            self.Kohonen_SOM(data, data_shuffled_index)
+            self.Kohonen_SOM(data, data_shuffled_index, early_stopping, progress)
 
         elif self.som_type == "cSOM":
-            self.cSOM(data, data_shuffled_index)   
+            self.cSOM(data, data_shuffled_index, early_stopping, progress)   
+
+        elif self.som_type == "batch_map":
+            train_batch(self, data, transport, early_stopping, progress, sample_weight)
+
+        elif self.som_type == "hogwild":
+            train_hogwild(self, data, data_shuffled_index, early_stopping, progress)
 
         else:
-            raise ValueError(f"SOM type {self.som_type} is not supported. Choose from Kohonen or cSOM")
+            raise ValueError(f"SOM type {self.som_type} is not supported. Choose from Kohonen, cSOM, batch_map or hogwild")
 
         self.is_trained = True
 
 
-    def Kohonen_SOM(self, data, indecies):
+    def Kohonen_SOM(self, data, indecies, early_stopping=None, progress=None):
         """
         Train the SOM using the Kohonen algorithm.
         """
@@ -169,7 +272,11 @@ class SOM:
 
         # Might want to pick a mode outside the loop to save time.
 
+        profiler = self.profiler or NULL_PROFILER
+        profiler.reset()
+
         for i in range(self.n_iter):
+            profiler.start(i)
             #distances = cdist(self.weight_cube.reshape(-1, 
             #                                           self.weight_cube.shape[-1]), 
             #                                           data[int(indecies[i])].reshape(1,self.input_dim), 
@@ -178,9 +285,7 @@ class SOM:
             #w_neuron = np.argmin(distances, axis=0)
             #x_bmu, y_bmu = np.unravel_index(w_neuron, (self.x_dim, self.y_dim))
             x_bmu, y_bmu = self.compute_bmu(data, indecies, i)
-
-            if self.save_weight_cube_history:
-                self.weight_cube_history[x_bmu, y_bmu] += 1
+            profiler.lap("bmu")
 
             # Need to calculate the sigma radius.
             # Might want to write this in a more modular way.
@@ -205,6 +310,7 @@ class SOM:
 
             else:
                 raise ValueError(f"Decay type {self.decay_type} is not supported. Choose from exponential, linear or schedule")
+            profiler.lap("decay")
 
             # Now compute the neighbors to update
             x_min, x_max, y_min, y_max = self.compute_neighborhood(x_bmu, 
@@ -215,9 +321,13 @@ class SOM:
                                                              int(y_bmu), 
                                                              i, 
                                                              radius)
+            profiler.lap("neighborhood")
             
+            if self.save_weight_cube_history:
+                self.weight_cube_history[x_bmu, y_bmu] += 1
             self.learning_rate_history[i] = alpha
             self.learning_radius_history[i] = radius
+            profiler.lap("histories")
 
             # This is currently updating the BMU, but we need to update the BMU and its neighbors.
             # Missing the radius decay. (further away points should be updated less)
@@ -225,23 +335,49 @@ class SOM:
                 alpha 
                 * neighborhood_radius[x_min:x_max, y_min:y_max, np.newaxis] 
                 * (data[int(indecies[i])] - self.weight_cube[x_min:x_max, y_min:y_max]))
+            profiler.lap("update")
             
             # Make this into a function later on to reduce code duplication
             if self.weight_cube_save_states is not None:
                 if i == self.weight_cube_save_states[counter]:
                     self.som_save_state[counter,:,:,:] = self.weight_cube.copy()
                     counter += 1
+            profiler.lap("snapshots")
+
+            if progress is not None and progress.due(i):
+                progress.report(i, self.weight_cube, alpha=alpha, sigma=sigma, radius=radius)
+                profiler.lap("callback")
+
+            if early_stopping is not None and early_stopping.step(i, self.weight_cube):
+                self.stopped_at = early_stopping.stopped_at
+                break
+            profiler.lap("early_stopping")
             
     
-    def cSOM(self, data, indecies):
+    def cSOM(self, data, indecies, early_stopping=None, progress=None):
         """
         Train the SOM using the concious SOM algorithm.
         """
         # Test in controlling the learning radius:
         learning_radius = self.csom_learning_radius # Leave this for SOM development, but should be set to 1 for cSOM
         counter = 0
+        profiler = self.profiler or NULL_PROFILER
+        profiler.reset()
+
+        # The bias is gamma * (scale - frequency) but gamma * scale is the
+        # same for every neuron, so the BMU is argmin(distance + gamma * frequency).
+        # Only one frequency changes per iteration and the bias matrix is
+        # only built for the histories and at the end of the training.
+        if self.custom_scale_sup_matrix == 0:
+            scale = 1/(self.x_dim * self.y_dim)
+        else:
+            scale = self.custom_scale_sup_matrix
+        self.frequency_matrix = np.ascontiguousarray(self.frequency_matrix, dtype=np.float64)
+        frequency = self.frequency_matrix.reshape(-1)  # view, updated in place
+        gamma = None
 
         for i in range(self.n_iter):
+            profiler.start(i)
             # We cannont calculate the BMU in the same way as before
             # We first need the other values to calculate the BMU
             # Calculate all frequency values, initial state is 0
@@ -250,27 +386,28 @@ class SOM:
             alpha, beta, gamma = self.decay_cSOM(i)
             if self.gamma_off == True:
                 gamma = 0
+            profiler.lap("decay")
 
-            # Calculate bais term
-            if self.custom_scale_sup_matrix == 0:
-                self.bais_matrix = gamma * ((1/(self.x_dim * self.y_dim)) - self.frequency_matrix)
-            else:
-                self.bais_matrix = gamma * (self.custom_scale_sup_matrix - self.frequency_matrix)
-
-            x_concious_bmu, y_concious_bmu = self.compute_bmu_cSOM(data, indecies, 
-                                                                   i, self.bais_matrix)
+            w_neuron = np.argmin(self._distances(data[int(indecies[i])])[:, 0] + gamma * frequency)
+            x_concious_bmu, y_concious_bmu = divmod(int(w_neuron), self.y_dim)
+            profiler.lap("bmu")
 
-            if self.save_weight_cube_history:
-                self.weight_cube_history[x_concious_bmu, y_concious_bmu] += 1
+            if self.histories == True:
+                # Bias seen by this iteration, before its frequency update
+                self.bais_matrix_history[:, :, i] = gamma * (scale - self.frequency_matrix)
 
             # Update the frequency term for next round
-            self.frequency_matrix[x_concious_bmu, y_concious_bmu] += beta * (1 - self.frequency_matrix[x_concious_bmu, y_concious_bmu])
+            last_frequency = frequency[w_neuron]
+            frequency[w_neuron] += beta * (1 - last_frequency)
+            profiler.lap("frequency")
 
+            if self.save_weight_cube_history:
+                self.weight_cube_history[x_concious_bmu, y_concious_bmu] += 1
             if self.histories == True:
                 self.frequency_matrix_history[:, :, i] = self.frequency_matrix
-                self.bais_matrix_history[:, :, i] = self.bais_matrix
                 self.learning_rate_history[i] = alpha
                 self.learning_radius_history[i] = learning_radius
+            profiler.lap("histories")
 
             x_min, x_max, y_min, y_max = self.compute_neighborhood(x_concious_bmu, 
                                                                    y_concious_bmu, 
@@ -280,17 +417,30 @@ class SOM:
                                                              int(y_concious_bmu), 
                                                              i, 
                                                              learning_radius)
+            profiler.lap("neighborhood")
             
             self.weight_cube[x_min:x_max, y_min:y_max] += (
                 alpha 
                 * neighborhood_radius[x_min:x_max, y_min:y_max, np.newaxis] 
                 * (data[int(indecies[i])] - self.weight_cube[x_min:x_max, y_min:y_max]))
+            profiler.lap("update")
             
             # Make this into a function later on to reduce code duplication
             if self.weight_cube_save_states is not None:
                 if i == self.weight_cube_save_states[counter]:
                     self.som_save_state[counter,:,:,:] = self.weight_cube.copy()
                     counter += 1
+            profiler.lap("snapshots")
+
+            if progress is not None and progress.due(i):
+                progress.report(i, self.weight_cube, alpha=alpha, beta=beta, 
+                                gamma=gamma, radius=learning_radius)
+                profiler.lap("callback")
+
+            if early_stopping is not None and early_stopping.step(i, self.weight_cube):
+                self.stopped_at = early_stopping.stopped_at
+                break
+            profiler.lap("early_stopping")
 
             ###### Everything bellow here is the old code
 
@@ -300,11 +450,22 @@ class SOM:
             #x_bmu, y_bmu = np.unravel_index(w_neuron, (self.x_dim, self.y_dim))
 
             # recalculate winning neuron
+
+        if gamma is not None:
+            # Bias used by the last iteration
+            self.bais_matrix = gamma * (scale - self.frequency_matrix)
+            self.bais_matrix[x_concious_bmu, y_concious_bmu] = gamma * (scale - last_frequency)
     
+    def _distances(self, data_point):
+        """
+        Euclidean distance from every neuron to a data point, shape
+        (x_dim * y_dim, 1) like scipy's cdist.
+        """
+        diff = self.weight_cube.reshape(-1, self.weight_cube.shape[-1]) - data_point
+        return np.sqrt(np.einsum('ij,ij->i', diff, diff))[:, np.newaxis]
+
     def compute_bmu(self, data, indecies, iteration):
-        distances = cdist(self.weight_cube.reshape(-1, self.weight_cube.shape[-1]), 
-                        data[int(indecies[iteration])].reshape(1,self.input_dim), 
-                        metric='euclidean')
+        distances = self._distances(data[int(indecies[iteration])])
 
         w_neuron = np.argmin(distances, axis=0)
         x_idx, y_idx = np.unravel_index(w_neuron, (self.x_dim, self.y_dim))
@@ -312,9 +473,7 @@ class SOM:
         return x_idx, y_idx
     
     def compute_bmu_cSOM(self, data, indecies, iteration, suppession_matrix):
-        distances = cdist(self.weight_cube.reshape(-1, self.weight_cube.shape[-1]), 
-                        data[int(indecies[iteration])].reshape(1,self.input_dim), 
-                        metric='euclidean')
+        distances = self._distances(data[int(indecies[iteration])])
 
         # When plotting it looks like the suppresion matrix becomes negative
         # which does the opposite of baising the BMU. I will try to make it 
@@ -442,29 +601,51 @@ class SOM:
         return alpha, beta, gamma
 
 
-    def _train_batch(self, data):
+    def _train_batch(self, data, sample_weight=None):
         """
         Train the SOM in batch mode.
         This is making an assumption that the data is bigger than the itteration,
         this is not always true
+        With sample_weight (integer counts) an epoch is a shuffle of the data
+        with every point repeated count times, the repeated data is never
+        built.
         """
+        if sample_weight is not None:
+            counts = sample_weight.astype(np.int64)
+            if not np.array_equal(counts, sample_weight):
+                raise ValueError("In batch mode sample_weight must be integer counts, use mode online for other weights")
+            # Seeded from random so random.seed reproduces it like the unweighted epochs
+            rng = np.random.default_rng(random.getrandbits(64))
+            total = counts.sum()
+            epochs = []
+            for start in range(0, self.n_iter, total):
+                # The first n points of a shuffled epoch hold each point a
+                # multivariate hypergeometric number of times
+                n = min(total, self.n_iter - start)
+                epoch_counts = counts if n == total else rng.multivariate_hypergeometric(counts, n)
+                epoch = np.repeat(np.arange(len(counts)), epoch_counts)
+                rng.shuffle(epoch)
+                epochs.append(epoch)
+            return np.concatenate(epochs)
+
         batches = math.ceil(self.n_iter/ len(data))
         reminder = self.n_iter % len(data) 
         indecies = np.zeros(self.n_iter)
 
         for batch in range(batches):
-            if batch != batches - 1:
+            if batch != batches - 1 or reminder == 0:
                 indecies[batch*len(data): (1 + batch)*len(data)] = random.sample(list(np.arange(len(data))), len(data))
-            elif reminder != 0:
+            else:
                 indecies[(batch)*len(data):] = random.sample(list(np.arange(len(data))), reminder)
                 
         return indecies
 
-    def _train_online(self, data):
+    def _train_online(self, data, sample_weight=None):
         """
         Train the SOM in online mode.
+        With sample_weight the points are drawn proportionally to their weight.
         """
-        return random.choices(np.arange(len(data)), k=self.n_iter) 
+        return random.choices(np.arange(len(data)), weights=sample_weight, k=self.n_iter) 
     
     def weight_cube(self):
         """
@@ -472,6 +653,133 @@ class SOM:
         """
         return self.weight_cube
 
+    def quality(self, data, sample_size: int = None, seed: int = None) -> dict:
+        """
+        Quantization error, topographic error and per neuron distortion of
+        the current weight cube, see som_quality.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            data in the SOM format, shape (n_samples, input_dim)
+        sample_size : int
+            Optional number of data points to estimate the metrics on
+        seed : int
+            Seed of the subsample
+        """
+        return som_quality(data, self.weight_cube, sample_size=sample_size, seed=seed)
+
+    def profile_report(self, as_frame: bool = False):
+        """
+        Time spent in each phase of the last training, see
+        PhaseProfiler.report. The SOM needs to be created with profile=True.
+
+        Parameters
+        ----------
+        as_frame : bool
+            If True returns a pandas DataFrame instead of a dict
+        """
+        if self.profiler is None:
+            raise ValueError("Profiling is off, create the SOM with profile=True")
+        return self.profiler.report(as_frame)
+
+    def save(self, file_name: str):
+        """
+        Save the weight cube, every training setting, the state of the
+        trainer (cSOM frequencies, histories, snapshots...) and the fitted
+        scaler (if any) to a .npz file, so a loaded SOM can continue training
+        exactly like the original.
+
+        Parameters
+        ----------
+        file_name : str
+            Path to where you want to save the file + file name
+        """
+        arrays = {'weight_cube': self.weight_cube,
+                  'n_iter': self.n_iter,
+                  'learning_parameters': self.learning_parameters,
+                  'decay_type': self.decay_type,
+                  'neighborhood_decay': self.neighborhood_decay,
+                  'som_type': self.som_type,
+                  'mode': self.mode,
+                  'save_weight_cube_history': self.save_weight_cube_history,
+                  'gamma_off': self.gamma_off,
+                  'custom_scale_sup_matrix': self.custom_scale_sup_matrix,
+                  'csom_learning_radius': self.csom_learning_radius,
+                  'histories': self.histories,
+                  'profile': self.profiler is not None,
+                  'init': self.init,
+                  'is_trained': self.is_trained,
+                  'init_pending': self.init_pending}
+        if self.profiler is not None:
+            arrays['profile_every'] = self.profiler.sample_every
+        if self.weight_cube_save_states is not None:
+            arrays['weight_cube_save_states'] = self.weight_cube_save_states
+        if self.stopped_at is not None:
+            arrays['stopped_at'] = self.stopped_at
+        for key in _TRAINER_STATE:
+            if hasattr(self, key):
+                arrays[key] = getattr(self, key)
+        if self.scaler is not None:
+            for key, value in self.scaler.get_params().items():
+                arrays[f'scaler_{key}'] = value
+        np.savez(file_name, **arrays)
+
+    @classmethod
+    def load(cls, file_name: str):
+        """
+        Load an SOM saved with save.
+
+        Parameters
+        ----------
+        file_name : str
+            Path to the .npz file
+
+        Returns
+        -------
+        som : SOM
+            SOM with the saved weight cube, settings, trainer state and scaler
+        """
+        with np.load(file_name) as saved:
+            scaler = None
+            if 'scaler_data_min' in saved:
+                scaler = AffineScaler.from_params({key: saved[f'scaler_{key}'] 
+                                                   for key in ('target_min', 'target_max', 
+                                                               'data_min', 'data_max')})
+            x_dim, y_dim, input_dim = saved['weight_cube'].shape
+            som = cls(x_dim, y_dim, input_dim, int(saved['n_iter']),
+                      learning_parameters=saved['learning_parameters'],
+                      decay_type=str(saved['decay_type']),
+                      neighborhood_decay=str(saved['neighborhood_decay']),
+                      som_type=str(saved['som_type']),
+                      mode=str(saved['mode']),
+                      save_weight_cube_history=bool(saved['save_weight_cube_history']),
+                      gamma_off=bool(saved['gamma_off']),
+                      weight_cube=saved['weight_cube'],
+                      weight_cube_save_states=saved['weight_cube_save_states'] if 'weight_cube_save_states' in saved else None,
+                      custom_scale_sup_matrix=saved['custom_scale_sup_matrix'].item(),
+                      csom_learning_radius=int(saved['csom_learning_radius']),
+                      histories=bool(saved['histories']),
+                      scaler=scaler,
+                      profile=bool(saved['profile']),
+                      profile_every=int(saved['profile_every']) if 'profile_every' in saved else 100,
+                      init=str(saved['init']))
+            som.is_trained = bool(saved['is_trained'])
+            som.init_pending = bool(saved['init_pending'])
+            if 'stopped_at' in saved:
+                som.stopped_at = int(saved['stopped_at'])
+            for key in _TRAINER_STATE:
+                if key in saved:
+                    setattr(som, key, saved[key])
+        return som
+
+
+# Arrays updated by the training, saved with the model so a loaded SOM
+# continues from the same state
+_TRAINER_STATE = ('frequency_matrix', 'bais_matrix', 'weight_cube_history', 'som_save_state',
+                  'learning_rate_history', 'learning_radius_history', 'bais_matrix_history',
+                  'save_neighborhood_function', 'track_mbu', 'track_radius_limits',
+                  'frequency_matrix_history')
 
 
 def check_field_exists(structured_array: np.ndarray, field_name: str) -> bool:
@@ -480,6 +788,20 @@ def check_field_exists(structured_array: np.ndarray, field_name: str) -> bool:
     """
     return field_name in structured_array.dtype.names
 
+def check_sample_weight(sample_weight: np.ndarray, n_samples: int) -> np.ndarray:
+    """
+    Check that the sample weights match the data and can be used as
+    weights: finite, non negative and not all 0.
+    """
+    sample_weight = np.asarray(sample_weight, dtype=np.float64)
+    if sample_weight.shape != (n_samples,):
+        raise ValueError(f"sample_weight has shape {sample_weight.shape}, expected ({n_samples},)")
+    if not np.all(np.isfinite(sample_weight)) or np.any(sample_weight < 0):
+        raise ValueError("sample_weight must be finite and non negative")
+    if not sample_weight.sum() > 0:
+        raise ValueError("sample_weight must have at least one positive weight")
+    return sample_weight
+
 def log_parameters(parameters: dict):
     """
     Make a log of the parameters used to train the SOM and save this onto a file.
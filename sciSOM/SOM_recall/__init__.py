@@ -1,2 +1,3 @@
-from .recall import *
-from .strax_functions import *
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__ = attach(__name__, ["recall", "strax_functions", "map_statistics", "metrics"])
@@ -0,0 +1,225 @@
+import numpy as np
+from typing import Tuple
+from .recall import SOM_bmu_recall
+
+
+def density_matrix(bmu_indices: np.ndarray,
+                   som_shape: Tuple[int, int],
+                   weights: np.ndarray = None,
+                   log_density: bool = False) -> np.ndarray:
+    """
+    Builds the hit histogram of an SOM from the BMU of each data point.
+
+    Parameters
+    ----------
+    bmu_indices : np.ndarray
+        Flat BMU index of each data point, as returned by SOM_bmu_recall
+    som_shape : tuple
+        (x_dim, y_dim) of the SOM
+    weights : np.ndarray
+        Optional weight of each data point (e.g. its area), by defualt every
+        data point counts as 1
+    log_density : bool
+        If True returns log10(density + 1)
+
+    Returns
+    -------
+    density : np.ndarray
+        Number (or summed weight) of data points mapped to each neuron,
+        shape som_shape
+    """
+    n_neurons = som_shape[0] * som_shape[1]
+    density = np.bincount(bmu_indices, weights=weights, minlength=n_neurons)
+    density = density.reshape(som_shape).astype(np.float64)
+
+    if log_density == True:
+        density = np.log10(density + 1)
+
+    return density
+
+
+def SOM_density_recall(data_in_SOM_fmt: np.ndarray,
+                       weight_cube: np.ndarray,
+                       weights: np.ndarray = None,
+                       log_density: bool = False,
+                       chunk_size: int = None) -> np.ndarray:
+    """
+    Recalls the data with the weight cube and returns the density of data
+    points per neuron.
+
+    Parameters
+    ----------
+    data_in_SOM_fmt : np.ndarray
+        data to map in the SOM format, shape (n_samples, input_dim)
+    weight_cube : np.ndarray
+        SOM weight cube
+    weights : np.ndarray
+        Optional weight of each data point
+    log_density : bool
+        If True returns log10(density + 1)
+    chunk_size : int
+        Number of data points per chunk of the recall
+
+    Returns
+    -------
+    density : np.ndarray
+        Density of data points per neuron, shape (x_dim, y_dim)
+    """
+    bmu_indices = SOM_bmu_recall(data_in_SOM_fmt, weight_cube, chunk_size)
+    return density_matrix(bmu_indices, weight_cube.shape[:2], weights, log_density)
+
+
+def neuron_aggregates(bmu_indices: np.ndarray,
+                      values: np.ndarray,
+                      som_shape: Tuple[int, int],
+                      chunk_size: int = 2**14) -> dict:
+    """
+    Computes the count, sum, mean and variance of any per data point quantity
+    (waveforms, area, rise time...) for every neuron of the SOM.
+
+    Each chunk of the data is sorted by BMU and summed per neuron with
+    np.add.reduceat, so the cost is a single pass over the data regardless
+    of the size of the map.
+    The variance is computed from the squared deviations to the mean of each
+    chunk, merged over the chunks with the formula of Chan et al., so it
+    stays accurate for values with a large offset and a small spread.
+
+    Parameters
+    ----------
+    bmu_indices : np.ndarray
+        Flat BMU index of each data point, as returned by SOM_bmu_recall
+    values : np.ndarray
+        Quantity to aggregate, shape (n_samples,) or (n_samples, ...)
+    som_shape : tuple
+        (x_dim, y_dim) of the SOM
+    chunk_size : int
+        Number of data points accumulated at a time
+
+    Returns
+    -------
+    aggregates : dict
+        'count' with shape som_shape and 'sum', 'mean' and 'var' with shape
+        som_shape + values.shape[1:]. Neurons without data have a mean and
+        variance of nan.
+    """
+    assert len(bmu_indices) == len(values), "bmu_indices and values must have the same length"
+
+    n_neurons = som_shape[0] * som_shape[1]
+    value_shape = np.shape(values)[1:]
+    count = np.zeros(n_neurons)
+    sums = np.zeros((n_neurons,) + value_shape)
+    mean = np.zeros((n_neurons,) + value_shape)
+    m2 = np.zeros((n_neurons,) + value_shape)
+
+    for start in range(0, len(values), chunk_size):
+        chunk_bmus = bmu_indices[start:start + chunk_size]
+        order = np.argsort(chunk_bmus, kind='stable')
+        neurons, starts, chunk_count = np.unique(chunk_bmus[order], return_index=True, return_counts=True)
+        chunk = np.asarray(values[start:start + chunk_size], dtype=np.float64)[order]
+
+        # Mean and sum of squared deviations of the chunk per neuron, centered
+        # on the chunk mean so a large offset does not cancel
+        chunk_count = chunk_count.reshape((-1,) + (1,) * len(value_shape)).astype(np.float64)
+        chunk_sum = np.add.reduceat(chunk, starts, axis=0)
+        sums[neurons] += chunk_sum
+        chunk_mean = chunk_sum / chunk_count
+        chunk -= np.repeat(chunk_mean, chunk_count.ravel().astype(int), axis=0)
+        chunk **= 2
+        chunk_m2 = np.add.reduceat(chunk, starts, axis=0)
+
+        # Merged with the previous chunks (Chan et al.)
+        old_count = count[neurons].reshape(chunk_count.shape)
+        new_count = old_count + chunk_count
+        delta = chunk_mean - mean[neurons]
+        mean[neurons] += delta * (chunk_count / new_count)
+        m2[neurons] += chunk_m2 + delta ** 2 * (old_count * chunk_count / new_count)
+        count[neurons] += chunk_count.ravel()
+
+    count_b = count.reshape((n_neurons,) + (1,) * len(value_shape))
+    mean[count == 0] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = m2 / count_b
+
+    return {'count': count.reshape(som_shape),
+            'sum': sums.reshape(som_shape + value_shape),
+            'mean': mean.reshape(som_shape + value_shape),
+            'var': var.reshape(som_shape + value_shape)}
+
+
+def SOM_neuron_aggregates(data_in_SOM_fmt: np.ndarray,
+                          weight_cube: np.ndarray,
+                          values: np.ndarray,
+                          chunk_size: int = None) -> dict:
+    """
+    Recalls the data with the weight cube and aggregates values per neuron.
+
+    Parameters
+    ----------
+    data_in_SOM_fmt : np.ndarray
+        data to map in the SOM format, shape (n_samples, input_dim)
+    weight_cube : np.ndarray
+        SOM weight cube
+    values : np.ndarray
+        Quantity to aggregate, shape (n_samples,) or (n_samples, ...)
+    chunk_size : int
+        Number of data points per chunk of the recall
+
+    Returns
+    -------
+    aggregates : dict
+        See neuron_aggregates
+    """
+    bmu_indices = SOM_bmu_recall(data_in_SOM_fmt, weight_cube, chunk_size)
+    return neuron_aggregates(bmu_indices, values, weight_cube.shape[:2])
+
+
+def group_by_label(labels: np.ndarray,
+                   max_per_group: int = None,
+                   seed: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Groups data points by label with a single stable argsort, so every group
+    is a contiguous slice of the returned index array.
+
+    The members of group k are order[offsets[k]:offsets[k+1]], and keep the
+    order they had in the data.
+
+    Parameters
+    ----------
+    labels : np.ndarray
+        Label (e.g. SOM cluster) of each data point
+    max_per_group : int
+        If given, groups with more members are randomly downsampled to this
+        many data points (usefull for scatter plots)
+    seed : int
+        Seed for the random downsampling
+
+    Returns
+    -------
+    unique_labels : np.ndarray
+        Sorted unique labels
+    order : np.ndarray
+        Indices of the data points, grouped by label
+    offsets : np.ndarray
+        Start of each group in order, with the end of the last group
+        appended, shape (len(unique_labels) + 1,)
+    """
+    labels = np.asarray(labels)
+    order = np.argsort(labels, kind='stable')
+    unique_labels, starts = np.unique(labels[order], return_index=True)
+    offsets = np.append(starts, len(labels))
+
+    if max_per_group is None:
+        return unique_labels, order, offsets
+
+    rng = np.random.default_rng(seed)
+    sizes = np.diff(offsets)
+    kept = []
+    for start, size in zip(offsets[:-1], sizes):
+        if size > max_per_group:
+            kept.append(start + np.sort(rng.choice(size, max_per_group, replace=False)))
+        else:
+            kept.append(np.arange(start, start + size))
+    order = order[np.concatenate(kept)] if kept else order
+    offsets = np.append(0, np.cumsum(np.minimum(sizes, max_per_group)))
+
+    return unique_labels, order, offsets
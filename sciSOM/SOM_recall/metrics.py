@@ -0,0 +1,227 @@
+import numpy as np
+from typing import Tuple
+from .recall import SOM_bmu_recall
+
+
+def top2_bmus(data_in_SOM_fmt: np.ndarray,
+              weight_cube: np.ndarray,
+              chunk_size: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the best and second best matching units of every data point in a
+    single chunked pass over the data.
+
+    Uses the same ||w||^2 - 2 w.x expansion as SOM_bmu_recall, the second
+    BMU is the minimum once the BMU of each row is masked out.
+
+    Parameters
+    ----------
+    data_in_SOM_fmt : np.ndarray
+        data in the SOM format, shape (n_samples, input_dim)
+    weight_cube : np.ndarray
+        SOM weight cube, needs at least two neurons
+    chunk_size : int
+        Number of data points per chunk, by defualt chosen so each chunk of
+        distances holds about 4 million entries
+
+    Returns
+    -------
+    bmu_indices : np.ndarray
+        Flat index of the BMU of each data point
+    second_bmu_indices : np.ndarray
+        Flat index of the second BMU of each data point
+    bmu_sq_distances : np.ndarray
+        Squared euclidean distance of each data point to its BMU
+    """
+    weights = weight_cube.reshape(-1, weight_cube.shape[-1])
+    if len(weights) < 2:
+        raise ValueError("The SOM needs at least two neurons to find the second BMU")
+    weights_sq = np.einsum('ij,ij->i', weights, weights)
+    n_samples = len(data_in_SOM_fmt)
+    if chunk_size is None:
+        chunk_size = max(1, 2**22 // len(weights))
+
+    bmu_indices = np.empty(n_samples, dtype=np.intp)
+    second_bmu_indices = np.empty(n_samples, dtype=np.intp)
+    bmu_sq_distances = np.empty(n_samples)
+    for start in range(0, n_samples, chunk_size):
+        chunk = data_in_SOM_fmt[start:start + chunk_size]
+        distances = chunk @ weights.T
+        distances *= -2
+        distances += weights_sq
+
+        rows = np.arange(len(chunk))
+        bmu = np.argmin(distances, axis=1)
+        bmu_distances = distances[rows, bmu]
+        distances[rows, bmu] = np.inf
+        second_bmu = np.argmin(distances, axis=1)
+
+        stop = start + len(chunk)
+        bmu_indices[start:stop] = bmu
+        second_bmu_indices[start:stop] = second_bmu
+        bmu_sq_distances[start:stop] = bmu_distances + np.einsum('ij,ij->i', chunk, chunk)
+
+    # Rounding can make the expanded distance slightly negative
+    np.maximum(bmu_sq_distances, 0, out=bmu_sq_distances)
+    return bmu_indices, second_bmu_indices, bmu_sq_distances
+
+
+def quantization_error(data_in_SOM_fmt: np.ndarray,
+                       weight_cube: np.ndarray,
+                       chunk_size: int = None) -> float:
+    """
+    Mean euclidean distance of the data points to their BMU. Only needs the
+    BMU so it is cheaper than som_quality.
+
+    Parameters
+    ----------
+    data_in_SOM_fmt : np.ndarray
+        data in the SOM format, shape (n_samples, input_dim)
+    weight_cube : np.ndarray
+        SOM weight cube
+    chunk_size : int
+        Number of data points per chunk of the BMU search
+
+    Returns
+    -------
+    quantization_error : float
+    """
+    bmu_indices = SOM_bmu_recall(data_in_SOM_fmt, weight_cube, chunk_size)
+    weights = weight_cube.reshape(-1, weight_cube.shape[-1])
+    return np.mean(np.linalg.norm(data_in_SOM_fmt - weights[bmu_indices], axis=1))
+
+
+def are_adjacent(indices_a: np.ndarray,
+                 indices_b: np.ndarray,
+                 som_shape: Tuple[int, int],
+                 topology: str = "rectangular") -> np.ndarray:
+    """
+    Checks if pairs of neurons are direct neighbors on the map.
+
+    Uses the same lattice as compute_fences: a rectangular neuron has 4
+    neighbors, on a hexagonal lattice odd rows are shifted half a cell
+    towards larger j so every neuron has 6 neighbors.
+
+    Parameters
+    ----------
+    indices_a, indices_b : np.ndarray
+        Flat neuron indices of each pair
+    som_shape : tuple
+        (x_dim, y_dim) of the SOM
+    topology : str
+        Lattice of the SOM, either "rectangular" or "hexagonal"
+
+    Returns
+    -------
+    adjacent : np.ndarray
+        True for every pair of neighboring neurons
+    """
+    if topology not in ("rectangular", "hexagonal"):
+        raise ValueError(f"Topology {topology} is not supported. Choose from rectangular or hexagonal")
+
+    row_a, col_a = np.divmod(indices_a, som_shape[1])
+    row_b, col_b = np.divmod(indices_b, som_shape[1])
+    d_row = row_b - row_a
+    d_col = col_b - col_a
+
+    if topology == "rectangular":
+        return np.abs(d_row) + np.abs(d_col) == 1
+
+    # Put the neuron of the upper row first, the diagonal neighbor in the
+    # next row is at j-1 for even rows and j+1 for odd rows
+    upper_row = np.minimum(row_a, row_b)
+    d_col = np.where(d_row < 0, -d_col, d_col)
+    diagonal = np.where(upper_row % 2 == 0, -1, 1)
+    same_row = (d_row == 0) & (np.abs(d_col) == 1)
+    next_row = (np.abs(d_row) == 1) & ((d_col == 0) | (d_col == diagonal))
+    return same_row | next_row
+
+
+def draw_subsample(data: np.ndarray,
+                   size: int = None,
+                   seed: int = None,
+                   sample_weight: np.ndarray = None) -> np.ndarray:
+    """
+    Draws a random subsample of the data, e.g. to estimate the quantization
+    error during training. The rows keep their order in the data.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Data, shape (n_samples, input_dim)
+    size : int
+        Number of data points to draw, by defualt (or if the data is not
+        larger) all the data is returned
+    seed : int
+        Seed of the subsample
+    sample_weight : np.ndarray
+        Optional weight of every data point, the points are then drawn with
+        replacement proportionally to their weight so the subsample follows
+        the weighted data
+
+    Returns
+    -------
+    subsample : np.ndarray
+        The drawn rows, or data itself
+    """
+    if size is None:
+        return data
+    rng = np.random.default_rng(seed)
+    if sample_weight is not None:
+        return data[np.sort(rng.choice(len(data), size, p=sample_weight / sample_weight.sum()))]
+    if size < len(data):
+        return data[np.sort(rng.choice(len(data), size, replace=False))]
+    return data
+
+
+def som_quality(data_in_SOM_fmt: np.ndarray,
+                weight_cube: np.ndarray,
+                topology: str = "rectangular",
+                sample_size: int = None,
+                seed: int = None,
+                chunk_size: int = None) -> dict:
+    """
+    Computes the quantization error, topographic error and the distortion of
+    every neuron with one pass over the data.
+
+    For periodic checks during training pass a sample_size, the metrics are
+    then estimated on a random subsample of the data.
+
+    Parameters
+    ----------
+    data_in_SOM_fmt : np.ndarray
+        data in the SOM format, shape (n_samples, input_dim)
+    weight_cube : np.ndarray
+        SOM weight cube
+    topology : str
+        Lattice of the SOM, either "rectangular" or "hexagonal"
+    sample_size : int
+        Optional number of data points to draw (without replacement)
+    seed : int
+        Seed of the subsample
+    chunk_size : int
+        Number of data points per chunk of the BMU search
+
+    Returns
+    -------
+    quality : dict
+        'quantization_error': mean distance of the data points to their BMU,
+        'topographic_error': fraction of data points whose first and second
+        BMU are not neighbors,
+        'distortion': summed squared distance of the data points mapped to
+        each neuron, shape (x_dim, y_dim),
+        'density': number of data points mapped to each neuron
+    """
+    data_in_SOM_fmt = draw_subsample(data_in_SOM_fmt, sample_size, seed)
+
+    som_shape = weight_cube.shape[:2]
+    n_neurons = som_shape[0] * som_shape[1]
+    bmu_indices, second_bmu_indices, bmu_sq_distances = top2_bmus(data_in_SOM_fmt, weight_cube, chunk_size)
+
+    adjacent = are_adjacent(bmu_indices, second_bmu_indices, som_shape, topology)
+    distortion = np.bincount(bmu_indices, weights=bmu_sq_distances, minlength=n_neurons)
+    density = np.bincount(bmu_indices, minlength=n_neurons)
+
+    return {'quantization_error': np.mean(np.sqrt(bmu_sq_distances)),
+            'topographic_error': 1 - np.mean(adjacent),
+            'distortion': distortion.reshape(som_shape),
+            'density': density.reshape(som_shape)}
@@ -1,9 +1,7 @@
 import numpy as np
-from typing import Any, Union, Dict
+from typing import Any, Union, Dict, Tuple
 #import matplotlib.pyplot as plt
-from scipy.spatial.distance import cdist
 import numpy.lib.recfunctions as rfn
-import viff
 
 # Lets organize this a bit better
 # Need to move image manipulation functions to a separate file
@@ -91,21 +89,213 @@ def affine_transform(data: np.ndarray,
     normalized_data : np.ndarray
         Data after the affine transformation
     """
-    _, dim = np.shape(data)
-    data_min = np.min(data, axis = 0)
-    data_max = np.max(data, axis = 0)  
+    return AffineScaler(target_min, target_max).fit(data).transform(data)
 
-    if np.isscalar(target_min):
-        target_min = np.repeat(target_min, dim)
-    if np.isscalar(target_max):
-        target_max = np.repeat(target_max, dim) 
 
-    if (data_max == data_min).any():
-        raise ZeroDivisionError('Data has no variance')
-    
-    normalized_data = ((data - data_min)/(data_max-data_min))*(target_max-target_min) + target_min
-    return normalized_data
+class AffineScaler:
+    """
+    AffineScaler class:
+
+    Affine transform (min-max scaling) of each feature that remembers the
+    minimum and maximum of the data it was fitted on, so data used for
+    recalls can be scaled exactly like the training data.
+
+    The minimum and maximum can be accumulated over chunks with partial_fit,
+    and transform can write into an existing array, so the data never has to
+    be held in memory more than once.
+    """
+
+    def __init__(self, 
+                 target_min: Union[float, np.ndarray] = 0, 
+                 target_max: Union[float, np.ndarray] = 1):
+        """
+        Initialize the scaler.
+
+        Parameters
+        ----------
+        target_min : float or np.ndarray
+            Minimum of the target space
+        target_max : float or np.ndarray
+            Maximum of the target space
+        """
+        self.target_min = target_min
+        self.target_max = target_max
+        self.data_min = None
+        self.data_max = None
+
+    def partial_fit(self, data: np.ndarray):
+        """
+        Updates the minimum and maximum of each feature with a chunk of data.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            Chunk of data, shape (n_samples, n_features)
+
+        Returns
+        -------
+        self : AffineScaler
+        """
+        chunk_min = np.min(data, axis = 0).astype(np.float64)
+        chunk_max = np.max(data, axis = 0).astype(np.float64)
+        if self.data_min is None:
+            self.data_min = chunk_min
+            self.data_max = chunk_max
+        else:
+            self.data_min = np.minimum(self.data_min, chunk_min)
+            self.data_max = np.maximum(self.data_max, chunk_max)
+        return self
+
+    def fit(self, data: np.ndarray, chunk_size: int = None):
+        """
+        Finds the minimum and maximum of each feature.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            Data, shape (n_samples, n_features), can be a memory map
+        chunk_size : int
+            If given, the data is read chunk_size samples at a time
+
+        Returns
+        -------
+        self : AffineScaler
+        """
+        self.data_min = None
+        self.data_max = None
+        if chunk_size is None:
+            chunk_size = max(len(data), 1)
+        for start in range(0, len(data), chunk_size):
+            self.partial_fit(data[start:start + chunk_size])
+        return self
+
+    def transform(self, 
+                  data: np.ndarray, 
+                  out: np.ndarray = None, 
+                  inplace: bool = False) -> np.ndarray:
+        """
+        Applies the affine transform fitted on the training data.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            Data to scale, shape (n_samples, n_features)
+        out : np.ndarray
+            Array to write the result into, by defualt a new float64 array
+        inplace : bool
+            If True data itself is overwritten (same as out=data), data
+            must then be a float array
+
+        Returns
+        -------
+        normalized_data : np.ndarray
+            Data after the affine transformation
+        """
+        data_min, data_range, target_min, target_range = self._parameters()
+        if inplace:
+            out = data
+        if out is None:
+            out = np.empty(np.shape(data), dtype=np.float64)
+        check_float_output(out)
+
+        np.subtract(data, data_min, out=out)
+        out /= data_range
+        out *= target_range
+        out += target_min
+        return out
+
+    def inverse_transform(self, 
+                          normalized_data: np.ndarray, 
+                          out: np.ndarray = None, 
+                          inplace: bool = False) -> np.ndarray:
+        """
+        Maps scaled data back to the original space.
+
+        Parameters
+        ----------
+        normalized_data : np.ndarray
+            Scaled data, shape (n_samples, n_features)
+        out : np.ndarray
+            Array to write the result into, by defualt a new float64 array
+        inplace : bool
+            If True normalized_data itself is overwritten, it must then
+            be a float array
+
+        Returns
+        -------
+        data : np.ndarray
+            Data in the original space
+        """
+        data_min, data_range, target_min, target_range = self._parameters()
+        if inplace:
+            out = normalized_data
+        if out is None:
+            out = np.empty(np.shape(normalized_data), dtype=np.float64)
+        check_float_output(out)
+
+        np.subtract(normalized_data, target_min, out=out)
+        out /= target_range
+        out *= data_range
+        out += data_min
+        return out
+
+    def fit_transform(self, data: np.ndarray, **kwargs) -> np.ndarray:
+        """
+        fit followed by transform, kwargs are passed to transform.
+        """
+        return self.fit(data).transform(data, **kwargs)
+
+    def get_params(self) -> dict:
+        """
+        Returns the fitted parameters as arrays, so they can be saved with np.savez.
+
+        Raises a ValueError if the scaler was not fitted, the missing minimum
+        and maximum would be saved as pickled object arrays.
+        """
+        if self.data_min is None:
+            raise ValueError("The scaler has not been fitted yet, call fit or partial_fit before saving it")
+        return {'target_min': np.asarray(self.target_min),
+                'target_max': np.asarray(self.target_max),
+                'data_min': np.asarray(self.data_min),
+                'data_max': np.asarray(self.data_max)}
+
+    @classmethod
+    def from_params(cls, params: dict):
+        """
+        Rebuilds a fitted scaler from the output of get_params.
+        """
+        scaler = cls(params['target_min'], params['target_max'])
+        scaler.data_min = np.asarray(params['data_min'])
+        scaler.data_max = np.asarray(params['data_max'])
+        return scaler
+
+    def _parameters(self):
+        """
+        Checks the scaler was fitted and returns the (broadcastable) minimum
+        and range of the data and target spaces.
+        """
+        if self.data_min is None:
+            raise ValueError("The scaler has not been fitted yet, call fit or partial_fit first")
+
+        data_range = self.data_max - self.data_min
+        if (data_range == 0).any():
+            raise ZeroDivisionError('Data has no variance')
+
+        target_min = np.asarray(self.target_min, dtype=np.float64)
+        target_range = np.asarray(self.target_max, dtype=np.float64) - target_min
+        return self.data_min, data_range, target_min, target_range
+
     
+def check_float_output(out: np.ndarray):
+    """
+    Check that the scaled data can be written into out, the result of the
+    affine transform is not an integer.
+    """
+    if not np.issubdtype(out.dtype, np.floating):
+        raise ValueError(f"Cannot write the scaled data into an array of dtype {out.dtype}, "
+                         "use a float array or inplace=False")
+
+
 # I should make a separate file for image manipulation functions
 def select_middle_pixel(img_as_np_array: np.ndarray, 
                         pxl_per_block: int = 12) -> np.ndarray:
@@ -129,23 +319,123 @@ def select_middle_pixel(img_as_np_array: np.ndarray,
     SOM_img_clusters : np.ndarray
         Image with 1 pixel per cell
     """
+    SOM_img_clusters = reduce_cluster_image(img_as_np_array, pxl_per_block)
+    return SOM_img_clusters.astype(np.float64)
+
+
+def reduce_cluster_image(img_as_np_array: np.ndarray,
+                         pxl_per_block: int = 12,
+                         fence_width: int = 0,
+                         method: str = "center") -> np.ndarray:
+    """
+    Reduces an image of the SOM (e.g. a cluster image drawn in NS or an
+    mU-matrix image) to one pixel per neuron.
+
+    Block k along each axis covers pixels k * (pxl_per_block + fence_width)
+    up to k * (pxl_per_block + fence_width) + pxl_per_block, the fence_width
+    pixels in between are ignored.
+
+    Parameters
+    ----------
+    img_as_np_array : np.ndarray
+        Image as a numpy array, shape (width, height, depth)
+    pxl_per_block : int
+        Number of pixels per block in the image
+    fence_width : int
+        Number of pixels between consecutive blocks
+    method : str
+        "center" takes the middle pixel of each block using strided slicing,
+        "mode" takes the most common color in each block, which is robust
+        to antialiasing at the edges of the clusters
+
+    Returns
+    -------
+    SOM_img_clusters : np.ndarray
+        Image with 1 pixel per cell, with the dtype of the input image
+    """
     [width, height, depth] = img_as_np_array.shape
-    #img_flipped = np.flip(img_as_np_array, 0) # image indexing start at the top and go down
-                                              # this fixes this issue.
-    img_flipped = img_as_np_array
-    SOM_width = int(width/pxl_per_block)
-    SOM_height = int(height/pxl_per_block)
-    
-    SOM_img_clusters = np.zeros([SOM_width, SOM_height, depth])
-    
-    for col in np.arange(SOM_width):
-        #print(f'col number is : {col}')
-        for row in np.arange(SOM_height):
-            #print(f'Number in computation is {pxl_per_block/2 + (row*12)}')
-            SOM_img_clusters[col, row, :] = img_flipped[int(pxl_per_block/2) + (col*12), 
-                                                        int(pxl_per_block/2) + (row*12), :]
-            
-    return SOM_img_clusters
+    stride = pxl_per_block + fence_width
+    SOM_width = (width + fence_width) // stride
+    SOM_height = (height + fence_width) // stride
+
+    if method == "center":
+        middle = pxl_per_block // 2
+        return img_as_np_array[middle::stride, middle::stride][:SOM_width, :SOM_height]
+
+    elif method == "mode":
+        # Gather the pixels of every block: (SOM_width, SOM_height, pixels, depth)
+        offsets = np.arange(pxl_per_block)
+        rows = (np.arange(SOM_width)[:, np.newaxis] * stride + offsets).ravel()
+        cols = (np.arange(SOM_height)[:, np.newaxis] * stride + offsets).ravel()
+        blocks = img_as_np_array[np.ix_(rows, cols)]
+        blocks = blocks.reshape(SOM_width, pxl_per_block, SOM_height, pxl_per_block, depth)
+        blocks = blocks.transpose(0, 2, 1, 3, 4).reshape(SOM_width * SOM_height, -1, depth)
+
+        # Replace every color with an integer code and find the longest run
+        # of equal codes in each sorted block
+        colors, codes = _unique_colors(blocks.reshape(-1, depth))
+        codes = np.sort(codes.reshape(len(blocks), -1), axis=1)
+        position = np.arange(codes.shape[1])
+        run_start = np.where(np.diff(codes, axis=1, prepend=-1) != 0, position, 0)
+        run_length = position - np.maximum.accumulate(run_start, axis=1)
+        mode_codes = codes[np.arange(len(codes)), np.argmax(run_length, axis=1)]
+        return colors[mode_codes].reshape(SOM_width, SOM_height, depth)
+
+    else:
+        raise ValueError(f"Method {method} is not supported. Choose from center or mode")
+
+
+def _unique_colors(pixels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    np.unique(pixels, axis=0, return_inverse=True) for a (n_pixels, depth)
+    array. 8 bit images are packed into one integer per pixel first, which
+    is much faster than sorting rows.
+    """
+    depth = pixels.shape[-1]
+    if pixels.dtype != np.uint8 or depth > 8:
+        colors, codes = np.unique(pixels, axis=0, return_inverse=True)
+        return colors, codes.ravel()
+
+    packed = np.zeros(len(pixels), dtype=np.uint64)
+    for channel in range(depth):
+        packed |= pixels[:, channel].astype(np.uint64) << np.uint64(8 * (depth - 1 - channel))
+    packed_colors, codes = np.unique(packed, return_inverse=True)
+    shifts = np.uint64(8) * np.arange(depth - 1, -1, -1, dtype=np.uint64)
+    colors = ((packed_colors[:, np.newaxis] >> shifts) & np.uint64(255)).astype(np.uint8)
+    return colors, codes
+
+
+def cluster_image_to_labels(img_as_np_array: np.ndarray,
+                            pxl_per_block: int = 12,
+                            fence_width: int = 0,
+                            method: str = "center") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turns a cluster image of the SOM into the reference map used for recalls.
+
+    Parameters
+    ----------
+    img_as_np_array : np.ndarray
+        Image as a numpy array, shape (width, height, depth)
+    pxl_per_block : int
+        Number of pixels per block in the image
+    fence_width : int
+        Number of pixels between consecutive blocks
+    method : str
+        "center" or "mode", see reduce_cluster_image
+
+    Returns
+    -------
+    ref_map : np.ndarray
+        Label of each neuron, index into unique_colors
+    unique_colors : np.ndarray
+        unique colors found in the image (also represent # of clusters)
+    """
+    SOM_img_clusters = reduce_cluster_image(img_as_np_array, pxl_per_block,
+                                            fence_width, method)
+    xdim, ydim, depth = SOM_img_clusters.shape
+    unique_colors, labels = _unique_colors(SOM_img_clusters.reshape(-1, depth))
+    ref_map = labels.reshape(xdim, ydim).astype(np.float64)
+    return ref_map, unique_colors
 
 def recall_populations(dataset: np.ndarray, 
                        weight_cube: np.ndarray, 
@@ -190,7 +480,7 @@ def recall_populations(dataset: np.ndarray,
     #decile_transform_check = data_to_log_decile_log_area_aft(dataset, norm_factors)
     # preform a recall of the dataset with the weight cube
     # assign each population color a number (can do from previous function)
-    ref_map = generate_color_ref_map(SOM_cls_img, unique_colors, SOM_xdim, SOM_ydim)
+    ref_map = generate_color_ref_map(SOM_cls_img, unique_colors)
     SOM_cls_array = np.empty(len(dataset))
     SOM_cls_array[:] = np.nan
     # Make new numpy structured array to save the SOM cls data
@@ -219,16 +509,62 @@ def generate_color_ref_map(color_image: np.ndarray,
     ref_map : np.ndarray
         reference map for the SOM
     """
-    xdim, ydim, _ = np.shape((color_image))
-    ref_map = np.zeros((xdim, ydim))
-    for color in np.arange(len(unique_colors)):
-        mask = np.all(np.equal(color_image, unique_colors[color, :]), axis=2)
-        indices = np.argwhere(mask)  # generates a 2d mask
-        for loc in np.arange(len(indices)):
-            ref_map[indices[loc][0], indices[loc][1]] = color
+    xdim, ydim, depth = np.shape((color_image))
+    n_colors = len(unique_colors)
+    # A single unique over the reference colors and the pixels gives every
+    # pixel the code of its color, colors not in unique_colors map to 0
+    _, codes = np.unique(np.concatenate((unique_colors, color_image.reshape(-1, depth))),
+                         axis=0, return_inverse=True)
+    codes = codes.ravel()
+    lookup = np.zeros(np.max(codes) + 1)
+    lookup[codes[:n_colors]] = np.arange(n_colors)
+    ref_map = lookup[codes[n_colors:]].reshape(xdim, ydim)
     return ref_map
 
 
+def SOM_bmu_recall(data_in_SOM_fmt: np.ndarray,
+                   weight_cube: np.ndarray,
+                   chunk_size: int = None) -> np.ndarray:
+    """
+    Finds the best matching unit (BMU) of every data point, processing the
+    data in chunks so the distance matrix never has to fit in memory at once.
+
+    Uses ||w - x||^2 = ||w||^2 - 2 w.x + ||x||^2, the last term is the same
+    for every neuron so it is dropped from the search.
+
+    Parameters
+    ----------
+    data_in_SOM_fmt : np.ndarray
+        data to classify in the SOM format, shape (n_samples, input_dim)
+    weight_cube : np.ndarray
+        SOM weight cube
+    chunk_size : int
+        Number of data points per chunk, by defualt chosen so each chunk of
+        distances holds about 4 million entries
+
+    Returns
+    -------
+    bmu_indices : np.ndarray
+        Flat index (into the first two axes of the weight cube) of the BMU
+        of each data point
+    """
+    weights = weight_cube.reshape(-1, weight_cube.shape[-1])
+    weights_sq = np.einsum('ij,ij->i', weights, weights)
+    n_samples = len(data_in_SOM_fmt)
+    if chunk_size is None:
+        chunk_size = max(1, 2**22 // len(weights))
+
+    bmu_indices = np.empty(n_samples, dtype=np.intp)
+    for start in range(0, n_samples, chunk_size):
+        chunk = data_in_SOM_fmt[start:start + chunk_size]
+        distances = chunk @ weights.T
+        distances *= -2
+        distances += weights_sq
+        bmu_indices[start:start + chunk_size] = np.argmin(distances, axis=1)
+
+    return bmu_indices
+
+
 def SOM_cls_recall(array_to_fill: np.ndarray, 
                    data_in_SOM_fmt: np.ndarray, 
                    weight_cube: np.ndarray, 
@@ -255,41 +591,31 @@ def SOM_cls_recall(array_to_fill: np.ndarray,
     """
 
     # Want to make it so it works with different metrics in the future
-    [SOM_xdim, SOM_ydim, _] = weight_cube.shape
-    distances = cdist(weight_cube.reshape(-1, weight_cube.shape[-1]), data_in_SOM_fmt, metric='euclidean')
-    w_neuron = np.argmin(distances, axis=0)
-    x_idx, y_idx = np.unravel_index(w_neuron, (SOM_xdim, SOM_ydim))
-    array_to_fill['SOM_type'] = reference_map[x_idx, y_idx]
+    w_neuron = SOM_bmu_recall(data_in_SOM_fmt, weight_cube)
+    array_to_fill['SOM_type'] = reference_map.reshape(-1)[w_neuron]
     return array_to_fill
 
 def SOM_location_recall(normalized_data: np.ndarray, 
                         weight_cube: np.ndarray,) -> np.ndarray:
     """
-    Takes the data, the weight cube and the classification map and assignes each
-    data point a label based on their cluster.
+    Finds the location of the BMU of each data point in the SOM.
 
     Parameters
     ----------
-    array_to_fill : np.ndarray
-        structured array to fill with the classification
-    data_in_SOM_fmt : np.ndarray
+    normalized_data : np.ndarray
         data to classify in the SOM format
     weight_cube : np.ndarray
         SOM weight cube
-    reference_map : np.ndarray
-        reference map for the SOM
 
     Returns
     -------
     array_to_fill : np.ndarray
-        structured array with the SOM classification added
+        (x, y) location of the BMU for each data point, shape (n_samples, 2)
     """
 
     # Want to make it so it works with different metrics in the future
-    array_to_fill = np.empty(len(normalized_data), 2)
     [SOM_xdim, SOM_ydim, _] = weight_cube.shape
-    distances = cdist(weight_cube.reshape(-1, weight_cube.shape[-1]), normalized_data, metric='euclidean')
-    w_neuron = np.argmin(distances, axis=0)
+    w_neuron = SOM_bmu_recall(normalized_data, weight_cube)
     x_idx, y_idx = np.unravel_index(w_neuron, (SOM_xdim, SOM_ydim))
     array_to_fill = np.vstack((x_idx, y_idx))
     return array_to_fill.transpose()
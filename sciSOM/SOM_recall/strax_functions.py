@@ -1,10 +1,11 @@
 import numba
 import numpy as np
-try:
-    import straxen
-    HAS_STRAXEN = True
-except ImportError:
-    HAS_STRAXEN = False
+import importlib.util
+from .._jit import warm_signatures
+
+# straxen takes seconds to import, it is only imported by the functions
+# that need it
+HAS_STRAXEN = importlib.util.find_spec("straxen") is not None
 
 def data_to_log_decile_log_area_aft(peaklet_data: np.ndarray, 
                                     normalization_factor: np.ndarray) -> np.ndarray:
@@ -34,6 +35,7 @@ def data_to_log_decile_log_area_aft(peaklet_data: np.ndarray,
 
     if not HAS_STRAXEN:
         raise ImportError("straxen is not installed. Please install straxen to use this function")
+    import straxen
     decile_data = compute_quantiles(peaklet_data, 10)
     data = peaklet_data.copy()
     decile_data[decile_data < 1] = 1
@@ -78,12 +80,19 @@ def compute_quantiles(peaks: np.ndarray, n_samples: int):
 
     data = peaks["data"].copy()
     data[data < 0.0] = 0.0
-    dt = peaks["dt"]
-    q = compute_wf_attributes(data, dt, n_samples)
+    # Contiguous arrays match the signatures compiled by sciSOM.warmup
+    dt = np.ascontiguousarray(peaks["dt"])
+    q = compute_wf_attributes(data, dt, int(n_samples))
     return q
 
 
 #@export
+@warm_signatures("(float32[:, ::1], int16[::1], int64)",
+                 "(float32[:, ::1], int32[::1], int64)",
+                 "(float32[:, ::1], int64[::1], int64)",
+                 "(float64[:, ::1], int16[::1], int64)",
+                 "(float64[:, ::1], int32[::1], int64)",
+                 "(float64[:, ::1], int64[::1], int64)")
 @numba.jit(nopython=True, cache=True)
 def compute_wf_attributes(data, sample_length, n_samples: int):
     """
@@ -154,6 +163,7 @@ def data_to_log_decile_log_area_aft_generate(peaklet_data):
     """
     if not HAS_STRAXEN:
         raise ImportError("straxen is not installed. Please install straxen to use this function")
+    import straxen
 
     # turn deciles into approriate 'normalized' format (maybe also consider L1 normalization of these inputs)
     decile_data = compute_quantiles(peaklet_data, 10)
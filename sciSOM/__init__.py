@@ -1,6 +1,13 @@
 __version__ = "0.2.0"
 __author__ = "Luis A. Sanchez"
 
-from .SOM_learn.train import SOM
-from .SOM_recall import *
-from .Plotting import *
+# The subpackages are imported on first use, so importing sciSOM does not
+# pull in scipy, numba or matplotlib
+from ._lazy import attach
+
+__getattr__, __dir__ = attach(__name__,
+                              submodules=["SOM_learn", "SOM_recall", "Plotting",
+                                          "Data_to_NeuroScope_format"],
+                              search=["SOM_recall", "Plotting"],
+                              names={"SOM": "SOM_learn.train",
+                                     "warmup": "_jit"})
@@ -0,0 +1,68 @@
+import importlib
+import time
+
+# Modules that define numba kernels, they are imported by warmup so their
+# kernels get registered
+KERNEL_MODULES = ["sciSOM.SOM_recall.strax_functions",
+                  "sciSOM.SOM_learn.batch_kernels",
+                  "sciSOM.SOM_learn.hogwild_kernels"]
+
+_kernels = {}
+
+
+def warm_signatures(*signatures):
+    """
+    Registers the type signatures a numba kernel is compiled for by warmup.
+
+    Numba compiles one specialization per exact argument types (dtype,
+    number of dimensions and layout), so the signatures should match how the
+    package calls the kernel. Use it above the numba decorator::
+
+        @warm_signatures("(float32[:, ::1], int16[::1], int64)")
+        @numba.njit(cache=True)
+        def kernel(data, sample_length, n_samples):
+            ...
+    """
+    def decorator(dispatcher):
+        _kernels[f"{dispatcher.py_func.__module__}.{dispatcher.__name__}"] = (dispatcher, signatures)
+        return dispatcher
+    return decorator
+
+
+def warmup(verbose: bool = False) -> dict:
+    """
+    Compiles every registered numba kernel for its signatures.
+
+    Kernels with cache=True are loaded from the on disk cache if it exists
+    and written to it otherwise, so after the first warmup fresh processes
+    only pay for loading the cache. Call it once after installing or in the
+    initializer of a process pool so the first recall does not stall on
+    compilation.
+
+    Parameters
+    ----------
+    verbose : bool
+        Prints the time spent on each kernel
+
+    Returns
+    -------
+    timings : dict
+        Seconds spent compiling (or loading) each kernel
+    """
+    from numba.core import sigutils
+
+    for module in KERNEL_MODULES:
+        importlib.import_module(module)
+
+    timings = {}
+    for name, (dispatcher, signatures) in _kernels.items():
+        start = time.perf_counter()
+        for signature in signatures:
+            # Compile for the bare argument types, it is the key numba uses
+            # to look up the cache when the kernel is called
+            args, _ = sigutils.normalize_signature(signature)
+            dispatcher.compile(tuple(args))
+        timings[name] = time.perf_counter() - start
+        if verbose:
+            print(f"{name}: {len(signatures)} signatures in {timings[name]:.2f} s")
+    return timings
@@ -0,0 +1,70 @@
+import importlib
+import sys
+
+
+def attach(package_name: str,
+           submodules: list,
+           search: list = None,
+           names: dict = None):
+    """
+    Builds the module level __getattr__ and __dir__ (PEP 562) of a package
+    so its submodules are only imported on first use.
+
+    Accessing a submodule imports it. Any other public name is looked up in
+    the modules of search, in order, importing them one at a time until it
+    is found, like a lazy version of ``from .module import *``.
+
+    Parameters
+    ----------
+    package_name : str
+        __name__ of the package
+    submodules : list
+        Names of the submodules and subpackages of the package
+    search : list
+        Submodules whose public names are re-exported, by defualt all of them
+    names : dict
+        Names re-exported from a specific submodule, e.g.
+        {'SOM': 'SOM_learn.train'}
+
+    Returns
+    -------
+    __getattr__, __dir__ : callable
+    """
+    search = list(submodules) if search is None else list(search)
+    names = {} if names is None else dict(names)
+
+    def _import(submodule):
+        return importlib.import_module(f"{package_name}.{submodule}")
+
+    def __getattr__(name):
+        if name in submodules:
+            return _import(name)
+        if name == "__all__":
+            exported = list(names)
+            for submodule in search:
+                module = _import(submodule)
+                exported += [n for n in getattr(module, "__all__", vars(module))
+                             if not n.startswith("_") and n not in exported]
+            return exported
+        if name.startswith("_"):
+            raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+
+        if name in names:
+            value = getattr(_import(names[name]), name)
+        else:
+            for submodule in search:
+                module = _import(submodule)
+                if hasattr(module, name):
+                    value = getattr(module, name)
+                    break
+            else:
+                raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+
+        # Later accesses no longer go through __getattr__
+        setattr(sys.modules[package_name], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package_name])) | set(submodules) | set(names))
+
+    return __getattr__, __dir__
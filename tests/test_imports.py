@@ -0,0 +1,31 @@
+import subprocess
+import sys
+import pytest
+
+
+def _loaded_modules(code):
+    # Fresh interpreter so modules imported by other tests do not count
+    output = subprocess.run([sys.executable, "-c", code + "\nimport sys; print(' '.join(sys.modules))"],
+                            capture_output=True, text=True, check=True).stdout
+    return set(output.split())
+
+
+@pytest.mark.parametrize("code", ["import sciSOM",
+                                  "from sciSOM.SOM_recall.recall import SOM_cls_recall",
+                                  "from sciSOM.SOM_recall.metrics import som_quality"])
+def test_lazy_imports(code):
+    loaded = _loaded_modules(code)
+    for heavy in ("scipy", "numba", "matplotlib", "viff", "straxen", "PIL", "pandas"):
+        assert heavy not in loaded
+
+
+def test_lazy_attributes():
+    import sciSOM
+    from sciSOM.SOM_learn.train import SOM
+    from sciSOM.Plotting.SOM_plots import calculate_u_matrix
+    assert sciSOM.SOM is SOM
+    assert sciSOM.calculate_u_matrix is calculate_u_matrix
+    assert sciSOM.Plotting.compute_fences is sciSOM.Plotting.u_matrix.compute_fences
+    assert "SOM_bmu_recall" in sciSOM.SOM_recall.__all__
+    with pytest.raises(AttributeError):
+        sciSOM.SOM_recall.not_a_function
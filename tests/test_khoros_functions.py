@@ -0,0 +1,66 @@
+import pytest
+import viff
+import numpy as np
+from sciSOM.Data_to_NeuroScope_format.Khoros_functions import *
+from sciSOM.Data_to_NeuroScope_format.Khoros_functions import _viff_header
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_open_khoros_weightcube(tmp_path, dtype):
+    weight_cube = np.random.uniform(-1, 1, size=(5, 4, 3)).astype(dtype)
+    file_name = str(tmp_path / "weights.raw")
+    # Bands first, the layout of weight cubes written by NeuroScope
+    with open(file_name, 'wb') as f:
+        f.write(_viff_header((1, 3, 5, 4), weight_cube.dtype))
+        weight_cube.transpose(2, 0, 1).tofile(f)
+
+    header = read_viff_header(file_name)
+    assert header['shape'] == (1, 3, 5, 4)
+    assert header['dtype'] == np.dtype(dtype)
+
+    mapped = open_khoros_weightcube(file_name)
+    assert isinstance(mapped.base, np.memmap)
+    assert np.array_equal(mapped, weight_cube)
+    assert np.allclose(import_khoros_weightcube(file_name), (weight_cube + 1) / 2)
+
+def test_save_khoros_raw_matches_viff(tmp_path):
+    data = np.random.rand(5, 4, 3).astype(np.float32)
+    viff.write(str(tmp_path / "viff.raw"), np.ascontiguousarray(
+        np.reshape(data.transpose(2, 1, 0), [1, 3, 5, 4])))
+    save_khoros_raw(str(tmp_path / "streamed.raw"), data, block_size=2)
+    assert (tmp_path / "viff.raw").read_bytes() == (tmp_path / "streamed.raw").read_bytes()
+
+def test_raw_file_round_trip(tmp_path):
+    data = np.random.rand(6, 7, 3)
+    file_name = str(tmp_path / "data.raw")
+    data_to_raw_file_4_khoros(data, file_name, block_size=2)
+    assert np.array_equal(np.fromfile(file_name), data.transpose(2, 0, 1).ravel())
+    assert np.array_equal(open_raw_file_4_khoros(file_name, data.shape), data)
+
+# viff.write only writes the storage type of float32 payloads ('flaot64' typo)
+@pytest.mark.parametrize("shape", [(5, 4, 3), (1, 7, 2), (20, 20, 10)])
+def test_open_khoros_weightcube_matches_viff_read(tmp_path, shape):
+    weight_cube = np.random.uniform(-1, 1, size=shape).astype(np.float32)
+    file_name = str(tmp_path / "weights.raw")
+    viff.write(file_name, np.ascontiguousarray(weight_cube.transpose(2, 0, 1)[None]))
+
+    expected = viff.read(file_name)
+    header = read_viff_header(file_name)
+    assert header['shape'] == expected.shape
+    assert header['dtype'] == expected.dtype
+
+    mapped = open_khoros_weightcube(file_name)
+    assert np.array_equal(mapped, expected[0].transpose(1, 2, 0))
+    assert np.array_equal(mapped, weight_cube)
+    assert np.allclose(import_khoros_weightcube(file_name), (expected[0].transpose(1, 2, 0) + 1) / 2)
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("shape", [(5, 4, 3), (1, 7, 2), (20, 20, 10)])
+def test_save_khoros_raw_viff_read(tmp_path, shape, dtype):
+    data = np.random.rand(*shape).astype(dtype)
+    file_name = str(tmp_path / "data.raw")
+    save_khoros_raw(file_name, data, block_size=2)
+
+    read = viff.read(file_name)
+    assert read.dtype == np.dtype(dtype)
+    assert np.array_equal(read, np.reshape(data.transpose(2, 1, 0), [1, shape[2], shape[0], shape[1]]))
+    assert np.array_equal(open_khoros_weightcube(file_name), read[0].transpose(1, 2, 0))
@@ -1,10 +1,18 @@
 import pytest
-from sciSOM.SOM_recall import affine_transform 
+from sciSOM.SOM_recall import affine_transform, AffineScaler
 from sciSOM.SOM_learn.train import SOM
+from sciSOM.SOM_learn.early_stopping import EarlyStopping
+from sciSOM.SOM_learn.batch import (batch_accumulate, batch_update, neighborhood_kernel,
+                                    InProcessTransport, ProcessTransport)
+from sciSOM.SOM_learn.hogwild import decay_schedule, train_hogwild
+from sciSOM.SOM_learn.multiresolution import upsample_weight_cube, train_coarse_to_fine
+from sciSOM.SOM_learn.initialization import (principal_components, pca_weight_cube, sample_weight_cube,
+                                             initial_weight_cube)
 from hypothesis import given, example
 from hypothesis.extra.numpy import arrays 
 import hypothesis.strategies as st
 import numpy as np
+import os
 
 consistent_shape_strategy = st.integers(min_value=2, max_value=100).map(lambda x: (x,))
 
@@ -145,3 +153,518 @@ def test_SOM_kohonen_decay_modes(shape, params, data):
 
 
 
+
+def test_SOM_save_load(tmp_path):
+    data = np.random.rand(50, 3) * 10
+    scaler = AffineScaler(0, 1).fit(data)
+    som = SOM(4, 3, 3, n_iter=100, learning_parameters=learning_parameters_decay, 
+              scaler=scaler)
+    file_name = str(tmp_path / "som.npz")
+    som.save(file_name)
+
+    loaded = SOM.load(file_name)
+    assert np.array_equal(loaded.weight_cube, som.weight_cube)
+    assert loaded.learning_parameters == som.learning_parameters
+    assert loaded.decay_type == som.decay_type and loaded.mode == som.mode
+    assert np.allclose(loaded.scaler.transform(data), scaler.transform(data))
+
+
+def test_SOM_save_unfitted_scaler(tmp_path):
+    som = SOM(4, 3, 3, n_iter=100, learning_parameters=learning_parameters_decay,
+              scaler=AffineScaler(0, 1))
+    file_name = tmp_path / "som.npz"
+    with pytest.raises(ValueError, match="not been fitted"):
+        som.save(str(file_name))
+    assert not file_name.exists()
+
+
+def test_cSOM_save_load_continue(tmp_path):
+    import random
+    data = np.random.rand(100, 3)
+    params = np.array([(0.3, 0.05, 2.0)], dtype=[('alpha', 'f8'), ('beta', 'f8'), ('gamma', 'f8')])
+    som = SOM(4, 3, 3, n_iter=50, learning_parameters=params, som_type="cSOM",
+              custom_scale_sup_matrix=0.2, csom_learning_radius=2, gamma_off=False,
+              save_weight_cube_history=True, weight_cube_save_states=np.array([10, 49]),
+              init="sample")
+    som.train(data)
+    file_name = str(tmp_path / "csom.npz")
+    som.save(file_name)
+    loaded = SOM.load(file_name)
+
+    for name in ('custom_scale_sup_matrix', 'csom_learning_radius', 'gamma_off', 'init', 'som_type'):
+        assert getattr(loaded, name) == getattr(som, name)
+    assert np.array_equal(loaded.frequency_matrix, som.frequency_matrix)
+
+    # Both continue the training the same way
+    for model in (som, loaded):
+        random.seed(0)
+        np.random.seed(0)
+        model.train(data)
+    assert np.array_equal(loaded.weight_cube, som.weight_cube)
+    assert np.array_equal(loaded.frequency_matrix, som.frequency_matrix)
+    assert np.array_equal(loaded.weight_cube_history, som.weight_cube_history)
+    assert np.array_equal(loaded.som_save_state, som.som_save_state)
+
+
+def test_affine_scaler_inplace_integer():
+    data = np.arange(12).reshape(4, 3)
+    scaler = AffineScaler(0, 1).fit(data)
+    with pytest.raises(ValueError):
+        scaler.transform(data, inplace=True)
+    floats = data.astype(np.float64)
+    assert np.allclose(scaler.transform(floats, inplace=True), scaler.transform(data))
+
+
+def test_run_sweep():
+    from sciSOM.SOM_learn.sweep import parameter_grid, run_sweep
+    data = np.random.rand(200, 3)
+    configs = parameter_grid(x_dim=[3, 4], y_dim=[3], n_iter=[50],
+                             learning_parameters=[learning_parameters_decay],
+                             decay_type=['exponential', 'not_a_decay'])
+    results = run_sweep(data, configs, seeds=[0, 1], n_workers=2)
+
+    assert len(results) == 8
+    ok = results[results['status'] == 'ok']
+    assert len(ok) == 4
+    assert (results.loc[results['status'] == 'failed', 'error'].str.contains('Error')).all()
+    assert all(cube.shape == (x, 3, 3) for cube, x in zip(ok['weight_cube'], ok['x_dim']))
+    assert (ok['quantization_error'] >= 0).all()
+
+    # Same configuration and seed gives the same map
+    again = run_sweep(data, configs[:1], seeds=[0], n_workers=1)
+    assert np.array_equal(again['weight_cube'][0], results['weight_cube'][0])
+
+
+class _KillWorker:
+    # Unpickling this in a worker process kills the worker
+    def __reduce__(self):
+        return os._exit, (1,)
+
+
+def test_run_sweep_dead_worker():
+    from sciSOM.SOM_learn.sweep import run_sweep
+    data = np.random.rand(100, 3)
+    good = {'x_dim': 3, 'y_dim': 3, 'n_iter': 20, 'learning_parameters': learning_parameters_decay}
+    configs = [good] * 3 + [{**good, 'crash': _KillWorker()}] + [good] * 3
+    results = run_sweep(data, configs, seeds=[0], n_workers=2, max_retries=1)
+
+    assert list(results['status']) == ['ok'] * 3 + ['failed'] + ['ok'] * 3
+    assert results['error'][3].startswith('Worker process died')
+
+
+@pytest.mark.parametrize("custom_scale_sup_matrix", [0, 0.2])
+def test_cSOM_bias(custom_scale_sup_matrix):
+    # With alpha 0 the weights do not move, so every BMU can be checked
+    # against the full bias matrix recorded in the histories
+    data = np.random.rand(200, 3)
+    params = np.array([(0.0, 0.05, 2.0)], dtype=[('alpha', 'f8'), ('beta', 'f8'), ('gamma', 'f8')])
+    som = SOM(5, 4, 3, n_iter=300, learning_parameters=params, som_type="cSOM", histories=True,
+              custom_scale_sup_matrix=custom_scale_sup_matrix)
+    indices = som._train_batch(data)
+    som.cSOM(data, indices)
+
+    for i in range(som.n_iter):
+        x_bmu, y_bmu = som.compute_bmu_cSOM(data, indices, i, som.bais_matrix_history[:, :, i])
+        assert (x_bmu[0], y_bmu[0]) == tuple(som.track_mbu[:, i])
+    assert np.allclose(som.bais_matrix, som.bais_matrix_history[:, :, -1])
+    assert np.allclose(som.frequency_matrix, som.frequency_matrix_history[:, :, -1])
+
+
+@pytest.mark.parametrize("som_type", ["Kohonen", "cSOM"])
+def test_SOM_early_stopping(som_type):
+    data = np.random.rand(500, 3)
+    if som_type == "Kohonen":
+        params = learning_parameters_decay
+    else:
+        params = np.array([(0.1, 0.01, 1.0)], dtype=[('alpha', 'f8'), ('beta', 'f8'), ('gamma', 'f8')])
+    som = SOM(4, 4, 3, n_iter=20000, learning_parameters=params, som_type=som_type)
+    # A huge tolerance means no check ever counts as an improvement
+    stopper = EarlyStopping(check_every=100, tol=0.9, patience=2, validation_size=200, seed=0)
+    som.train(data, early_stopping=stopper)
+
+    assert som.is_trained
+    # The first check always improves, then patience checks without
+    assert som.stopped_at == 300
+    assert stopper.checked_iterations == [100, 200, 300]
+    assert len(stopper.quantization_errors) == 3
+
+    som.train(data)
+    assert som.stopped_at is None
+
+
+def test_SOM_profile_report():
+    data = np.random.rand(100, 3)
+    som = SOM(4, 4, 3, n_iter=1000, learning_parameters=learning_parameters_decay,
+              profile=True, profile_every=10)
+    som.train(data)
+    report = som.profile_report()
+
+    assert list(report)[:4] == ["bmu", "decay", "neighborhood", "histories"]
+    assert all(phase["calls"] == 100 for phase in report.values())
+    assert np.isclose(sum(phase["fraction"] for phase in report.values()), 1)
+    assert np.isclose(report["bmu"]["estimated_time"], 10 * report["bmu"]["total_time"])
+    assert list(som.profile_report(as_frame=True).index) == list(report)
+
+    with pytest.raises(ValueError):
+        SOM(4, 4, 3, n_iter=10, learning_parameters=learning_parameters_decay).profile_report()
+
+
+@pytest.mark.parametrize("n_iter", [50, 100, 250])
+def test_train_batch_indices(n_iter):
+    data = np.random.rand(50, 3)
+    som = SOM(4, 4, 3, n_iter=n_iter, learning_parameters=learning_parameters_decay)
+    indices = som._train_batch(data)
+    # Every epoch is a permutation of the data, including the last full one
+    for start in range(0, n_iter - n_iter % 50, 50):
+        assert np.array_equal(np.sort(indices[start:start + 50]), np.arange(50))
+
+
+@pytest.mark.parametrize("som_type", ["Kohonen", "cSOM"])
+def test_SOM_train_callback(som_type):
+    data = np.random.rand(200, 3)
+    if som_type == "Kohonen":
+        params, keys = learning_parameters_decay, {"alpha", "sigma", "radius"}
+    else:
+        params = np.array([(0.1, 0.01, 1.0)], dtype=[('alpha', 'f8'), ('beta', 'f8'), ('gamma', 'f8')])
+        keys = {"alpha", "beta", "gamma", "radius"}
+    infos = []
+    som = SOM(4, 4, 3, n_iter=1050, learning_parameters=params, som_type=som_type)
+    som.train(data, callback=infos.append, callback_every=500, callback_qe_size=50)
+
+    assert [info["iteration"] for info in infos] == [500, 1000, 1050]
+    assert all(keys <= set(info) for info in infos)
+    assert all(info["its_per_sec"] > 0 and info["quantization_error"] >= 0 for info in infos)
+    assert infos[0]["alpha"] > infos[-1]["alpha"]
+
+
+@pytest.mark.parametrize("neighborhood_decay", ["geometric_series", "exponential", "none"])
+def test_batch_update(neighborhood_decay):
+    data = np.random.rand(300, 3)
+    weight_cube = np.random.rand(5, 4, 3)
+    sums, counts = batch_accumulate(data, weight_cube, chunk_size=64)
+    assert counts.sum() == 300 and np.isclose(sums.sum(), data.sum())
+
+    # Same weights as the neighborhood function of the online SOM
+    radius = 2
+    som = SOM(5, 4, 3, n_iter=10, learning_parameters=learning_parameters_decay,
+              neighborhood_decay=neighborhood_decay)
+    kernel = neighborhood_kernel(radius, neighborhood_decay)
+    updated = batch_update(sums, counts, kernel, weight_cube)
+    for x in range(5):
+        for y in range(4):
+            h = som.neighborhood_function(x, y, 0, radius)
+            expected = np.einsum('ij,ijk->k', h, sums) / np.sum(h * counts)
+            assert np.allclose(updated[x, y], expected)
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_batch_accumulate_methods(dtype):
+    data = np.random.rand(1000, 3).astype(dtype)
+    weight_cube = np.random.rand(5, 4, 3)
+    sums, counts = batch_accumulate(data, weight_cube, chunk_size=300, method="numba")
+    expected_sums, expected_counts = batch_accumulate(data, weight_cube, method="numpy")
+    assert np.allclose(sums, expected_sums)
+    assert np.array_equal(counts, expected_counts)
+
+    with pytest.raises(ValueError):
+        batch_accumulate(data, weight_cube, method="not_a_method")
+
+
+def test_batch_accumulate_non_finite():
+    # A nan or inf data point spreads to the sums the same way in both paths
+    data = np.random.rand(50, 3)
+    data[7, 1] = np.nan
+    data[20, 0] = np.inf
+    weight_cube = np.random.rand(3, 4, 3)
+    sums, counts = batch_accumulate(data, weight_cube, method="numba")
+    expected_sums, expected_counts = batch_accumulate(data, weight_cube, method="numpy")
+    assert np.array_equal(counts, expected_counts)
+    assert np.allclose(sums, expected_sums, equal_nan=True)
+
+
+def test_SOM_batch_transports():
+    data = np.random.rand(1000, 3)
+    weight_cube = np.random.rand(4, 4, 3)
+    cubes = []
+    for transport in (InProcessTransport(chunk_size=100, method="numpy"),
+                      InProcessTransport(chunk_size=100),
+                      ProcessTransport(n_workers=3, chunk_size=100)):
+        som = SOM(4, 4, 3, n_iter=5, learning_parameters=learning_parameters_decay,
+                  som_type="batch_map", weight_cube=weight_cube.copy())
+        som.train(data, transport=transport)
+        assert som.is_trained
+        cubes.append(som.weight_cube)
+    assert np.allclose(cubes[0], cubes[1]) and np.allclose(cubes[0], cubes[2])
+    assert not np.allclose(cubes[0], weight_cube)
+
+    # A worker failing is reported by the coordinator
+    som = SOM(4, 4, 5, n_iter=5, learning_parameters=learning_parameters_decay, som_type="batch_map")
+    with pytest.raises(RuntimeError):
+        som.train(data, transport=ProcessTransport(n_workers=2))
+
+    # mode is the data order of the online algorithms, not the batch SOM
+    with pytest.raises(ValueError):
+        SOM(4, 4, 3, n_iter=5, learning_parameters=learning_parameters_decay, som_type="batch_map", mode="online")
+
+
+def test_process_transport_dead_worker():
+    transport = ProcessTransport(n_workers=2, method="numpy")
+    transport.start(np.random.rand(100, 3))
+    workers = list(transport._workers)
+    workers[0].kill()
+    workers[0].join()
+    with pytest.raises(RuntimeError, match="died"):
+        transport.accumulate(np.random.rand(3, 3, 3))
+    # The other workers are shut down too
+    assert not any(worker.is_alive() for worker in workers)
+    assert transport._shm is None
+
+
+@pytest.mark.parametrize("decay_type", ["exponential", "linear", "schedule"])
+def test_decay_schedule(decay_type):
+    parameters = learning_parameters_schedule if decay_type == "schedule" else learning_parameters_decay
+    som = SOM(4, 4, 3, n_iter=500, learning_parameters=parameters, decay_type=decay_type)
+    alphas, radii = decay_schedule(som, 100, 500)
+    for i in range(100, 500):
+        alpha, _, radius = som.decay_kohonen(i)
+        assert np.isclose(alphas[i - 100], np.squeeze(alpha))
+        assert radii[i - 100] == np.squeeze(radius)
+
+
+@pytest.mark.parametrize("neighborhood_decay", ["geometric_series", "exponential", "none"])
+def test_hogwild_single_thread(neighborhood_decay):
+    # With one thread the hogwild kernel runs the serial Kohonen updates,
+    # equal up to rounding (fastmath)
+    data = np.random.rand(300, 3)
+    weight_cube = np.random.rand(5, 4, 3)
+    serial = SOM(5, 4, 3, n_iter=1000, learning_parameters=learning_parameters_decay,
+                 neighborhood_decay=neighborhood_decay, weight_cube=weight_cube.copy())
+    indices = serial._train_batch(data)
+    serial.Kohonen_SOM(data, indices)
+
+    hogwild = SOM(5, 4, 3, n_iter=1000, learning_parameters=learning_parameters_decay,
+                  neighborhood_decay=neighborhood_decay, weight_cube=weight_cube.copy())
+    train_hogwild(hogwild, data, indices, n_threads=1, round_size=128)
+    assert np.allclose(hogwild.weight_cube, serial.weight_cube)
+    assert np.allclose(hogwild.learning_rate_history, serial.learning_rate_history)
+
+
+def test_hogwild_non_finite():
+    # A nan data point goes to neuron 0 like in the serial SOM
+    data = np.random.rand(50, 3)
+    data[5, 1] = np.nan
+    weight_cube = np.random.rand(5, 4, 3)
+    indices = np.array([1, 2, 5, 3])
+    serial = SOM(5, 4, 3, n_iter=4, learning_parameters=learning_parameters_decay,
+                 weight_cube=weight_cube.copy())
+    serial.Kohonen_SOM(data, indices)
+    hogwild = SOM(5, 4, 3, n_iter=4, learning_parameters=learning_parameters_decay,
+                  weight_cube=weight_cube.copy())
+    train_hogwild(hogwild, data, indices, n_threads=1)
+    assert np.isnan(hogwild.weight_cube[0, 0]).any()
+    assert np.array_equal(np.isnan(hogwild.weight_cube), np.isnan(serial.weight_cube))
+
+
+def test_hogwild_save_states_out_of_order():
+    # Repeated or past save states do not shrink the rounds to one iteration
+    data = np.random.rand(200, 3)
+    som = SOM(4, 4, 3, n_iter=1000, learning_parameters=learning_parameters_decay,
+              weight_cube_save_states=np.array([10, 10, 5, 300]), profile=True, profile_every=1)
+    train_hogwild(som, data, som._train_batch(data), n_threads=1, round_size=128)
+    assert som.profiler.n_iterations <= 1000 // 128 + 4
+    assert np.array_equal(som.som_save_state[0], som.som_save_state[1])
+    assert not np.allclose(som.som_save_state[0], 0)
+    assert np.allclose(som.som_save_state[2], 0) and not np.allclose(som.som_save_state[3], 0)
+
+
+def test_SOM_hogwild():
+    data = np.random.rand(500, 3)
+    som = SOM(4, 4, 3, n_iter=20000, learning_parameters=learning_parameters_decay,
+              som_type="hogwild", save_weight_cube_history=True,
+              weight_cube_save_states=np.array([99, 4999]))
+    stopper = EarlyStopping(check_every=1000, tol=0.9, patience=2, validation_size=200, seed=0)
+    infos = []
+    som.train(data, early_stopping=stopper, callback=infos.append, callback_every=700)
+
+    assert som.is_trained
+    assert som.stopped_at == 3000
+    assert [info["iteration"] for info in infos] == [700, 1400, 2100, 2800]
+    assert som.weight_cube_history.sum() == 3000
+    assert not np.allclose(som.som_save_state[0], 0) and np.allclose(som.som_save_state[1], 0)
+
+    som = SOM(4, 4, 3, n_iter=100, learning_parameters=learning_parameters_decay,
+              som_type="hogwild", histories=True)
+    with pytest.raises(ValueError):
+        som.train(data)
+
+
+def test_upsample_weight_cube():
+    weight_cube = np.random.rand(3, 4, 2)
+    assert np.allclose(upsample_weight_cube(weight_cube, 3, 4), weight_cube)
+
+    upsampled = upsample_weight_cube(weight_cube, 9, 10)
+    assert upsampled.shape == (9, 10, 2)
+    assert np.allclose(upsampled[[0, 0, -1, -1], [0, -1, 0, -1]], weight_cube[[0, 0, -1, -1], [0, -1, 0, -1]])
+
+    # A map linear in the grid position stays linear
+    x, y = np.meshgrid(np.arange(3), np.arange(4), indexing='ij')
+    ramp = np.stack([x, 2 * y], axis=-1).astype(float)
+    fine_x, fine_y = np.meshgrid(np.linspace(0, 2, 9), np.linspace(0, 3, 10), indexing='ij')
+    assert np.allclose(upsample_weight_cube(ramp, 9, 10), np.stack([fine_x, 2 * fine_y], axis=-1))
+
+
+def test_train_coarse_to_fine():
+    data = np.random.rand(300, 3)
+    parameters = learning_parameters_decay.copy()
+    parameters["max_radius"] = 4
+    som = train_coarse_to_fine(data, 8, 6, parameters, coarse_n_iter=500, fine_n_iter=300,
+                               coarse_shape=(4, 3))
+
+    assert som.is_trained
+    assert som.weight_cube.shape == (8, 6, 3)
+    # The fine tuning radius is capped at the upsampling factor
+    assert som.learning_parameters["max_radius"] == 2
+    assert som.learning_radius_history.max() <= 2
+
+    with pytest.raises(ValueError):
+        train_coarse_to_fine(data, 8, 6, parameters, 10, 10, coarse_shape=(10, 2))
+
+
+def test_principal_components():
+    data = np.random.rand(1000, 4) @ np.random.rand(4, 4) + 10
+    mean, components, variances = principal_components(data, 2, chunk_size=64)
+    expected_variances, expected_vectors = np.linalg.eigh(np.cov(data, rowvar=False))
+
+    assert np.allclose(mean, data.mean(axis=0))
+    assert np.allclose(variances, expected_variances[::-1][:2])
+    assert np.allclose(np.abs(components @ expected_vectors[:, ::-1][:, :2]), np.eye(2))
+
+
+def test_initial_weight_cubes():
+    data = np.random.rand(500, 3) * [3, 1, 0.1]
+    weight_cube = pca_weight_cube(data, 6, 4)
+    assert weight_cube.shape == (6, 4, 3)
+    assert np.allclose(weight_cube.mean(axis=(0, 1)), data.mean(axis=0))
+    # Every neuron is on the principal plane, spread mostly along the first feature
+    assert np.linalg.matrix_rank(weight_cube.reshape(-1, 3) - data.mean(axis=0), tol=1e-8) == 2
+    assert np.ptp(weight_cube[:, 0, 0]) > np.ptp(weight_cube[0, :, 0])
+    assert pca_weight_cube(data[:, :1], 3, 2).shape == (3, 2, 1)
+
+    sampled = sample_weight_cube(data, 6, 4)
+    assert all((row == data).all(axis=1).any() for row in sampled.reshape(-1, 3))
+
+
+@pytest.mark.parametrize("init", ["pca", "sample"])
+def test_SOM_init(init):
+    data = np.random.rand(200, 3)
+    som = SOM(5, 4, 3, n_iter=3, learning_parameters=learning_parameters_decay,
+              som_type="batch_map", init=init)
+    assert som.init_pending
+    som.train(data)
+    assert not som.init_pending
+    assert som.weight_cube.min() >= data.min() and som.weight_cube.max() <= data.max()
+
+    # A given weight cube is never replaced
+    weight_cube = np.random.rand(5, 4, 3)
+    assert not SOM(5, 4, 3, n_iter=3, learning_parameters=learning_parameters_decay,
+                   weight_cube=weight_cube, init=init).init_pending
+
+    with pytest.raises(ValueError):
+        SOM(5, 4, 3, n_iter=3, learning_parameters=learning_parameters_decay, init="not_an_init")
+
+
+def test_initial_weight_cubes_sample_weight():
+    data = np.random.rand(60, 3) * [3, 1, 0.1]
+    counts = np.random.randint(0, 4, size=len(data))
+    repeated = np.repeat(data, counts, axis=0)
+    assert np.allclose(initial_weight_cube(data, 6, 4, "pca", counts.astype(float)),
+                       initial_weight_cube(repeated, 6, 4, "pca"))
+
+    # Points are drawn proportionally to their weight, never with weight 0
+    weights = np.zeros(len(data))
+    weights[:3] = [1, 2, 7]
+    sampled = initial_weight_cube(data, 40, 50, "sample", weights).reshape(-1, 3)
+    rows = np.array([np.flatnonzero((data == row).all(axis=1))[0] for row in sampled])
+    assert set(rows) <= {0, 1, 2}
+    assert np.allclose(np.bincount(rows, minlength=3) / len(rows), [0.1, 0.2, 0.7], atol=0.05)
+
+    # Training a weighted SOM from a pca init is training on the repeated data
+    cubes = []
+    for train_data, sample_weight in ((data, counts), (repeated, None)):
+        som = SOM(5, 4, 3, n_iter=3, learning_parameters=learning_parameters_decay,
+                  som_type="batch_map", init="pca")
+        som.train(train_data, sample_weight=sample_weight)
+        cubes.append(som.weight_cube)
+    assert np.allclose(cubes[0], cubes[1])
+
+
+def test_SOM_pca_init_deterministic():
+    # The batch SOM draws no random numbers, with pca it is deterministic
+    data = np.random.rand(300, 3)
+    cubes = []
+    for _ in range(2):
+        som = SOM(5, 4, 3, n_iter=5, learning_parameters=learning_parameters_decay,
+                  som_type="batch_map", init="pca")
+        som.train(data)
+        cubes.append(som.weight_cube)
+    assert np.array_equal(cubes[0], cubes[1])
+
+
+@pytest.mark.parametrize("method", ["numba", "numpy"])
+def test_batch_accumulate_sample_weight(method):
+    data = np.random.rand(500, 3)
+    counts = np.random.randint(0, 4, 500)
+    weight_cube = np.random.rand(5, 4, 3)
+    sums, bmu_counts = batch_accumulate(data, weight_cube, 128, method, sample_weight=counts)
+    expected_sums, expected_counts = batch_accumulate(np.repeat(data, counts, axis=0), weight_cube, 128, method)
+    assert np.allclose(sums, expected_sums)
+    assert np.allclose(bmu_counts, expected_counts)
+
+
+def test_SOM_batch_sample_weight():
+    # Weighted sums are the sums of the repeated data
+    data = np.random.rand(300, 3)
+    counts = np.random.randint(1, 5, 300)
+    weight_cube = np.random.rand(4, 4, 3)
+    expanded = SOM(4, 4, 3, n_iter=5, learning_parameters=learning_parameters_decay,
+                   som_type="batch_map", weight_cube=weight_cube.copy())
+    expanded.train(np.repeat(data, counts, axis=0))
+    for transport in (InProcessTransport(), ProcessTransport(n_workers=2)):
+        weighted = SOM(4, 4, 3, n_iter=5, learning_parameters=learning_parameters_decay,
+                       som_type="batch_map", weight_cube=weight_cube.copy())
+        weighted.train(data, transport=transport, sample_weight=counts)
+        assert np.allclose(weighted.weight_cube, expanded.weight_cube)
+
+
+def test_train_indices_sample_weight():
+    data = np.random.rand(50, 3)
+    counts = np.random.randint(0, 4, 50)
+    counts[0] = 0
+    som = SOM(4, 4, 3, n_iter=int(2.5 * counts.sum()), learning_parameters=learning_parameters_decay)
+
+    # Every full epoch holds every point count times, the last one part of them
+    indices = som._train_batch(data, counts.astype(float))
+    assert len(indices) == som.n_iter
+    epoch = counts.sum()
+    assert np.array_equal(np.bincount(indices[:epoch], minlength=50), counts)
+    assert np.array_equal(np.bincount(indices[epoch:2 * epoch], minlength=50), counts)
+    assert np.all(np.bincount(indices[2 * epoch:], minlength=50) <= counts)
+
+    assert 0 not in som._train_online(data, counts.astype(float))
+    with pytest.raises(ValueError):
+        som._train_batch(data, counts + 0.5)
+
+
+def test_check_sample_weight():
+    from sciSOM.SOM_learn.train import check_sample_weight
+    assert check_sample_weight([1, 2], 2).dtype == np.float64
+    for sample_weight in ([1, 2, 3], [1, -1], [np.nan, 1], [0, 0]):
+        with pytest.raises(ValueError):
+            check_sample_weight(sample_weight, 2)
+
+
+def test_early_stopping_sample_weight():
+    data = np.arange(10, dtype=float).reshape(5, 2)
+    stopper = EarlyStopping(validation_size=100, seed=0)
+    stopper.start(data, np.array([0, 1, 0, 3, 0.0]))
+    assert set(stopper._validation[:, 0]) <= {2.0, 6.0}
@@ -0,0 +1,119 @@
+import pytest
+import matplotlib
+matplotlib.use('Agg')
+from sciSOM.Plotting.SOM_plots import calculate_u_matrix, mU_matrix_image, plot_neuron_traces
+from sciSOM.Plotting.u_matrix import compute_fences
+from sciSOM.Plotting.nueroscope_plots import read_nunr, nunr_to_obj, nunr_file_to_list, tuple_list_to_list
+from hypothesis import given
+from hypothesis.extra.numpy import arrays
+import hypothesis.strategies as st
+import numpy as np
+
+weight_cube_strategy = st.tuples(st.integers(min_value=2, max_value=8),
+                                 st.integers(min_value=2, max_value=8),
+                                 st.integers(min_value=1, max_value=4)).flatmap(
+    lambda shape: arrays(np.float64, shape, elements=st.floats(0, 1)))
+
+def u_matrix_loop(weight_cube, toroidal=False):
+    x, y, _ = weight_cube.shape
+    u_matrix = np.zeros((x, y))
+    for i in range(x):
+        for j in range(y):
+            distances = []
+            for a, b in [(i-1, j), (i+1, j), (i, j-1), (i, j+1)]:
+                if toroidal:
+                    a, b = a % x, b % y
+                elif not (0 <= a < x and 0 <= b < y):
+                    continue
+                distances.append(np.linalg.norm(weight_cube[i, j] - weight_cube[a, b]))
+            u_matrix[i, j] = np.mean(distances)
+    return u_matrix
+
+@given(weight_cube_strategy, st.booleans())
+def test_compute_fences(weight_cube, toroidal):
+    x, y, _ = weight_cube.shape
+    horizontal, vertical, u_matrix = compute_fences(weight_cube, toroidal=toroidal)
+
+    if toroidal:
+        assert horizontal.shape == (x, y) and vertical.shape == (x, y)
+    else:
+        assert horizontal.shape == (x, y - 1) and vertical.shape == (x - 1, y)
+    assert np.isclose(horizontal[0, 0], np.linalg.norm(weight_cube[0, 0] - weight_cube[0, 1]))
+    assert np.isclose(vertical[0, 0], np.linalg.norm(weight_cube[0, 0] - weight_cube[1, 0]))
+    assert np.allclose(u_matrix, u_matrix_loop(weight_cube, toroidal))
+
+def test_compute_fences_hexagonal():
+    weight_cube = np.random.rand(6, 5, 3)
+    horizontal, vertical, u_matrix = compute_fences(weight_cube, topology="hexagonal")
+    assert vertical.shape == (2, 5, 5)
+    # Even rows have no neighbor at (i+1, -1), odd rows none at (i+1, y)
+    assert np.isnan(vertical[1, 0, 0]) and np.isnan(vertical[1, 1, -1])
+    assert np.isclose(vertical[1, 0, 1], np.linalg.norm(weight_cube[0, 1] - weight_cube[1, 0]))
+    assert np.isclose(vertical[1, 1, 0], np.linalg.norm(weight_cube[1, 0] - weight_cube[2, 1]))
+
+    with pytest.raises(ValueError):
+        compute_fences(np.random.rand(5, 5, 3), topology="hexagonal", toroidal=True)
+
+def test_calculate_u_matrix():
+    weight_cube = np.random.rand(7, 4, 3)
+    assert np.allclose(calculate_u_matrix(weight_cube), u_matrix_loop(weight_cube))
+
+def test_mU_matrix_image():
+    weight_cube = np.random.rand(3, 4, 2)
+    data = np.vstack((weight_cube[0, 0], weight_cube[0, 0], weight_cube[2, 3]))
+    mU_image = mU_matrix_image(weight_cube, data, pxl_per_cell=5, fence_width=1)
+    assert mU_image.shape == (3 * 6 - 1, 4 * 6 - 1, 3)
+    assert mU_image.dtype == np.uint8
+    # Densest cell is pure red, empty cells are black
+    assert np.all(mU_image[0:5, 0:5] == [255, 0, 0])
+    assert np.all(mU_image[6:11, 6:11] == 0)
+    # Fences are gray
+    fence = mU_image[5, 0:5]
+    assert np.all(fence[:, 0] == fence[:, 1]) and np.all(fence[:, 1] == fence[:, 2])
+
+def test_mU_matrix_image_limits():
+    from sciSOM.Plotting.SOM_plots import compute_fences
+    weight_cube = np.random.rand(3, 4, 2)
+    data = weight_cube.reshape(-1, 2)
+    horizontal_lines, vertical_lines, _ = compute_fences(weight_cube)
+    fences = np.concatenate((horizontal_lines.ravel(), vertical_lines.ravel()))
+    mU_image = mU_matrix_image(weight_cube, data, set_costum_min_max=True, pxl_per_cell=5, fence_width=1,
+                               fence_vmin=fences.min(), fence_vmax=fences.max())
+    # The fences span the full gray scale between fence_vmin and fence_vmax
+    fence_pixels = np.concatenate((mU_image[5::6, :].ravel(), mU_image[:, 5::6].ravel()))
+    assert fence_pixels.min() == 0 and fence_pixels.max() == 255
+
+    # No data weight on the map gives black cells, not nan colors
+    empty = mU_matrix_image(weight_cube, data, weights=np.zeros(len(data)), pxl_per_cell=5, fence_width=1)
+    assert np.all(empty[0:5, 0:5] == 0)
+    # Neither do equal fences
+    flat = mU_matrix_image(np.ones((3, 4, 2)), data, pxl_per_cell=5, fence_width=1)
+    assert np.all(flat[5, 0:5] == 0)
+
+def test_plot_neuron_traces():
+    traces = np.random.rand(3, 4, 10)
+    empty_cells = np.zeros((3, 4), dtype=bool)
+    empty_cells[1, 2] = True
+    ax = plot_neuron_traces(traces, empty_cells=empty_cells, cell_margin=0)
+    assert len(ax.collections) == 1
+
+    segments = ax.collections[0].get_segments()
+    assert len(segments) == 12
+    # Trace (0, 0) is in the top left cell
+    assert np.allclose(segments[0][:, 0], np.linspace(0, 1, 10))
+    assert np.allclose(segments[0][:, 1], 2 + traces[0, 0])
+    # Empty cells are drawn flat at the bottom of their cell
+    assert np.allclose(segments[6][:, 1], 1)
+
+def test_read_nunr(tmp_path):
+    nunr_file = tmp_path / "test.nunr"
+    nunr_file.write_text("header\n"
+                         "1 a b 3 1 c 5 2 c\n"
+                         "2 a b\n"
+                         "3 a b 2 2 c 152 991 c 7 7 c\n")
+    indptr, sample_indices = read_nunr(str(nunr_file), 10)
+    assert np.array_equal(indptr, [0, 2, 2, 3])
+    assert np.array_equal(sample_indices, [3, 15, 12])
+
+    split_lines = [line.split() for line in nunr_file.read_text().splitlines()[1:]]
+    assert nunr_to_obj(split_lines, 10) == tuple_list_to_list(nunr_file_to_list(split_lines), 10)
@@ -1,5 +1,7 @@
 import pytest
 from sciSOM.SOM_recall.recall import *
+from sciSOM.SOM_recall.map_statistics import density_matrix, neuron_aggregates, group_by_label
+from sciSOM.SOM_recall.metrics import top2_bmus, are_adjacent, som_quality, draw_subsample
 from hypothesis import given, example
 from hypothesis.extra.numpy import arrays
 import hypothesis.strategies as st
@@ -31,4 +33,197 @@ def test_affine_transform(data):
         assert np.all(normalized_data >= -1) and np.all(normalized_data <= 1)
         assert np.max(normalized_data) == 1 and np.min(normalized_data) == -1
 
-# Need a test reference image to test the rest of the functions
\ No newline at end of file
+# Need a test reference image to test the rest of the functions
+@given(arrays(np.float64, (20, 3), elements=st.floats(0, 1)),
+       st.integers(min_value=1, max_value=25))
+def test_SOM_bmu_recall(data, chunk_size):
+    weight_cube = np.random.rand(4, 5, 3)
+    distances = np.linalg.norm(weight_cube.reshape(-1, 1, 3) - data[np.newaxis], axis=-1)
+    bmu_indices = SOM_bmu_recall(data, weight_cube, chunk_size=chunk_size)
+    # Ties can break either way, so compare the distances instead of indices
+    assert np.allclose(distances[bmu_indices, np.arange(len(data))], np.min(distances, axis=0))
+
+def test_density_matrix():
+    bmu_indices = np.array([0, 0, 5, 11])
+    density = density_matrix(bmu_indices, (3, 4))
+    assert density.shape == (3, 4)
+    assert density[0, 0] == 2 and density[1, 1] == 1 and density[2, 3] == 1
+    assert np.sum(density) == len(bmu_indices)
+
+    weighted = density_matrix(bmu_indices, (3, 4), weights=np.array([1., 2., 3., 4.]))
+    assert weighted[0, 0] == 3 and weighted[2, 3] == 4
+
+    log_density = density_matrix(bmu_indices, (3, 4), log_density=True)
+    assert np.allclose(log_density, np.log10(density + 1))
+
+@given(arrays(np.float64, (30, 4), elements=st.floats(-10, 10)))
+def test_neuron_aggregates(values):
+    bmu_indices = np.random.randint(0, 5, size=len(values))
+    aggregates = neuron_aggregates(bmu_indices, values, (2, 3), chunk_size=7)
+    assert aggregates['count'].shape == (2, 3)
+    assert aggregates['mean'].shape == (2, 3, 4)
+
+    for neuron in range(6):
+        x, y = np.unravel_index(neuron, (2, 3))
+        selected = values[bmu_indices == neuron]
+        assert aggregates['count'][x, y] == len(selected)
+        if len(selected) > 0:
+            assert np.allclose(aggregates['sum'][x, y], np.sum(selected, axis=0))
+            assert np.allclose(aggregates['mean'][x, y], np.mean(selected, axis=0))
+            assert np.allclose(aggregates['var'][x, y], np.var(selected, axis=0), atol=1e-9)
+        else:
+            assert np.all(np.isnan(aggregates['mean'][x, y]))
+
+def test_neuron_aggregates_large_offset():
+    # Small spread on a large offset, E[x^2] - E[x]^2 loses every digit here
+    rng = np.random.default_rng(0)
+    values = 1e8 + rng.normal(0, 1e-3, size=(1000, 2))
+    bmu_indices = rng.integers(0, 4, size=len(values))
+    aggregates = neuron_aggregates(bmu_indices, values, (2, 2), chunk_size=64)
+
+    for neuron in range(4):
+        x, y = np.unravel_index(neuron, (2, 2))
+        selected = values[bmu_indices == neuron]
+        assert np.allclose(aggregates['var'][x, y], np.var(selected, axis=0), rtol=1e-4, atol=0)
+
+@given(arrays(np.int64, 50, elements=st.integers(0, 4)),
+       st.one_of(st.none(), st.integers(min_value=1, max_value=10)))
+def test_group_by_label(labels, max_per_group):
+    unique_labels, order, offsets = group_by_label(labels, max_per_group, seed=0)
+    assert np.all(unique_labels == np.unique(labels))
+    assert len(offsets) == len(unique_labels) + 1 and offsets[-1] == len(order)
+
+    for k, label in enumerate(unique_labels):
+        members = order[offsets[k]:offsets[k + 1]]
+        assert np.all(labels[members] == label)
+        assert np.all(np.diff(members) > 0)
+        expected = np.sum(labels == label)
+        if max_per_group is not None:
+            expected = min(expected, max_per_group)
+        assert len(members) == expected
+
+@pytest.mark.parametrize("fence_width", [0, 2])
+@pytest.mark.parametrize("method", ["center", "mode"])
+def test_reduce_cluster_image(fence_width, method):
+    palette = np.array([[255, 0, 0], [0, 255, 0], [0, 0, 255]], dtype=np.uint8)
+    labels = np.random.randint(0, 3, size=(6, 5))
+    stride = 12 + fence_width
+    img = np.zeros((6 * stride - fence_width, 5 * stride - fence_width, 3), dtype=np.uint8)
+    for i in range(6):
+        for j in range(5):
+            img[i * stride:i * stride + 12, j * stride:j * stride + 12] = palette[labels[i, j]]
+    # Antialiased edge on the first row of every block
+    img[::stride] = 128
+
+    reduced = reduce_cluster_image(img, 12, fence_width, method)
+    assert np.array_equal(reduced, palette[labels])
+
+    ref_map, unique_colors = cluster_image_to_labels(img, 12, fence_width, method)
+    assert np.array_equal(unique_colors[ref_map.astype(int)], palette[labels])
+    assert np.array_equal(generate_color_ref_map(reduced, unique_colors), ref_map)
+
+@given(arrays(np.float64, (40, 3), elements=st.floats(-100, 100)),
+       st.integers(min_value=1, max_value=50))
+def test_affine_scaler(data, chunk_size):
+    scaler = AffineScaler(-1, 1)
+    if np.any(np.max(data, axis=0) == np.min(data, axis=0)):
+        with pytest.raises(ZeroDivisionError):
+            scaler.fit(data).transform(data)
+        return
+
+    scaler.fit(data, chunk_size=chunk_size)
+    assert np.array_equal(scaler.data_min, np.min(data, axis=0))
+    assert np.array_equal(scaler.data_max, np.max(data, axis=0))
+
+    normalized_data = scaler.transform(data)
+    assert np.allclose(normalized_data, affine_transform(data, -1, 1))
+    assert np.allclose(scaler.inverse_transform(normalized_data), data)
+
+    # In place transforms write into the input array
+    data_copy = data.copy()
+    assert scaler.transform(data_copy, inplace=True) is data_copy
+    assert np.allclose(data_copy, normalized_data)
+
+    restored = AffineScaler.from_params(scaler.get_params())
+    assert np.allclose(restored.transform(data), normalized_data)
+
+
+def test_top2_bmus():
+    data = np.random.rand(500, 4)
+    weight_cube = np.random.rand(5, 6, 4)
+    bmu, second, bmu_sq = top2_bmus(data, weight_cube, chunk_size=64)
+
+    distances = np.linalg.norm(data[:, None] - weight_cube.reshape(-1, 4)[None], axis=2)
+    order = np.argsort(distances, axis=1)
+    assert np.array_equal(bmu, order[:, 0])
+    assert np.array_equal(second, order[:, 1])
+    assert np.allclose(bmu_sq, distances.min(axis=1)**2)
+
+
+@pytest.mark.parametrize("topology", ["rectangular", "hexagonal"])
+def test_are_adjacent(topology):
+    x_dim, y_dim = 6, 5
+    pairs = np.array([(a, b) for a in range(x_dim * y_dim) for b in range(x_dim * y_dim)])
+    adjacent = are_adjacent(pairs[:, 0], pairs[:, 1], (x_dim, y_dim), topology)
+
+    expected = np.zeros(len(pairs), dtype=bool)
+    for n, (a, b) in enumerate(pairs):
+        (i, j), (k, l) = divmod(a, y_dim), divmod(b, y_dim)
+        if topology == "rectangular":
+            expected[n] = abs(i - k) + abs(j - l) == 1
+        else:
+            # Cartesian centers of the shifted hexagonal lattice
+            center_a = np.array([i * np.sqrt(3) / 2, j + 0.5 * (i % 2)])
+            center_b = np.array([k * np.sqrt(3) / 2, l + 0.5 * (k % 2)])
+            expected[n] = np.isclose(np.linalg.norm(center_a - center_b), 1)
+    assert np.array_equal(adjacent, expected)
+    assert np.array_equal(adjacent, are_adjacent(pairs[:, 1], pairs[:, 0], (x_dim, y_dim), topology))
+
+
+def test_som_quality():
+    # Data exactly on the neurons of an ordered map
+    grid = np.stack(np.meshgrid(np.arange(4.), np.arange(3.), indexing='ij'), axis=-1)
+    data = np.repeat(grid.reshape(-1, 2), 5, axis=0)
+    quality = som_quality(data + 0.1, grid)
+    assert np.isclose(quality['quantization_error'], np.sqrt(0.02))
+    assert quality['topographic_error'] == 0
+    assert np.array_equal(quality['density'], np.full((4, 3), 5))
+    assert np.allclose(quality['distortion'], 5 * 0.02)
+
+    # Shuffling the neurons breaks the topology
+    shuffled = grid.reshape(-1, 2)[np.random.default_rng(0).permutation(12)].reshape(4, 3, 2)
+    assert som_quality(data + 0.1, shuffled)['topographic_error'] > 0
+
+    sampled = som_quality(data, grid, sample_size=10, seed=1)
+    assert quality['density'].shape == sampled['density'].shape and sampled['density'].sum() == 10
+
+
+def test_warmup():
+    import sciSOM
+    from sciSOM.SOM_recall.strax_functions import compute_wf_attributes
+    timings = sciSOM.warmup()
+    assert "sciSOM.SOM_recall.strax_functions.compute_wf_attributes" in timings
+
+    # Calling with any of the warmed types does not add a new specialization
+    n_compiled = len(compute_wf_attributes.signatures)
+    for data_type in (np.float32, np.float64):
+        for dt_type in (np.int16, np.int32, np.int64):
+            data = np.random.rand(5, 20).astype(data_type)
+            compute_wf_attributes(data, np.ones(5, dtype=dt_type), 10)
+    assert n_compiled >= 6 and len(compute_wf_attributes.signatures) == n_compiled
+
+
+def test_draw_subsample():
+    data = np.arange(20, dtype=np.float64).reshape(10, 2)
+    assert draw_subsample(data) is data
+    assert draw_subsample(data, 20) is data
+
+    sample = draw_subsample(data, 5, seed=0)
+    assert len(np.unique(sample[:, 0])) == 5 and np.all(np.diff(sample[:, 0]) > 0)
+    assert np.array_equal(sample, draw_subsample(data, 5, seed=0))
+
+    # Only the points with a weight can be drawn, with replacement
+    weights = np.zeros(10)
+    weights[[2, 7]] = 1
+    weighted = draw_subsample(data, 50, seed=0, sample_weight=weights)
+    assert len(weighted) == 50 and set(weighted[:, 0]) == {4.0, 14.0}